@@ -0,0 +1,76 @@
+import time
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+from app.utils.autocomplete import (
+    AUTOCOMPLETE_LIMIT,
+    SUGGESTION_SOURCES,
+    get_suggestions,
+)
+from app.utils.ai_metrics import get_ai_metrics, get_ai_metrics_summary
+from app.utils.event_metrics import render_prometheus_metrics
+from app.utils.loop_monitor import get_loop_lag_histogram, get_top_blockers
+
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+
+async def autocomplete(request: Request) -> JSONResponse:
+    """GET /api/autocomplete/{field}?q=<prefix>&limit=<n>"""
+    field = request.path_params["field"]
+    if field not in SUGGESTION_SOURCES:
+        return JSONResponse({"error": f"Unknown field: {field}"}, status_code=404)
+    try:
+        limit = int(request.query_params.get("limit", AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        return JSONResponse({"error": "limit must be an integer"}, status_code=400)
+    limit = max(1, min(limit, MAX_AUTOCOMPLETE_LIMIT))
+    started = time.perf_counter()
+    suggestions = get_suggestions(field, request.query_params.get("q", ""), limit)
+    return JSONResponse(
+        {
+            "field": field,
+            "suggestions": suggestions,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+    )
+
+
+async def loop_lag(request: Request) -> JSONResponse:
+    """GET /api/loop-lag?limit=<n> - event-loop lag histogram and top blocking call sites"""
+    try:
+        limit = int(request.query_params.get("limit", 20))
+    except ValueError:
+        return JSONResponse({"error": "limit must be an integer"}, status_code=400)
+    return JSONResponse(
+        {
+            "lag": get_loop_lag_histogram(),
+            "blockers": get_top_blockers(max(1, limit)),
+        }
+    )
+
+
+async def ai_metrics(request: Request) -> JSONResponse:
+    """GET /api/ai-metrics?feature=<name> - per-feature AI usage, plus recent requests for one feature"""
+    feature = request.query_params.get("feature")
+    body = {"summary": get_ai_metrics_summary()}
+    if feature:
+        body["requests"] = get_ai_metrics(feature)
+    return JSONResponse(body)
+
+
+async def metrics(request: Request) -> PlainTextResponse:
+    """GET /metrics - event timings and event-loop lag for Prometheus"""
+    return PlainTextResponse(
+        render_prometheus_metrics(), media_type="text/plain; version=0.0.4"
+    )
+
+
+api = Starlette(
+    routes=[
+        Route("/api/autocomplete/{field}", autocomplete),
+        Route("/api/loop-lag", loop_lag),
+        Route("/api/ai-metrics", ai_metrics),
+        Route("/metrics", metrics),
+    ]
+)
@@ -6,6 +6,12 @@ from app.pages.login import login_page
 from app.pages.register import registration_page
 from app.pages.dashboard import dashboard_page
 from app.pages.browse import browse_page
+from app.utils.data_sync import data_sync_monitor
+from app.utils.gazetteer import load_gazetteer
+from app.utils.shared_cache import invalidation_listener
+from app.utils.loop_monitor import loop_lag_monitor
+from app.utils.event_metrics import instrument_app
+from app.api import api
 
 
 @asynccontextmanager
@@ -109,8 +115,14 @@ app = rxe.App(
             }
             """),
     ],
+    api_transformer=api,
 )
+instrument_app(app)
 app.register_lifespan_task(database_lifespan)
+app.register_lifespan_task(data_sync_monitor)
+app.register_lifespan_task(load_gazetteer)
+app.register_lifespan_task(invalidation_listener)
+app.register_lifespan_task(loop_lag_monitor)
 app.add_page(index, on_load=AuthState.check_login)
 app.add_page(login_page, route="/login", on_load=AuthState.check_login)
 app.add_page(registration_page, route="/register", on_load=AuthState.check_login)
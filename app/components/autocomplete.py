@@ -0,0 +1,13 @@
+import reflex as rx
+from app.states.autocomplete_state import AutocompleteState
+
+
+def suggestion_list(field: str) -> rx.Component:
+    """A datalist of ranked name suggestions, referenced by an input's list prop."""
+    return rx.el.datalist(
+        rx.foreach(
+            AutocompleteState.suggestions[field],
+            lambda suggestion: rx.el.option(value=suggestion),
+        ),
+        id=f"{field}-suggestions",
+    )
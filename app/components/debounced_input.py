@@ -0,0 +1,10 @@
+import reflex as rx
+
+SEARCH_DEBOUNCE_MS = 350
+
+
+def debounced_input(**props) -> rx.Component:
+    """A controlled input that sends one on_change per typing pause, not per keystroke."""
+    return rx.debounce_input(
+        rx.el.input(**props), debounce_timeout=SEARCH_DEBOUNCE_MS
+    )
@@ -39,6 +39,11 @@ class StudyReference(TypedDict):
     reference_type: Optional[str]
 
 
+class SnippetPart(TypedDict):
+    text: str
+    match: bool
+
+
 class Trial(TypedDict):
     nct_id: str
     brief_title: str
@@ -51,6 +56,8 @@ class Trial(TypedDict):
     location_count: int
     intervention_count: int
     primary_therapeutic_area: Optional[str]
+    distance_km: Optional[float]
+    snippet: Optional[list[SnippetPart]]
 
 
 class TrialDetail(Trial):
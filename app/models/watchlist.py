@@ -9,6 +9,9 @@ class WatchlistCriteria(TypedDict):
     phase: Optional[str]
     status: Optional[str]
     country: Optional[str]
+    near: Optional[str]
+    radius_km: Optional[str]
+    site_status: Optional[str]
 
 
 class WatchlistMatch(TypedDict):
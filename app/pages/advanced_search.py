@@ -1,6 +1,9 @@
 import reflex as rx
 from app.states.advanced_search_state import AdvancedSearchState
 from app.states.ui_state import UIState
+from app.states.autocomplete_state import AutocompleteState
+from app.components.autocomplete import suggestion_list
+from app.components.debounced_input import debounced_input
 from app.components.sidebar import sidebar
 from app.pages.browse import trial_card
 
@@ -30,20 +33,63 @@ def natural_language_search_box() -> rx.Component:
             on_submit=AdvancedSearchState.handle_natural_query_submit,
             class_name="flex items-center gap-2",
         ),
+        rx.el.div(
+            rx.el.label(
+                rx.el.input(
+                    type="checkbox",
+                    checked=AdvancedSearchState.use_ai_parser,
+                    on_change=AdvancedSearchState.set_use_ai_parser,
+                    class_name="mr-2",
+                ),
+                "Use AI for phrasing the quick parser can't understand",
+                class_name="flex items-center text-xs text-gray-600",
+            ),
+            rx.cond(
+                AdvancedSearchState.parser_tier == "llm",
+                rx.el.span(
+                    "Interpreted by AI", class_name="text-xs text-purple-600 font-medium"
+                ),
+                rx.cond(
+                    AdvancedSearchState.parser_tier == "local",
+                    rx.el.span(
+                        "Interpreted locally",
+                        class_name="text-xs text-gray-500 font-medium",
+                    ),
+                ),
+            ),
+            class_name="flex items-center justify-between mt-2",
+        ),
         class_name="bg-white p-6 rounded-xl border border-gray-200 shadow-sm mb-6",
     )
 
 
 def query_builder() -> rx.Component:
-    def query_input(name: str, placeholder: str, label: str) -> rx.Component:
+    def query_input(
+        name: str, placeholder: str, label: str, autocomplete: bool = False
+    ) -> rx.Component:
+        autocomplete_props = (
+            {"list": f"{name}-suggestions", "auto_complete": "off"}
+            if autocomplete
+            else {}
+        )
         return rx.el.div(
             rx.el.label(label, class_name="text-xs font-medium text-gray-600 mb-1"),
-            rx.el.input(
+            debounced_input(
                 name=name,
                 placeholder=placeholder,
-                default_value=AdvancedSearchState.structured_query[name],
+                value=AdvancedSearchState.structured_query[name],
+                on_change=lambda val: (
+                    [
+                        AdvancedSearchState.set_structured_field(name, val),
+                        AutocompleteState.suggest(name, val),
+                    ]
+                    if autocomplete
+                    else AdvancedSearchState.set_structured_field(name, val)
+                ),
+                **autocomplete_props,
                 class_name="w-full px-2 py-1.5 text-sm border border-gray-300 rounded-md focus:outline-none focus:ring-1 focus:ring-blue-500",
             ),
+            suggestion_list(name) if autocomplete else rx.fragment(),
         )
 
     return rx.el.div(
@@ -52,13 +98,20 @@ def query_builder() -> rx.Component:
             class_name="text-lg font-semibold text-gray-800 mb-4",
         ),
         rx.el.form(
+            query_input(
+                "text",
+                "Search titles and descriptions, e.g., amyloid PET imaging",
+                "Full Text",
+            ),
             rx.el.div(
-                query_input("condition", "e.g., Alzheimer's Disease", "Condition"),
-                query_input("intervention", "e.g., Lecanemab", "Intervention"),
-                query_input("sponsor", "e.g., Biogen", "Sponsor"),
+                query_input(
+                    "condition", "e.g., Alzheimer's Disease", "Condition", True
+                ),
+                query_input("intervention", "e.g., Lecanemab", "Intervention", True),
+                query_input("sponsor", "e.g., Biogen", "Sponsor", True),
                 query_input("status", "e.g., Recruiting", "Status"),
                 query_input("phase", "e.g., Phase 3", "Phase"),
-                class_name="grid md:grid-cols-3 lg:grid-cols-5 gap-4",
+                class_name="grid md:grid-cols-3 lg:grid-cols-5 gap-4 mt-4",
             ),
             rx.el.div(
                 query_input("min_enrollment", "e.g., 100", "Min Enrollment"),
@@ -68,12 +121,22 @@ def query_builder() -> rx.Component:
                 class_name="grid md:grid-cols-2 lg:grid-cols-4 gap-4 mt-4",
             ),
             rx.el.div(
+                rx.el.label(
+                    rx.el.input(
+                        type="checkbox",
+                        checked=AdvancedSearchState.use_semantic_search,
+                        on_change=AdvancedSearchState.set_use_semantic_search,
+                        class_name="mr-2",
+                    ),
+                    "Match full text by meaning rather than exact words",
+                    class_name="flex items-center text-xs text-gray-600",
+                ),
                 rx.el.button(
                     "Build & Search",
                     type="submit",
                     class_name="bg-blue-600 text-white font-medium py-2 px-6 rounded-md hover:bg-blue-700",
                 ),
-                class_name="flex justify-end mt-4",
+                class_name="flex items-center justify-between mt-4",
             ),
             on_submit=AdvancedSearchState.handle_structured_query_submit,
         ),
@@ -22,6 +22,9 @@ def watchlist_criteria_summary(criteria: rx.Var[dict]) -> rx.Component:
         criterion_badge("phase", criteria["phase"]),
         criterion_badge("status", criteria["status"]),
         criterion_badge("country", criteria["country"]),
+        criterion_badge("near", criteria["near"]),
+        criterion_badge("radius_km", criteria["radius_km"]),
+        criterion_badge("site_status", criteria["site_status"]),
         class_name="flex flex-wrap gap-2",
     )
 
@@ -138,6 +141,13 @@ def create_watchlist_dialog() -> rx.Component:
                     rx.el.input(
                         name="country", placeholder="Country (e.g., United States)"
                     ),
+                    rx.el.input(name="near", placeholder="Near (e.g., Boston, MA)"),
+                    rx.el.input(
+                        name="radius_km", placeholder="Radius in km (default 50)"
+                    ),
+                    rx.el.input(
+                        name="site_status", placeholder="Site status (e.g., RECRUITING)"
+                    ),
                     class_name="grid grid-cols-2 gap-3 mb-4",
                 ),
                 rx.el.div(
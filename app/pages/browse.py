@@ -1,6 +1,10 @@
 import reflex as rx
 from app.states.browse_state import BrowseState
+from app.utils.facility_index import DEFAULT_RADIUS_KM, RADIUS_OPTIONS_KM
 from app.states.ui_state import UIState
+from app.states.autocomplete_state import AutocompleteState
+from app.components.autocomplete import suggestion_list
+from app.components.debounced_input import debounced_input
 from app.components.sidebar import sidebar
 from app.components.loading_skeletons import trial_card_skeleton
 from app.components.empty_state import empty_state
@@ -8,18 +12,35 @@ from app.components.tooltip_wrapper import tooltip
 
 
 def filter_input(
-    label: str, placeholder: str, name: str, value: rx.Var[str]
+    label: str,
+    placeholder: str,
+    name: str,
+    value: rx.Var[str],
+    autocomplete: bool = False,
 ) -> rx.Component:
     return rx.el.div(
         rx.el.label(label, class_name="text-xs font-medium text-gray-600 mb-1"),
-        rx.el.input(
+        debounced_input(
             name=name,
             placeholder=placeholder,
-            default_value=value,
-            on_change=lambda val: BrowseState.set_search_term(name, val),
+            value=value,
+            on_change=lambda val: (
+                [
+                    BrowseState.set_search_term(name, val),
+                    AutocompleteState.suggest(name, val),
+                ]
+                if autocomplete
+                else BrowseState.set_search_term(name, val)
+            ),
+            **(
+                {"list": f"{name}-suggestions", "auto_complete": "off"}
+                if autocomplete
+                else {}
+            ),
             class_name="w-full px-2 py-1.5 text-sm border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-transparent",
             aria_label=label,
         ),
+        suggestion_list(name) if autocomplete else rx.fragment(),
     )
 
 
@@ -30,7 +51,12 @@ def filter_select(
         rx.el.label(label, class_name="text-xs font-medium text-gray-600 mb-1"),
         rx.el.select(
             rx.el.option("All", value=""),
-            rx.foreach(options, lambda opt: rx.el.option(opt, value=opt)),
+            rx.foreach(
+                options,
+                lambda opt: rx.el.option(
+                    BrowseState.facet_option_labels[name].get(opt, opt), value=opt
+                ),
+            ),
             name=name,
             value=value,
             on_change=lambda val: BrowseState.set_search_term(name, val),
@@ -40,6 +66,47 @@ def filter_select(
     )
 
 
+def facet_chips(label: str, name: str, facets: rx.Var[list[dict]]) -> rx.Component:
+    return rx.cond(
+        facets.length() > 0,
+        rx.el.div(
+            rx.el.span(label, class_name="text-xs font-medium text-gray-600 mr-1"),
+            rx.foreach(
+                facets,
+                lambda facet: rx.el.button(
+                    facet["value"],
+                    rx.el.span(
+                        facet["count"], class_name="ml-1 text-gray-400 font-normal"
+                    ),
+                    type="button",
+                    on_click=BrowseState.apply_facet(name, facet["value"]),
+                    class_name="text-xs font-medium text-gray-700 bg-gray-100 hover:bg-blue-50 hover:text-blue-700 px-2 py-1 rounded-full",
+                ),
+            ),
+            class_name="flex flex-wrap items-center gap-2",
+        ),
+    )
+
+
+def radius_select() -> rx.Component:
+    return rx.el.div(
+        rx.el.label("Within", class_name="text-xs font-medium text-gray-600 mb-1"),
+        rx.el.select(
+            rx.el.option(f"{DEFAULT_RADIUS_KM} km", value=""),
+            *[
+                rx.el.option(f"{radius} km", value=radius)
+                for radius in RADIUS_OPTIONS_KM
+                if radius != str(DEFAULT_RADIUS_KM)
+            ],
+            name="radius_km",
+            value=BrowseState.search_terms["radius_km"],
+            on_change=lambda val: BrowseState.set_search_term("radius_km", val),
+            class_name="w-full px-2 py-1.5 text-sm border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-transparent bg-white",
+            aria_label="Search radius",
+        ),
+    )
+
+
 def trial_card(trial: rx.Var[dict]) -> rx.Component:
     return rx.el.div(
         rx.el.div(
@@ -76,6 +143,34 @@ def trial_card(trial: rx.Var[dict]) -> rx.Component:
                     class_name="flex items-center gap-1.5 mt-2",
                 ),
             ),
+            rx.cond(
+                trial["snippet"],
+                rx.el.p(
+                    rx.foreach(
+                        trial["snippet"],
+                        lambda part: rx.cond(
+                            part["match"],
+                            rx.el.mark(
+                                part["text"],
+                                class_name="bg-yellow-100 text-gray-900 rounded-sm",
+                            ),
+                            rx.el.span(part["text"]),
+                        ),
+                    ),
+                    class_name="text-xs text-gray-600 mt-2 line-clamp-3",
+                ),
+            ),
+            rx.cond(
+                trial["distance_km"],
+                rx.el.div(
+                    rx.icon(tag="map-pin", size=14, class_name="text-gray-500"),
+                    rx.el.p(
+                        f"Nearest site {trial['distance_km']} km away",
+                        class_name="text-xs text-gray-600",
+                    ),
+                    class_name="flex items-center gap-1.5 mt-1",
+                ),
+            ),
             class_name="flex-1 mb-3",
         ),
         rx.el.div(
@@ -125,6 +220,7 @@ def trial_card(trial: rx.Var[dict]) -> rx.Component:
             ),
             class_name="mt-2 flex justify-between items-center",
         ),
+        on_mouse_enter=BrowseState.prefetch_trial(trial["nct_id"]),
         class_name="bg-white p-4 rounded-xl border border-gray-200 shadow-sm flex flex-col hover:shadow-lg hover:border-blue-300 hover:-translate-y-1 transition-all duration-300 h-full",
     )
 
@@ -167,6 +263,12 @@ def browse_page() -> rx.Component:
                     rx.cond(
                         ~UIState.filters_collapsed,
                         rx.el.form(
+                            filter_input(
+                                "Full Text",
+                                "Search titles and descriptions, e.g., gene therapy for sickle cell",
+                                "text",
+                                BrowseState.search_terms["text"],
+                            ),
                             rx.el.div(
                                 filter_input(
                                     "NCT ID",
@@ -179,20 +281,23 @@ def browse_page() -> rx.Component:
                                     "e.g., Cancer",
                                     "condition",
                                     BrowseState.search_terms["condition"],
+                                    autocomplete=True,
                                 ),
                                 filter_input(
                                     "Intervention",
                                     "e.g., Aspirin",
                                     "intervention",
                                     BrowseState.search_terms["intervention"],
+                                    autocomplete=True,
                                 ),
                                 filter_input(
                                     "Sponsor",
                                     "e.g., Pfizer",
                                     "sponsor",
                                     BrowseState.search_terms["sponsor"],
+                                    autocomplete=True,
                                 ),
-                                class_name="grid md:grid-cols-2 lg:grid-cols-4 gap-4",
+                                class_name="grid md:grid-cols-2 lg:grid-cols-4 gap-4 mt-4",
                             ),
                             rx.el.div(
                                 filter_select(
@@ -213,9 +318,50 @@ def browse_page() -> rx.Component:
                                     BrowseState.search_terms["study_type"],
                                     BrowseState.filter_options["study_types"],
                                 ),
-                                class_name="grid md:grid-cols-3 gap-4 mt-4",
+                                filter_input(
+                                    "Country",
+                                    "e.g., Germany",
+                                    "country",
+                                    BrowseState.search_terms["country"],
+                                ),
+                                class_name="grid md:grid-cols-2 lg:grid-cols-4 gap-4 mt-4",
                             ),
                             rx.el.div(
+                                filter_input(
+                                    "Near",
+                                    "e.g., Boston, MA or 02115, United States",
+                                    "near",
+                                    BrowseState.search_terms["near"],
+                                ),
+                                radius_select(),
+                                filter_select(
+                                    "Site Status",
+                                    "site_status",
+                                    BrowseState.search_terms["site_status"],
+                                    BrowseState.filter_options["site_statuses"],
+                                ),
+                                class_name="grid md:grid-cols-2 lg:grid-cols-4 gap-4 mt-4",
+                            ),
+                            rx.el.div(
+                                facet_chips(
+                                    "Top countries:", "country", BrowseState.top_countries
+                                ),
+                                facet_chips(
+                                    "Top sponsors:", "sponsor", BrowseState.top_sponsors
+                                ),
+                                class_name="flex flex-col gap-2 mt-4",
+                            ),
+                            rx.el.div(
+                                rx.el.label(
+                                    rx.el.input(
+                                        type="checkbox",
+                                        checked=BrowseState.search_as_you_type,
+                                        on_change=BrowseState.set_search_as_you_type,
+                                        class_name="mr-2",
+                                    ),
+                                    "Search as I type",
+                                    class_name="flex items-center text-xs text-gray-600 mr-auto",
+                                ),
                                 rx.el.button(
                                     "Search",
                                     type="submit",
@@ -7,6 +7,9 @@ from app.states.saved_trials_state import SavedTrialsState
 from app.states.report_state import ReportState
 from app.components.tooltip_wrapper import tooltip
 from app.states.ai_state import AIState
+from app.states.trial_chat_state import TrialChatState
+
+TRIAL_MAP_ID = "trial-detail-map"
 
 
 def detail_section(title: str, content: rx.Var, is_html: bool = True) -> rx.Component:
@@ -58,7 +61,7 @@ def trial_infographic() -> rx.Component:
             rx.icon(tag="map_pin", size=20, class_name="text-gray-500"),
             rx.el.p("Sites", class_name="text-xs text-gray-500"),
             rx.el.p(
-                trial.get("locations", []).length().to_string(),
+                TrialDetailState.complexity_factors["locations"],
                 class_name="text-sm font-medium text-gray-800",
             ),
             class_name="flex flex-col items-center justify-center p-3 rounded-lg bg-gray-50 text-center",
@@ -149,9 +152,41 @@ def enrollment_chart() -> rx.Component:
     )
 
 
+def map_cluster_marker(cluster: rx.Var) -> rx.Component:
+    cluster_path_options = rxe.map.path_options(
+        color="#2563eb", fill_color="#3b82f6", fill_opacity=0.6, weight=2
+    )
+    return rx.cond(
+        cluster["count"] == 1,
+        rxe.map.marker(
+            rxe.map.popup(rx.html(cluster["popup"])),
+            position=cluster["position"],
+        ),
+        rx.cond(
+            cluster["popup"] != "",
+            rxe.map.circle_marker(
+                rxe.map.tooltip(f"{cluster['count']} sites"),
+                rxe.map.popup(rx.html(cluster["popup"])),
+                center=cluster["position"],
+                radius=cluster["radius"],
+                path_options=cluster_path_options,
+            ),
+            rxe.map.circle_marker(
+                rxe.map.tooltip(f"{cluster['count']} sites"),
+                center=cluster["position"],
+                radius=cluster["radius"],
+                path_options=cluster_path_options,
+                on_click=rxe.map.api(TRIAL_MAP_ID).setView(
+                    cluster["position"], cluster["expand_zoom"]
+                ),
+            ),
+        ),
+    )
+
+
 def trial_locations_map() -> rx.Component:
     return rx.cond(
-        TrialDetailState.location_markers.length() > 0,
+        TrialDetailState.complexity_factors["locations"] > 0,
         rx.el.div(
             rx.el.h3(
                 "Geographic Locations",
@@ -162,16 +197,11 @@ def trial_locations_map() -> rx.Component:
                     url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png",
                     attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors',
                 ),
-                rx.foreach(
-                    TrialDetailState.location_markers,
-                    lambda marker: rxe.map.marker(
-                        rxe.map.popup(rx.html(marker["popup"])),
-                        position=marker["position"],
-                    ),
-                ),
-                id="trial-detail-map",
+                rx.foreach(TrialDetailState.map_clusters, map_cluster_marker),
+                id=TRIAL_MAP_ID,
                 center=TrialDetailState.map_center,
                 zoom=TrialDetailState.map_zoom,
+                on_move_end=TrialDetailState.update_map_viewport,
                 height="400px",
                 width="100%",
                 class_name="rounded-lg",
@@ -222,6 +252,8 @@ def similar_trial_card(trial: rx.Var[dict]) -> rx.Component:
             ),
             rx.el.p(
                 f"NCT ID: {trial['nct_id']}",
+                rx.cond(trial["phase"], f" · {trial['phase']}", ""),
+                f" · {round(trial['similarity'].to(float) * 100)}% match",
                 class_name="text-xs text-gray-500 text-left",
             ),
             class_name="flex-1 min-w-0",
@@ -287,9 +319,90 @@ def design_outcome_item(outcome: rx.Var[dict]) -> rx.Component:
     )
 
 
+def chat_message_bubble(message: rx.Var[dict]) -> rx.Component:
+    return rx.el.div(
+        rx.el.div(
+            rx.cond(
+                message["role"] == "user",
+                rx.text(message["content"], class_name="whitespace-pre-wrap"),
+                rx.markdown(message["content"].replace("<", "&lt;")),
+            ),
+            class_name=rx.cond(
+                message["role"] == "user",
+                "text-sm text-white bg-blue-600 px-3 py-2 rounded-lg max-w-[80%]",
+                "text-sm text-gray-700 bg-gray-50 border border-gray-200 px-3 py-2 rounded-lg max-w-[80%] prose prose-sm",
+            ),
+        ),
+        rx.cond(
+            message["sources"].length() > 0,
+            rx.el.p(
+                "Sources: ",
+                rx.foreach(
+                    message["sources"],
+                    lambda source: rx.el.span(source, class_name="mr-2"),
+                ),
+                class_name="text-xs text-gray-400 mt-1",
+            ),
+        ),
+        class_name=rx.cond(
+            message["role"] == "user",
+            "flex flex-col items-end",
+            "flex flex-col items-start",
+        ),
+    )
+
+
+def trial_chat_panel() -> rx.Component:
+    nct_id = TrialDetailState.trial["nct_id"]
+    return rx.el.div(
+        rx.el.div(
+            rx.el.h3(
+                "Ask about this trial",
+                class_name="font-semibold text-gray-800 text-base",
+            ),
+            rx.el.button(
+                "Clear",
+                on_click=lambda: TrialChatState.clear_conversation(nct_id),
+                class_name="text-xs font-medium text-gray-500 hover:text-gray-700",
+            ),
+            class_name="flex justify-between items-center mb-2",
+        ),
+        rx.el.div(
+            rx.foreach(
+                TrialChatState.conversations.get(nct_id, []), chat_message_bubble
+            ),
+            rx.cond(
+                TrialChatState.is_answering,
+                rx.el.div(rx.spinner(), class_name="flex justify-start p-2"),
+            ),
+            class_name="space-y-2 max-h-96 overflow-y-auto mb-2",
+        ),
+        rx.el.form(
+            rx.el.input(
+                name="question",
+                placeholder="e.g., Can patients with prior chemotherapy enroll?",
+                value=TrialChatState.question,
+                on_change=TrialChatState.set_question,
+                class_name="flex-1 text-sm border border-gray-300 rounded-md px-3 py-2 focus:outline-none focus:ring-2 focus:ring-blue-500",
+            ),
+            rx.el.button(
+                rx.icon(tag="send", size=14),
+                type="submit",
+                disabled=TrialChatState.is_answering,
+                class_name="bg-purple-600 text-white px-3 py-2 rounded-md hover:bg-purple-700 disabled:opacity-50",
+                aria_label="Ask question",
+            ),
+            on_submit=TrialChatState.ask_question,
+            reset_on_submit=True,
+            class_name="flex items-center gap-2",
+        ),
+        class_name="py-3 border-t border-gray-200",
+    )
+
+
 def eligibility_criteria_section() -> rx.Component:
     return rx.cond(
-        TrialDetailState.trial.get("eligibility_criteria"),
+        TrialDetailState.eligibility_criteria != "",
         rx.el.div(
             rx.el.h3(
                 "Eligibility Criteria",
@@ -361,15 +474,232 @@ def eligibility_criteria_section() -> rx.Component:
                     ),
                     class_name="p-3 bg-white border border-gray-200 rounded-lg",
                 ),
-                detail_section(
-                    "", TrialDetailState.trial.get("eligibility_criteria"), is_html=True
+                detail_section("", TrialDetailState.eligibility_criteria, is_html=True),
+            ),
+            class_name="py-3 border-t border-gray-200",
+        ),
+    )
+
+
+def ai_summary_section() -> rx.Component:
+    nct_id = TrialDetailState.trial["nct_id"]
+    return rx.el.div(
+        rx.el.div(
+            rx.el.h3(
+                "AI Summary",
+                class_name="font-semibold text-gray-800 text-base",
+            ),
+            rx.el.button(
+                rx.icon(tag="sparkles", size=14, class_name="mr-1.5"),
+                "Generate Summary",
+                on_click=lambda: AIState.generate_trial_summary(nct_id),
+                is_loading=AIState.is_generating_summary.contains(nct_id),
+                class_name="flex items-center text-xs font-medium bg-purple-100 text-purple-700 px-2.5 py-1 rounded-md hover:bg-purple-200",
+            ),
+            class_name="flex justify-between items-center mb-2",
+        ),
+        rx.cond(
+            AIState.is_generating_summary.contains(nct_id),
+            rx.el.div(
+                rx.spinner(),
+                class_name="w-full flex justify-center p-4",
+            ),
+            rx.cond(
+                AIState.ai_summaries.contains(nct_id),
+                rx.el.div(
+                    rx.html(
+                        AIState.ai_summaries[nct_id].replace(
+                            """
+""",
+                            "<br />",
+                        )
+                    ),
+                    class_name="prose prose-sm max-w-none p-3 bg-gray-50 rounded-lg border border-gray-200",
+                ),
+                rx.el.div(
+                    "Click button to generate an AI-powered summary.",
+                    class_name="text-center text-sm text-gray-500 p-4 border border-dashed rounded-lg",
+                ),
+            ),
+        ),
+        rx.el.p(
+            f"Powered by {AIState.current_provider}",
+            class_name="text-xs text-gray-400 text-right mt-1",
+        ),
+        class_name="py-3 border-t border-gray-200",
+    )
+
+
+def mesh_terms_section() -> rx.Component:
+    return rx.cond(
+        TrialDetailState.trial.get("mesh_terms", []).length() > 0,
+        rx.el.div(
+            rx.el.h3(
+                "Therapeutic Areas (MeSH Terms)",
+                class_name="font-semibold text-gray-800 text-base mb-1",
+            ),
+            rx.el.div(
+                rx.foreach(
+                    TrialDetailState.trial.get("mesh_terms", []),
+                    lambda term: rx.el.span(
+                        term,
+                        class_name="bg-blue-100 text-blue-800 text-xs font-medium mr-2 px-2.5 py-0.5 rounded-full",
+                    ),
+                ),
+                class_name="flex flex-wrap gap-2",
+            ),
+            class_name="py-3 border-t border-gray-200",
+        ),
+    )
+
+
+def similar_trials_section() -> rx.Component:
+    return rx.el.div(
+        rx.el.h2(
+            "Similar Trials",
+            class_name="text-xl font-semibold text-gray-800 mb-2 mt-6",
+        ),
+        rx.cond(
+            TrialDetailState.similar_trials.length() > 0,
+            rx.el.div(
+                rx.foreach(
+                    TrialDetailState.similar_trials,
+                    similar_trial_card,
                 ),
+                class_name="space-y-2",
+            ),
+            rx.el.p(
+                "No similar trials found.",
+                class_name="text-sm text-gray-500 italic",
+            ),
+        ),
+        class_name="py-3 border-t border-gray-200",
+    )
+
+
+def related_trials_section() -> rx.Component:
+    return rx.cond(
+        TrialDetailState.related_trials.length() > 0,
+        rx.el.div(
+            rx.el.h2(
+                "More Like This",
+                class_name="text-xl font-semibold text-gray-800 mb-1 mt-6",
+            ),
+            rx.el.p(
+                "Trials with similar designs and objectives.",
+                class_name="text-sm text-gray-500 mb-2",
+            ),
+            rx.el.div(
+                rx.foreach(TrialDetailState.related_trials, similar_trial_card),
+                class_name="space-y-2",
             ),
             class_name="py-3 border-t border-gray-200",
         ),
     )
 
 
+def detail_tab_button(label: str, tab: str) -> rx.Component:
+    return rx.el.button(
+        label,
+        on_click=TrialDetailState.set_active_tab(tab),
+        class_name=rx.cond(
+            TrialDetailState.active_tab == tab,
+            "px-3 py-2 text-sm font-medium text-blue-700 border-b-2 border-blue-600",
+            "px-3 py-2 text-sm font-medium text-gray-500 border-b-2 border-transparent hover:text-gray-700",
+        ),
+    )
+
+
+def detail_tabs() -> rx.Component:
+    factors = TrialDetailState.complexity_factors
+    return rx.el.div(
+        detail_tab_button("Overview", "overview"),
+        detail_tab_button("Description", "description"),
+        detail_tab_button("Eligibility", "eligibility"),
+        detail_tab_button(f"Locations ({factors['locations']})", "locations"),
+        detail_tab_button(f"Arms & Outcomes ({factors['outcomes']})", "design"),
+        detail_tab_button("References", "references"),
+        class_name="flex flex-wrap gap-1 border-b border-gray-200 mt-3",
+    )
+
+
+def overview_tab() -> rx.Component:
+    trial = TrialDetailState.trial
+    return rx.el.div(
+        detail_section("Official Title", trial.get("official_title")),
+        detail_section("Brief Summary", trial.get("brief_summary")),
+        ai_summary_section(),
+        trial_chat_panel(),
+        enrollment_chart(),
+        list_section(
+            "Interventions",
+            trial.get("interventions", []),
+            lambda i: rx.el.div(
+                f"{i.get('intervention_type')}: {i.get('name')}",
+                class_name="p-3 border rounded-lg bg-white text-sm",
+            ),
+        ),
+        list_section(
+            "Sponsors",
+            trial.get("sponsors", []),
+            lambda s: rx.el.div(
+                f"{s.get('lead_or_collaborator')}: {s.get('name')} ({s.get('agency_class')})",
+                class_name="p-3 border rounded-lg bg-white text-sm",
+            ),
+        ),
+        sponsor_portfolio_section(),
+        mesh_terms_section(),
+        similar_trials_section(),
+        related_trials_section(),
+    )
+
+
+def description_tab() -> rx.Component:
+    return rx.cond(
+        TrialDetailState.detailed_description != "",
+        detail_section("Detailed Description", TrialDetailState.detailed_description),
+        rx.el.p(
+            "No detailed description provided.",
+            class_name="py-3 text-sm text-gray-500 italic",
+        ),
+    )
+
+
+def locations_tab() -> rx.Component:
+    return rx.el.div(
+        trial_locations_map(),
+        list_section("Recruiting Locations", TrialDetailState.locations, location_item),
+    )
+
+
+def design_tab() -> rx.Component:
+    return rx.el.div(
+        list_section(
+            "Treatment Arms / Design Groups",
+            TrialDetailState.design_groups,
+            design_group_item,
+        ),
+        list_section(
+            "Primary Outcomes", TrialDetailState.primary_outcomes, design_outcome_item
+        ),
+        list_section(
+            "Secondary Outcomes",
+            TrialDetailState.secondary_outcomes,
+            design_outcome_item,
+        ),
+    )
+
+
+def references_tab() -> rx.Component:
+    return list_section(
+        "References",
+        TrialDetailState.references,
+        lambda r: rx.el.div(
+            r.get("citation"), class_name="text-xs italic text-gray-600"
+        ),
+    )
+
+
 def trial_detail_page() -> rx.Component:
     trial = TrialDetailState.trial
     return rx.el.div(
@@ -454,157 +784,15 @@ def trial_detail_page() -> rx.Component:
                                 class_name="mb-2",
                             ),
                             trial_infographic(),
-                            detail_section(
-                                "Official Title", trial.get("official_title")
-                            ),
-                            detail_section("Brief Summary", trial.get("brief_summary")),
-                            detail_section(
-                                "Detailed Description",
-                                trial.get("detailed_description"),
-                            ),
-                            rx.el.div(
-                                rx.el.div(
-                                    rx.el.h3(
-                                        "AI Summary",
-                                        class_name="font-semibold text-gray-800 text-base",
-                                    ),
-                                    rx.el.button(
-                                        rx.icon(
-                                            tag="sparkles", size=14, class_name="mr-1.5"
-                                        ),
-                                        "Generate Summary",
-                                        on_click=lambda: AIState.generate_trial_summary(
-                                            trial["nct_id"]
-                                        ),
-                                        is_loading=AIState.is_generating_summary.contains(
-                                            trial["nct_id"]
-                                        ),
-                                        class_name="flex items-center text-xs font-medium bg-purple-100 text-purple-700 px-2.5 py-1 rounded-md hover:bg-purple-200",
-                                    ),
-                                    class_name="flex justify-between items-center mb-2",
-                                ),
-                                rx.cond(
-                                    AIState.is_generating_summary.contains(
-                                        trial["nct_id"]
-                                    ),
-                                    rx.el.div(
-                                        rx.spinner(),
-                                        class_name="w-full flex justify-center p-4",
-                                    ),
-                                    rx.cond(
-                                        AIState.ai_summaries.contains(trial["nct_id"]),
-                                        rx.el.div(
-                                            rx.html(
-                                                AIState.ai_summaries[
-                                                    trial["nct_id"]
-                                                ].replace(
-                                                    """
-""",
-                                                    "<br />",
-                                                )
-                                            ),
-                                            class_name="prose prose-sm max-w-none p-3 bg-gray-50 rounded-lg border border-gray-200",
-                                        ),
-                                        rx.el.div(
-                                            "Click button to generate an AI-powered summary.",
-                                            class_name="text-center text-sm text-gray-500 p-4 border border-dashed rounded-lg",
-                                        ),
-                                    ),
-                                ),
-                                rx.el.p(
-                                    f"Powered by {AIState.current_provider}",
-                                    class_name="text-xs text-gray-400 text-right mt-1",
-                                ),
-                                class_name="py-3 border-t border-gray-200",
-                            ),
-                            eligibility_criteria_section(),
-                            enrollment_chart(),
-                            trial_locations_map(),
-                            list_section(
-                                "Recruiting Locations",
-                                trial.get("locations", []),
-                                location_item,
-                            ),
-                            list_section(
-                                "Treatment Arms / Design Groups",
-                                trial.get("design_groups", []),
-                                design_group_item,
-                            ),
-                            list_section(
-                                "Primary Outcomes",
-                                TrialDetailState.primary_outcomes,
-                                design_outcome_item,
-                            ),
-                            list_section(
-                                "Secondary Outcomes",
-                                TrialDetailState.secondary_outcomes,
-                                design_outcome_item,
-                            ),
-                            list_section(
-                                "Interventions",
-                                trial.get("interventions", []),
-                                lambda i: rx.el.div(
-                                    f"{i.get('intervention_type')}: {i.get('name')}",
-                                    class_name="p-3 border rounded-lg bg-white text-sm",
-                                ),
-                            ),
-                            list_section(
-                                "Sponsors",
-                                trial.get("sponsors", []),
-                                lambda s: rx.el.div(
-                                    f"{s.get('lead_or_collaborator')}: {s.get('name')} ({s.get('agency_class')})",
-                                    class_name="p-3 border rounded-lg bg-white text-sm",
-                                ),
-                            ),
-                            sponsor_portfolio_section(),
-                            rx.cond(
-                                trial.get("mesh_terms", []).length() > 0,
-                                rx.el.div(
-                                    rx.el.h3(
-                                        "Therapeutic Areas (MeSH Terms)",
-                                        class_name="font-semibold text-gray-800 text-base mb-1",
-                                    ),
-                                    rx.el.div(
-                                        rx.foreach(
-                                            trial.get("mesh_terms", []),
-                                            lambda term: rx.el.span(
-                                                term,
-                                                class_name="bg-blue-100 text-blue-800 text-xs font-medium mr-2 px-2.5 py-0.5 rounded-full",
-                                            ),
-                                        ),
-                                        class_name="flex flex-wrap gap-2",
-                                    ),
-                                    class_name="py-3 border-t border-gray-200",
-                                ),
-                            ),
-                            list_section(
-                                "References",
-                                trial.get("references", []),
-                                lambda r: rx.el.div(
-                                    r.get("citation"),
-                                    class_name="text-xs italic text-gray-600",
-                                ),
-                            ),
-                            rx.el.div(
-                                rx.el.h2(
-                                    "Similar Trials",
-                                    class_name="text-xl font-semibold text-gray-800 mb-2 mt-6",
-                                ),
-                                rx.cond(
-                                    TrialDetailState.similar_trials.length() > 0,
-                                    rx.el.div(
-                                        rx.foreach(
-                                            TrialDetailState.similar_trials,
-                                            similar_trial_card,
-                                        ),
-                                        class_name="space-y-2",
-                                    ),
-                                    rx.el.p(
-                                        "No similar trials found.",
-                                        class_name="text-sm text-gray-500 italic",
-                                    ),
-                                ),
-                                class_name="py-3 border-t border-gray-200",
+                            detail_tabs(),
+                            rx.match(
+                                TrialDetailState.active_tab,
+                                ("description", description_tab()),
+                                ("eligibility", eligibility_criteria_section()),
+                                ("locations", locations_tab()),
+                                ("design", design_tab()),
+                                ("references", references_tab()),
+                                overview_tab(),
                             ),
                         ),
                     ),
@@ -1,11 +1,23 @@
 import reflex as rx
+import asyncio
 import logging
-import re
 import datetime
 from typing import TypedDict, cast
 from app.states.auth_state import AuthState
 from app.utils.db import get_db_connection, return_db_connection
 from app.models.trial import Trial
+from app.utils.query_parser import parse_natural_query, empty_structured_query
+from app.utils.text_index import (
+    TEXT_SEARCH_TERM,
+    text_search_for_terms,
+    text_search_problem,
+    text_snippets,
+)
+from app.utils.semantic_index import semantic_search_for_terms, semantic_search_problem
+from app.utils.trial_query import TrialQuery
+from app.utils.user_store import QUERY_HISTORY_LIMIT, get_user_store
+
+SEARCH_RESULT_LIMIT = 50
 
 
 class SearchQuery(TypedDict):
@@ -18,10 +30,6 @@ class SavedSearch(SearchQuery):
     name: str
 
 
-_query_history_db: dict[str, list[SearchQuery]] = {}
-_saved_searches_db: dict[str, list[SavedSearch]] = {}
-
-
 class AdvancedSearchState(rx.State):
     natural_query: str = ""
     structured_query: dict[str, str] = {
@@ -34,12 +42,16 @@ class AdvancedSearchState(rx.State):
         "max_enrollment": "",
         "start_date_from": "",
         "start_date_to": "",
+        "text": "",
     }
     search_results: list[Trial] = []
     total_results: int = 0
     is_searching: bool = False
     query_history: list[SearchQuery] = []
     saved_searches: list[SavedSearch] = []
+    use_ai_parser: bool = True
+    use_semantic_search: bool = False
+    parser_tier: str = ""
 
     async def _get_user_email(self) -> str | None:
         auth_state = await self.get_state(AuthState)
@@ -50,71 +62,55 @@ class AdvancedSearchState(rx.State):
     async def _load_user_data(self):
         user_email = await self._get_user_email()
         if user_email:
-            self.query_history = _query_history_db.setdefault(user_email, [])
-            self.saved_searches = _saved_searches_db.setdefault(user_email, [])
+            store = get_user_store()
+            self.query_history = [
+                cast(SearchQuery, q)
+                for q in await asyncio.to_thread(store.query_history, user_email)
+            ]
+            self.saved_searches = [
+                cast(SavedSearch, s)
+                for s in await asyncio.to_thread(store.saved_searches, user_email)
+            ]
 
     @rx.event
     async def on_page_load(self):
         await self._load_user_data()
 
-    def _parse_natural_query(self):
-        query = self.natural_query.lower()
-        parsed_terms = {
-            "condition": "",
-            "intervention": "",
-            "sponsor": "",
-            "status": "",
-            "phase": "",
-            "min_enrollment": "",
-            "max_enrollment": "",
-            "start_date_from": "",
-            "start_date_to": "",
-        }
-        phase_mappings = {
-            "early phase 1": "EARLY_PHASE1",
-            "phase 1/2": "PHASE1/PHASE2",
-            "phase 2/3": "PHASE2/PHASE3",
-            "phase 1": "PHASE1",
-            "phase 2": "PHASE2",
-            "phase 3": "PHASE3",
-            "phase 4": "PHASE4",
-            "n/a": "NA",
-        }
-        for pattern, value in phase_mappings.items():
-            if re.search("\\b" + pattern + "\\b", query):
-                parsed_terms["phase"] = value
-                break
-        status_mappings = {
-            "recruiting": "RECRUITING",
-            "completed": "COMPLETED",
-            "active": "ACTIVE",
-            "terminated": "TERMINATED",
-        }
-        for term, value in status_mappings.items():
-            if "\\b" + term + "\\b" in query:
-                parsed_terms["status"] = value
-                break
-        condition_match = re.search(
-            "(?:on|for)\\s+([a-z'\\s-]+?)(?=\\s+since|\\s+with|\\s+by|$)", query
-        )
-        if condition_match:
-            parsed_terms["condition"] = condition_match.group(1).strip()
-        sponsor_match = re.search(
-            "(?:with|by|sponsor(?:ed by)?)\\s+([a-z\\s.-]+?)(?=\\s+as sponsor|\\s+since|$)",
-            query,
-        )
-        if sponsor_match:
-            parsed_terms["sponsor"] = sponsor_match.group(1).strip()
-        since_match = re.search("since\\s+(\\d{4})", query)
-        if since_match:
-            parsed_terms["start_date_from"] = f"{since_match.group(1)}-01-01"
-        self.structured_query = parsed_terms
+    @rx.event(background=True)
+    async def translate_natural_query(self):
+        """Translates the natural language query, then runs the search."""
+        async with self:
+            query = self.natural_query
+            use_llm = self.use_ai_parser
+        try:
+            structured_query, tier = parse_natural_query(query, use_llm=use_llm)
+        except Exception as e:
+            logging.exception(f"Error parsing natural language query: {e}")
+            structured_query, tier = (empty_structured_query(), "local")
+        async with self:
+            self.structured_query = {
+                **structured_query,
+                TEXT_SEARCH_TERM: self.structured_query.get(TEXT_SEARCH_TERM, ""),
+            }
+            self.parser_tier = tier
+        yield AdvancedSearchState.execute_search
 
     @rx.event
     def handle_natural_query_submit(self, form_data: dict):
         self.natural_query = form_data.get("natural_query", "").strip()
-        self._parse_natural_query()
-        return AdvancedSearchState.execute_search()
+        return AdvancedSearchState.translate_natural_query
+
+    @rx.event
+    def set_structured_field(self, name: str, value: str):
+        self.structured_query[name] = value
+
+    @rx.event
+    def set_use_ai_parser(self, value: bool):
+        self.use_ai_parser = value
+
+    @rx.event
+    def set_use_semantic_search(self, value: bool):
+        self.use_semantic_search = value
 
     @rx.event
     def handle_structured_query_submit(self, form_data: dict):
@@ -126,55 +122,34 @@ class AdvancedSearchState(rx.State):
         async with self:
             self.is_searching = True
             self.search_results = []
-        where_clauses = []
-        params = {}
-        for key, value in self.structured_query.items():
-            if value:
-                if key == "condition":
-                    where_clauses.append(
-                        "s.nct_id IN (SELECT nct_id FROM ctgov.conditions WHERE name ILIKE %(condition)s)"
-                    )
-                    params["condition"] = f"%{value}%"
-                elif key == "intervention":
-                    where_clauses.append(
-                        "s.nct_id IN (SELECT nct_id FROM ctgov.interventions WHERE name ILIKE %(intervention)s)"
-                    )
-                    params["intervention"] = f"%{value}%"
-                elif key == "sponsor":
-                    where_clauses.append(
-                        "s.nct_id IN (SELECT nct_id FROM ctgov.sponsors WHERE name ILIKE %(sponsor)s)"
-                    )
-                    params["sponsor"] = f"%{value}%"
-                elif key == "status":
-                    where_clauses.append("s.overall_status = %(status)s")
-                    params["status"] = value
-                elif key == "phase":
-                    where_clauses.append("s.phase = %(phase)s")
-                    params["phase"] = value
-                elif key == "min_enrollment":
-                    where_clauses.append("s.enrollment >= %(min_enrollment)s")
-                    params["min_enrollment"] = int(value)
-                elif key == "max_enrollment":
-                    where_clauses.append("s.enrollment <= %(max_enrollment)s")
-                    params["max_enrollment"] = int(value)
-                elif key == "start_date_from":
-                    where_clauses.append("s.start_date >= %(start_date_from)s")
-                    params["start_date_from"] = value
-                elif key == "start_date_to":
-                    where_clauses.append("s.start_date <= %(start_date_to)s")
-                    params["start_date_to"] = value
-        where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
-        query = f"SELECT nct_id, brief_title, overall_status, phase, enrollment, start_date, completion_date, study_type, (SELECT COUNT(*) FROM ctgov.facilities WHERE nct_id = s.nct_id) as location_count, (SELECT COUNT(*) FROM ctgov.interventions WHERE nct_id = s.nct_id) as intervention_count FROM ctgov.studies s WHERE {where_sql} ORDER BY s.start_date DESC NULLS LAST LIMIT 50"
+        if self.use_semantic_search:
+            problem = semantic_search_problem(self.structured_query)
+            hits = semantic_search_for_terms(self.structured_query)
+        else:
+            problem = text_search_problem(self.structured_query)
+            hits = text_search_for_terms(self.structured_query)
+        if problem:
+            yield rx.toast.warning(problem)
+        query = TrialQuery.from_terms(
+            self.structured_query, ranked=list(hits) if hits is not None else None
+        )
         conn = None
         try:
             conn = get_db_connection()
             if conn:
                 with conn.cursor() as cur:
-                    cur.execute(query, params)
+                    cur.execute(*query.select(limit=SEARCH_RESULT_LIMIT))
                     results = [
                         dict(zip([desc[0] for desc in cur.description], row))
                         for row in cur.fetchall()
                     ]
+                    if hits is not None:
+                        snippets = text_snippets(
+                            [r["nct_id"] for r in results],
+                            self.structured_query[TEXT_SEARCH_TERM],
+                        )
+                        for r in results:
+                            r["snippet"] = snippets.get(r["nct_id"])
                     async with self:
                         self.search_results = [cast(Trial, r) for r in results]
                         self.total_results = len(results)
@@ -198,13 +173,13 @@ class AdvancedSearchState(rx.State):
             now = datetime.datetime.now(datetime.timezone.utc).isoformat()
             new_entry = SearchQuery(
                 natural_query=self.natural_query,
-                structured_query=self.structured_query,
+                structured_query=dict(self.structured_query),
                 timestamp=now,
             )
-            user_history = _query_history_db.setdefault(user_email, [])
-            user_history.insert(0, new_entry)
-            _query_history_db[user_email] = user_history[:10]
-            self.query_history = _query_history_db[user_email]
+            await asyncio.to_thread(
+                get_user_store().add_query_history, user_email, new_entry
+            )
+            self.query_history = [new_entry, *self.query_history][:QUERY_HISTORY_LIMIT]
 
     @rx.event
     def load_from_history(self, query: SearchQuery):
@@ -213,21 +188,22 @@ class AdvancedSearchState(rx.State):
         return AdvancedSearchState.execute_search()
 
     @rx.event
-    def save_current_search(self, search_name: str):
+    async def save_current_search(self, search_name: str):
         if not search_name.strip():
             return rx.toast.warning("Search name cannot be empty.")
         now = datetime.datetime.now(datetime.timezone.utc).isoformat()
         new_saved_search = SavedSearch(
             name=search_name,
             natural_query=self.natural_query,
-            structured_query=self.structured_query,
+            structured_query=dict(self.structured_query),
             timestamp=now,
         )
-        user_email = self.user.get("email")
+        user_email = await self._get_user_email()
         if user_email:
-            user_searches = _saved_searches_db.setdefault(user_email, [])
-            user_searches.append(new_saved_search)
-            self.saved_searches = user_searches
+            await asyncio.to_thread(
+                get_user_store().add_saved_search, user_email, new_saved_search
+            )
+            self.saved_searches = [*self.saved_searches, new_saved_search]
             return rx.toast.success(f"Search '{search_name}' saved.")
 
     @rx.event
@@ -237,12 +213,13 @@ class AdvancedSearchState(rx.State):
         return AdvancedSearchState.execute_search()
 
     @rx.event
-    def delete_saved_search(self, search_name: str):
-        user_email = self.user.get("email")
+    async def delete_saved_search(self, search_name: str):
+        user_email = await self._get_user_email()
         if user_email:
-            user_searches = _saved_searches_db.get(user_email, [])
-            _saved_searches_db[user_email] = [
-                s for s in user_searches if s["name"] != search_name
+            await asyncio.to_thread(
+                get_user_store().delete_saved_search, user_email, search_name
+            )
+            self.saved_searches = [
+                s for s in self.saved_searches if s["name"] != search_name
             ]
-            self.saved_searches = _saved_searches_db[user_email]
             return rx.toast.info(f"Search '{search_name}' deleted.")
\ No newline at end of file
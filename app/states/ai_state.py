@@ -2,6 +2,10 @@ import reflex as rx
 import logging
 from typing import cast
 from app.utils.ai_helper import ai_client
+from app.utils.prompt_builder import (
+    build_trial_summary_prompt,
+    build_comparison_prompt,
+)
 from app.states.trial_detail_state import TrialDetailState
 from app.states.comparison_state import ComparisonState
 
@@ -30,14 +34,17 @@ class AIState(rx.State):
         try:
             async with self:
                 trial_detail_state = await self.get_state(TrialDetailState)
-                trial = trial_detail_state.trial
+                trial = trial_detail_state._trial
+                view = trial_detail_state._view
             if not trial or trial.get("nct_id") != nct_id:
                 async with self:
                     yield rx.toast.error("Trial data not available for summary.")
                 return
-            prompt = f"Please provide a concise, expert-level summary for the clinical trial with NCT ID {trial.get('nct_id')}. \n            The trial is titled '{trial.get('brief_title')}' and is currently in status '{trial.get('overall_status')}' and phase '{trial.get('phase')}'.\n\n            Here is the brief summary: {trial.get('brief_summary')}\n\n            Here are the eligibility criteria: {trial.get('eligibility_criteria')}\n\n            Based on this information, generate a summary covering the following points in bullet format:\n            - **Key Objective**: What is the main goal of this study?\n            - **Primary Population**: Who are the main participants (based on inclusion/exclusion criteria)?\n            - **Key Endpoints**: What are the primary outcomes being measured?\n            - **Potential Significance**: What is the potential impact or significance of this trial in its field? \n            \n            Keep the language professional and targeted at a clinical research audience."
+            prompt = build_trial_summary_prompt(
+                trial, view["inclusion_criteria"], view["exclusion_criteria"]
+            )
             summary_text = ai_client.generate_content(
-                prompt, cache_key=f"summary_{nct_id}"
+                prompt, cache_key=f"summary_{nct_id}", feature="trial_summary"
             )
             async with self:
                 self.ai_summaries[nct_id] = summary_text
@@ -72,14 +79,11 @@ class AIState(rx.State):
                 return
             yield rx.toast.info("Generating AI comparison insights...")
         try:
-            trials_summary = []
-            for trial in comparison_data:
-                trials_summary.append(
-                    f"- NCT ID: {trial['nct_id']}, Title: {trial['brief_title']}, Status: {trial['overall_status']}, Phase: {trial['phase']}, Enrollment: {trial['enrollment']}"
-                )
-            prompt = f"As a clinical research analyst, provide a comparative analysis of the following clinical trials:\n\n            {chr(10).join(trials_summary)}\n\n            Your analysis should be a narrative that includes:\n            1.  **Key Differences**: Highlight the most significant differences in trial design (e.g., phase, status, enrollment size).\n            2.  **Potential Similarities**: Identify any underlying similarities in objectives or scope that might not be immediately obvious.\n            3.  **Strategic Insight**: Based on the data, offer a brief strategic insight. For example, which trial appears to be higher risk but higher reward? Which is a later-stage validation? \n\n            Present this as a concise report for a strategy meeting. Use bold headings for each section."
+            prompt = build_comparison_prompt(comparison_data)
             insights_text = ai_client.generate_content(
-                prompt, cache_key=f"compare_{selected_nct_ids}"
+                prompt,
+                cache_key=f"compare_{selected_nct_ids}",
+                feature="comparison_insights",
             )
             async with self:
                 self.comparison_insights = insights_text
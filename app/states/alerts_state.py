@@ -1,5 +1,6 @@
 import reflex as rx
 import uuid
+import asyncio
 import datetime
 from typing import Optional, cast
 import logging
@@ -8,9 +9,12 @@ from app.models.trial import Trial
 from app.states.auth_state import AuthState
 from app.utils.db import get_db_connection, return_db_connection
 from app.utils.polars_db import export_df_to_csv
+from app.utils.facility_index import location_search_problem, nearby_trials_for_terms
+from app.utils.trial_query import TrialQuery, ranked_trials
+from app.utils.user_store import get_user_store
 import polars as pl
 
-_watchlists_db: dict[str, dict[str, Watchlist]] = {}
+WATCHLIST_MATCH_LIMIT = 100
 
 
 class AlertsState(rx.State):
@@ -31,9 +35,12 @@ class AlertsState(rx.State):
         user_email = await self._get_user_email()
         if not user_email:
             return None
-        if user_email not in _watchlists_db:
-            _watchlists_db[user_email] = {}
-        return _watchlists_db[user_email]
+        return await asyncio.to_thread(get_user_store().watchlists, user_email)
+
+    async def _put_watchlist(self, watchlist: Watchlist):
+        user_email = await self._get_user_email()
+        if user_email:
+            await asyncio.to_thread(get_user_store().put_watchlist, user_email, watchlist)
 
     @rx.event(background=True)
     async def load_watchlists(self):
@@ -41,13 +48,8 @@ class AlertsState(rx.State):
             self.is_loading = True
         user_watchlists = await self._get_user_watchlists()
         if user_watchlists is not None:
-            watchlists = sorted(
-                list(user_watchlists.values()),
-                key=lambda w: w["created_date"],
-                reverse=True,
-            )
             async with self:
-                self.watchlists = watchlists
+                self.watchlists = list(user_watchlists.values())
         async with self:
             self.is_loading = False
 
@@ -70,11 +72,22 @@ class AlertsState(rx.State):
             phase=form_data.get("phase"),
             status=form_data.get("status"),
             country=form_data.get("country"),
+            near=form_data.get("near"),
+            radius_km=None,
+            site_status=None,
         )
+        if criteria["near"]:
+            criteria["radius_km"] = form_data.get("radius_km")
+            criteria["site_status"] = form_data.get("site_status")
         if not any(criteria.values()):
             async with self:
                 yield rx.toast.warning("At least one criterion is required.")
             return
+        problem = location_search_problem(criteria)
+        if problem:
+            async with self:
+                yield rx.toast.warning(problem)
+            return
         now = datetime.datetime.now(datetime.timezone.utc).isoformat()
         watchlist_id = str(uuid.uuid4())
         new_watchlist = Watchlist(
@@ -87,7 +100,13 @@ class AlertsState(rx.State):
             is_active=True,
             matches=[],
         )
-        user_watchlists[watchlist_id] = new_watchlist
+        try:
+            await self._put_watchlist(new_watchlist)
+        except Exception as e:
+            logging.exception(f"Error saving watchlist: {e}")
+            async with self:
+                yield rx.toast.error("Failed to save watchlist.")
+            return
         async with self:
             self.watchlists.insert(0, new_watchlist)
             self.show_create_dialog = False
@@ -101,7 +120,11 @@ class AlertsState(rx.State):
     async def delete_watchlist(self, watchlist_id: str):
         user_watchlists = await self._get_user_watchlists()
         if user_watchlists and watchlist_id in user_watchlists:
-            del user_watchlists[watchlist_id]
+            await asyncio.to_thread(
+                get_user_store().delete_watchlist,
+                await self._get_user_email(),
+                watchlist_id,
+            )
             async with self:
                 self.watchlists = [
                     w for w in self.watchlists if w["watchlist_id"] != watchlist_id
@@ -114,9 +137,10 @@ class AlertsState(rx.State):
         if user_watchlists and watchlist_id in user_watchlists:
             watchlist = user_watchlists[watchlist_id]
             watchlist["is_active"] = not watchlist["is_active"]
+            await self._put_watchlist(watchlist)
             status = "activated" if watchlist["is_active"] else "deactivated"
             async with self:
-                self.watchlists = [w for w in self.watchlists]
+                self.watchlists = list(user_watchlists.values())
                 yield rx.toast.success(f"Watchlist {status}.")
 
     @rx.event(background=True)
@@ -131,43 +155,20 @@ class AlertsState(rx.State):
             return
         watchlist = user_watchlists[watchlist_id]
         criteria = watchlist["criteria"]
-        where_clauses = []
-        params = {}
-        if criteria.get("condition"):
-            where_clauses.append(
-                "s.nct_id IN (SELECT nct_id FROM ctgov.conditions WHERE name ILIKE %(condition)s)"
-            )
-            params["condition"] = f"%{criteria['condition']}%"
-        if criteria.get("intervention"):
-            where_clauses.append(
-                "s.nct_id IN (SELECT nct_id FROM ctgov.interventions WHERE name ILIKE %(intervention)s)"
-            )
-            params["intervention"] = f"%{criteria['intervention']}%"
-        if criteria.get("sponsor"):
-            where_clauses.append(
-                "s.nct_id IN (SELECT nct_id FROM ctgov.sponsors WHERE name ILIKE %(sponsor)s)"
-            )
-            params["sponsor"] = f"%{criteria['sponsor']}%"
-        if criteria.get("status"):
-            where_clauses.append("s.overall_status = %(status)s")
-            params["status"] = criteria["status"]
-        if criteria.get("phase"):
-            where_clauses.append("s.phase = %(phase)s")
-            params["phase"] = criteria["phase"]
-        if criteria.get("country"):
-            where_clauses.append(
-                "s.nct_id IN (SELECT nct_id FROM ctgov.facilities WHERE country ILIKE %(country)s)"
-            )
-            params["country"] = f"%{criteria['country']}%"
-        where_sql = " AND ".join(where_clauses) if where_clauses else "1=0"
-        query = f"SELECT nct_id, brief_title, overall_status, phase, enrollment, start_date, completion_date, study_type, \n                    (SELECT COUNT(*) FROM ctgov.facilities WHERE nct_id = s.nct_id) as location_count, \n                    (SELECT COUNT(*) FROM ctgov.interventions WHERE nct_id = s.nct_id) as intervention_count \n                    FROM ctgov.studies s WHERE {where_sql} ORDER BY s.start_date DESC NULLS LAST LIMIT 100"
+        nearby = nearby_trials_for_terms(criteria)
+        query = TrialQuery.from_terms(criteria, ranked=ranked_trials(criteria))
+        if query.is_empty():
+            async with self:
+                self.is_checking = False
+                yield rx.toast.warning("This watchlist has no criteria to match.")
+            return
         conn = None
         new_matches = []
         try:
             conn = get_db_connection()
             if conn:
                 with conn.cursor() as cur:
-                    cur.execute(query, params)
+                    cur.execute(*query.select("s.nct_id", limit=WATCHLIST_MATCH_LIMIT))
                     results = cur.fetchall()
                     now = datetime.datetime.now(datetime.timezone.utc).isoformat()
                     current_nct_ids = {m["nct_id"] for m in watchlist["matches"]}
@@ -178,7 +179,11 @@ class AlertsState(rx.State):
                                 WatchlistMatch(
                                     nct_id=nct_id,
                                     matched_date=now,
-                                    match_reason="New trial found",
+                                    match_reason=(
+                                        f"New trial with a site {nearby[nct_id]} km from {criteria['near']}"
+                                        if nearby
+                                        else "New trial found"
+                                    ),
                                 )
                             )
         except Exception as e:
@@ -194,6 +199,7 @@ class AlertsState(rx.State):
                     watchlist["last_checked"] = datetime.datetime.now(
                         datetime.timezone.utc
                     ).isoformat()
+                    await self._put_watchlist(watchlist)
                     self.watchlists = list(user_watchlists.values())
                     yield rx.toast.success(
                         f"Found {len(new_matches)} new matching trials for '{watchlist['name']}'!"
@@ -18,9 +18,12 @@ from app.utils.polars_db import (
 )
 import polars as pl
 import datetime
+from app.states.freshness import FreshnessMixin
 
+ANALYTICS_TTL_SECONDS = 900
 
-class AnalyticsState(rx.State):
+
+class AnalyticsState(FreshnessMixin, rx.State):
     is_loading: bool = True
     phase_distribution: list[dict] = []
     status_distribution: list[dict] = []
@@ -39,52 +42,43 @@ class AnalyticsState(rx.State):
     @rx.event(background=True)
     async def load_analytics_data(self):
         async with self:
-            self.is_loading = True
+            if self._is_fresh("analytics", ANALYTICS_TTL_SECONDS):
+                self.is_loading = False
+                return
+            self.is_loading = not self._has_loaded("analytics")
         try:
-            phase_df = get_phase_distribution()
-            status_df = get_status_distribution()
-            enrollment_df = get_enrollment_trends()
-            geo_df = get_geographic_distribution()
-            sponsor_df = get_top_sponsors()
-            timeline_df = get_timeline_data()
-            conditions_df = get_top_conditions()
-            interventions_df = get_top_interventions()
-            us_state_df = get_us_state_distribution()
-            duration_df = get_trial_duration_distribution()
-            design_df = get_design_patterns()
-            trending_cond_df = get_trending_conditions()
+            results = {
+                "phase_distribution": get_phase_distribution(),
+                "status_distribution": get_status_distribution(),
+                "enrollment_trends": get_enrollment_trends(),
+                "geographic_distribution": get_geographic_distribution(),
+                "sponsor_analysis": get_top_sponsors(),
+                "timeline_data": get_timeline_data(),
+                "top_conditions": get_top_conditions(),
+                "top_interventions": get_top_interventions(),
+                "us_state_distribution": get_us_state_distribution(),
+                "trial_duration_distribution": get_trial_duration_distribution(),
+                "design_patterns": get_design_patterns(),
+                "trending_conditions": get_trending_conditions(),
+            }
             async with self:
-                if phase_df is not None:
-                    self.phase_distribution = phase_df.to_dicts()
-                if status_df is not None:
-                    self.status_distribution = status_df.to_dicts()
-                if enrollment_df is not None:
-                    self.enrollment_trends = enrollment_df.to_dicts()
-                if geo_df is not None:
-                    self.geographic_distribution = geo_df.to_dicts()
-                if sponsor_df is not None:
-                    self.sponsor_analysis = sponsor_df.to_dicts()
-                if timeline_df is not None:
-                    self.timeline_data = timeline_df.to_dicts()
-                if conditions_df is not None:
-                    self.top_conditions = conditions_df.to_dicts()
-                if interventions_df is not None:
-                    self.top_interventions = interventions_df.to_dicts()
-                if us_state_df is not None:
-                    self.us_state_distribution = us_state_df.to_dicts()
-                if duration_df is not None:
-                    self.trial_duration_distribution = duration_df.to_dicts()
-                if design_df is not None:
-                    self.design_patterns = design_df.to_dicts()
-                if trending_cond_df is not None:
-                    self.trending_conditions = trending_cond_df.to_dicts()
+                self._assign_if_changed(
+                    **{
+                        name: df.to_dicts()
+                        for name, df in results.items()
+                        if df is not None
+                    }
+                )
+                if all((df is not None for df in results.values())):
+                    self._mark_loaded("analytics")
         except Exception as e:
             logging.exception(f"Error loading analytics data: {e}")
             async with self:
                 yield rx.toast.error("Failed to load analytics data.")
         finally:
             async with self:
-                self.is_loading = False
+                if self.is_loading:
+                    self.is_loading = False
 
     @rx.event
     def set_active_tab(self, tab_name: str):
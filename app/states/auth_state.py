@@ -1,10 +1,11 @@
 import reflex as rx
 import bcrypt
 import re
+import asyncio
+import logging
 from typing import Optional
 from app.models.user import User
-
-_users: dict[str, User] = {}
+from app.utils.user_store import get_user_store
 
 
 class AuthState(rx.State):
@@ -36,9 +37,6 @@ class AuthState(rx.State):
         if password != confirm_password:
             self.error_message = "Passwords do not match."
             return False
-        if email in _users:
-            self.error_message = "An account with this email already exists."
-            return False
         self.error_message = ""
         return True
 
@@ -60,7 +58,21 @@ class AuthState(rx.State):
         password = form_data.get("password", "")
         password_hash = self._hash_password(password)
         new_user = User(email=email, password_hash=password_hash)
-        _users[email] = new_user
+        try:
+            added = await asyncio.to_thread(get_user_store().add_user, new_user)
+        except Exception as e:
+            logging.exception(f"Failed to register {email}: {e}")
+            async with self:
+                self.is_processing = False
+            yield rx.toast.error("Registration failed. Please try again.")
+            return
+        if not added:
+            error_message = "An account with this email already exists."
+            async with self:
+                self.error_message = error_message
+                self.is_processing = False
+            yield rx.toast.warning(error_message)
+            return
         async with self:
             self.is_authenticated = True
             self.user = new_user
@@ -80,7 +92,11 @@ class AuthState(rx.State):
                 self.is_processing = False
                 yield rx.toast.warning(self.error_message)
             return
-        user = _users.get(email)
+        try:
+            user = await asyncio.to_thread(get_user_store().get_user, email)
+        except Exception as e:
+            logging.exception(f"Failed to look up {email}: {e}")
+            user = None
         if user and self._verify_password(password, user["password_hash"]):
             async with self:
                 self.is_authenticated = True
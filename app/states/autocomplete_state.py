@@ -0,0 +1,13 @@
+import reflex as rx
+from app.utils.autocomplete import SUGGESTION_SOURCES, get_suggestions
+
+
+class AutocompleteState(rx.State):
+    """Holds the datalist suggestions for the condition, intervention and sponsor inputs."""
+
+    suggestions: dict[str, list[str]] = {field: [] for field in SUGGESTION_SOURCES}
+
+    @rx.event
+    def suggest(self, field: str, prefix: str):
+        if field in SUGGESTION_SOURCES:
+            self.suggestions[field] = get_suggestions(field, prefix)
@@ -1,11 +1,80 @@
 import reflex as rx
+import asyncio
 import logging
-from typing import Any, cast
+from typing import Any, Optional, cast
 from app.models.trial import Trial, TrialDetail
 from app.utils.db import get_db_connection, return_db_connection
+from app.utils.filter_index import get_filter_index
+from app.utils.facets import FacetCount, facet_signature, get_facet_counts
+from app.utils.prefetch import prefetch_slot
+from app.utils.trial_cache import prefetch_trial_detail
+from app.utils.facility_index import (
+    get_facility_index,
+    location_search_problem,
+    nearby_trials_for_terms,
+)
+from app.utils.text_index import TEXT_SEARCH_TERM, text_search_problem, text_snippets
+from app.utils.trial_query import TrialQuery, ranked_trials
+from app.states.freshness import FreshnessMixin
 
+PAGE_CACHE_SIZE = 8
+BROWSE_TTL_SECONDS = 120
 
-class BrowseState(rx.State):
+
+def _browse_query(search_terms: dict[str, str]) -> TrialQuery:
+    """Builds the trial query for the Browse search terms."""
+    return TrialQuery.from_terms(search_terms, ranked=ranked_trials(search_terms))
+
+
+def _with_distances(trials: list[dict], search_terms: dict[str, str]) -> list[dict]:
+    """Adds each trial's distance to its nearest matching site for location searches."""
+    nearby = nearby_trials_for_terms(search_terms)
+    if nearby is None:
+        return trials
+    return [{**t, "distance_km": nearby.get(t["nct_id"])} for t in trials]
+
+
+def _with_snippets(trials: list[dict], search_terms: dict[str, str]) -> list[dict]:
+    """Adds a highlighted summary snippet to each trial for text searches."""
+    query = (search_terms.get(TEXT_SEARCH_TERM) or "").strip()
+    if not query or not trials:
+        return trials
+    snippets = text_snippets([t["nct_id"] for t in trials], query)
+    return [{**t, "snippet": snippets.get(t["nct_id"])} for t in trials]
+
+
+def _query_trials_page(cur, query: TrialQuery, page: int, per_page: int) -> list[dict]:
+    """Runs the Browse card query for one page of results."""
+    cur.execute(*query.select(limit=per_page, offset=(page - 1) * per_page))
+    return [
+        dict(zip([desc[0] for desc in cur.description], row)) for row in cur.fetchall()
+    ]
+
+
+def _prefetch_trials_page(
+    search_terms: dict[str, str], page: int, per_page: int
+) -> Optional[list[dict]]:
+    """Loads a results page within the prefetch budget, or returns None if skipped."""
+    with prefetch_slot() as allowed:
+        if not allowed:
+            return None
+        query = _browse_query(search_terms)
+        conn = None
+        try:
+            conn = get_db_connection()
+            if not conn:
+                return None
+            with conn.cursor() as cur:
+                return _query_trials_page(cur, query, page, per_page)
+        except Exception as e:
+            logging.exception(f"Error prefetching browse page {page}: {e}")
+            return None
+        finally:
+            if conn:
+                return_db_connection(conn)
+
+
+class BrowseState(FreshnessMixin, rx.State):
     trials: list[Trial] = []
     total_trials: int = 0
     is_table_loading: bool = True
@@ -21,12 +90,26 @@ class BrowseState(rx.State):
         "status": "",
         "phase": "",
         "study_type": "",
+        "country": "",
+        "near": "",
+        "radius_km": "",
+        "site_status": "",
+        "text": "",
     }
     filter_options: dict[str, list[str]] = {
         "statuses": [],
         "phases": [],
         "study_types": [],
+        "site_statuses": [],
     }
+    facet_counts: dict[str, list[FacetCount]] = {}
+    search_as_you_type: bool = False
+    _search_generation: int = 0
+    _input_events: int = 0
+    _page_cache: dict[int, list[dict]] = {}
+    _page_cache_key: str = ""
+    _page_cache_terms: dict[str, str] = {}
+    _page_cache_total: int = 0
     selected_trial: TrialDetail = cast(TrialDetail, {})
     similar_trials: list[Trial] = []
     bookmark_loading: dict[str, bool] = {}
@@ -37,11 +120,49 @@ class BrowseState(rx.State):
             return 1
         return -(-self.total_trials // self.items_per_page)
 
+    @rx.var
+    def facet_option_labels(self) -> dict[str, dict[str, str]]:
+        """Dropdown labels with the trial count each option would return."""
+        labels = {}
+        for field in ("status", "phase", "study_type"):
+            labels[field] = {
+                facet["value"]: f"{facet['value']} ({facet['count']:,})"
+                for facet in self.facet_counts.get(field, [])
+            }
+        labels["site_status"] = {}
+        return labels
+
+    @rx.var
+    def top_countries(self) -> list[FacetCount]:
+        return self.facet_counts.get("country", [])
+
+    @rx.var
+    def top_sponsors(self) -> list[FacetCount]:
+        return self.facet_counts.get("sponsor", [])
+
     @rx.event(background=True)
     async def load_browse_page_data(self):
         """Load filter options (if not already loaded) and trial data."""
         async with self:
-            self.is_table_loading = True
+            if self._is_fresh("browse", BROWSE_TTL_SECONDS):
+                self.is_table_loading = False
+                return
+            revalidate = self._has_loaded("browse")
+            self.is_table_loading = not revalidate
+            index = get_filter_index()
+            if not self._filter_options_loaded and index is not None:
+                self.filter_options["statuses"] = index.categoricals["status"].labels
+                self.filter_options["phases"] = index.categoricals["phase"].labels
+                self.filter_options["study_types"] = index.categoricals[
+                    "study_type"
+                ].labels
+                self._filter_options_loaded = True
+            facility_index = get_facility_index()
+            if facility_index is not None:
+                self.filter_options["site_statuses"] = facility_index.statuses
+        if index is not None:
+            yield BrowseState.fetch_trials(revalidate)
+            return
         conn = None
         try:
             conn = get_db_connection()
@@ -69,7 +190,7 @@ class BrowseState(rx.State):
                         self.filter_options["phases"] = phases
                         self.filter_options["study_types"] = study_types
                         self._filter_options_loaded = True
-            yield BrowseState.fetch_trials
+            yield BrowseState.fetch_trials(revalidate)
         except Exception as e:
             logging.exception(f"Error loading browse page data: {e}")
             async with self:
@@ -79,74 +200,152 @@ class BrowseState(rx.State):
                 return_db_connection(conn)
 
     @rx.event(background=True)
-    async def fetch_trials(self):
+    async def fetch_trials(self, revalidate: bool = False):
         """Fetch trials based on current search terms and pagination."""
         async with self:
-            self.is_table_loading = True
+            if not revalidate:
+                self.is_table_loading = True
+            self._search_generation += 1
+            generation = self._search_generation
+            search_terms = dict(self.search_terms)
+            current_page = self.current_page
+            logging.info(
+                f"Browse search after {self._input_events} input events: {search_terms}"
+            )
+            self._input_events = 0
+            signature = facet_signature(search_terms)
+            if signature != self._page_cache_key:
+                self._page_cache = {}
+                self._page_cache_key = signature
+                self._page_cache_terms = search_terms
+            cached_page = self._page_cache.get(current_page)
+        for problem in (
+            location_search_problem(search_terms),
+            text_search_problem(search_terms),
+        ):
+            if problem:
+                yield rx.toast.warning(problem)
+        query = _browse_query(search_terms)
+        index_terms = query.local_filters()
+        index = get_filter_index()
+        if index is not None and index_terms is not None:
+            try:
+                total, trials_data = index.search(
+                    index_terms,
+                    current_page,
+                    self.items_per_page,
+                    ranked=query.ranked,
+                )
+                trials_data = _with_snippets(
+                    _with_distances(trials_data, search_terms), search_terms
+                )
+                facets = get_facet_counts(search_terms, query)
+                async with self:
+                    if generation != self._search_generation:
+                        return
+                    self._assign_if_changed(total_trials=total, trials=trials_data)
+                    if facets is not None:
+                        self._assign_if_changed(facet_counts=facets)
+                    self._mark_loaded("browse")
+                    self.is_table_loading = False
+                return
+            except Exception as e:
+                logging.exception(f"Filter index search failed, using SQL: {e}")
+        if cached_page is not None:
+            async with self:
+                if generation != self._search_generation:
+                    return
+                self._assign_if_changed(
+                    trials=_with_snippets(
+                        _with_distances(cached_page, search_terms), search_terms
+                    ),
+                    total_trials=self._page_cache_total,
+                )
+                self._mark_loaded("browse")
+                self.is_table_loading = False
+            yield BrowseState.prefetch_page(current_page + 1)
+            return
         conn = None
         try:
             conn = get_db_connection()
             if conn:
                 with conn.cursor() as cur:
-                    where_clauses = []
-                    params = {}
-                    if self.search_terms.get("nct_id"):
-                        where_clauses.append("s.nct_id ILIKE %(nct_id)s")
-                        params["nct_id"] = f"%{self.search_terms['nct_id']}%"
-                    if self.search_terms.get("condition"):
-                        where_clauses.append(
-                            "s.nct_id IN (SELECT nct_id FROM ctgov.conditions WHERE name ILIKE %(condition)s)"
-                        )
-                        params["condition"] = f"%{self.search_terms['condition']}%"
-                    if self.search_terms.get("intervention"):
-                        where_clauses.append(
-                            "s.nct_id IN (SELECT nct_id FROM ctgov.interventions WHERE name ILIKE %(intervention)s)"
-                        )
-                        params["intervention"] = (
-                            f"%{self.search_terms['intervention']}%"
-                        )
-                    if self.search_terms.get("sponsor"):
-                        where_clauses.append(
-                            "s.nct_id IN (SELECT nct_id FROM ctgov.sponsors WHERE name ILIKE %(sponsor)s)"
-                        )
-                        params["sponsor"] = f"%{self.search_terms['sponsor']}%"
-                    if self.search_terms.get("status"):
-                        where_clauses.append("s.overall_status = %(status)s")
-                        params["status"] = self.search_terms["status"]
-                    if self.search_terms.get("phase"):
-                        where_clauses.append("s.phase = %(phase)s")
-                        params["phase"] = self.search_terms["phase"]
-                    if self.search_terms.get("study_type"):
-                        where_clauses.append("s.study_type = %(study_type)s")
-                        params["study_type"] = self.search_terms["study_type"]
-                    where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
-                    count_query = (
-                        f"SELECT COUNT(*) FROM ctgov.studies s WHERE {where_sql}"
-                    )
-                    cur.execute(count_query, params)
+                    cur.execute(*query.count())
                     total = cur.fetchone()[0]
-                    offset = (self.current_page - 1) * self.items_per_page
-                    params.update({"limit": self.items_per_page, "offset": offset})
-                    data_query = f"\n                    WITH FirstMesh AS (\n                        SELECT nct_id, mesh_term, ROW_NUMBER() OVER(PARTITION BY nct_id ORDER BY id) as rn\n                        FROM ctgov.browse_conditions\n                    )\n                    SELECT \n                        s.nct_id, s.brief_title, s.overall_status, s.phase, s.enrollment, s.start_date, s.completion_date, s.study_type,\n                        (SELECT COUNT(*) FROM ctgov.facilities WHERE nct_id = s.nct_id) as location_count,\n                        (SELECT COUNT(*) FROM ctgov.interventions WHERE nct_id = s.nct_id) as intervention_count,\n                        fm.mesh_term as primary_therapeutic_area\n                    FROM ctgov.studies s\n                    LEFT JOIN FirstMesh fm ON s.nct_id = fm.nct_id AND fm.rn = 1\n                    WHERE {where_sql}\n                    ORDER BY s.start_date DESC NULLS LAST \n                    LIMIT %(limit)s OFFSET %(offset)s\n                    "
-                    cur.execute(data_query, params)
-                    trials_data = [
-                        dict(zip([desc[0] for desc in cur.description], row))
-                        for row in cur.fetchall()
-                    ]
+                    trials_data = _query_trials_page(
+                        cur, query, current_page, self.items_per_page
+                    )
+                    trials_data = _with_snippets(
+                        _with_distances(trials_data, search_terms), search_terms
+                    )
                     async with self:
-                        self.total_trials = total
-                        self.trials = trials_data
+                        if generation != self._search_generation:
+                            return
+                        self._assign_if_changed(total_trials=total, trials=trials_data)
+                        self._mark_loaded("browse")
+                        if self._page_cache_key == signature:
+                            self._page_cache[current_page] = trials_data
+                            self._page_cache_total = total
+            facets = get_facet_counts(search_terms, query)
+            if facets is not None:
+                async with self:
+                    if generation == self._search_generation:
+                        self._assign_if_changed(facet_counts=facets)
+            yield BrowseState.prefetch_page(current_page + 1)
         except Exception as e:
             logging.exception(f"Error fetching trials: {e}")
         finally:
             if conn:
                 return_db_connection(conn)
             async with self:
-                self.is_table_loading = False
+                if generation == self._search_generation and self.is_table_loading:
+                    self.is_table_loading = False
+
+    @rx.event(background=True)
+    async def prefetch_page(self, page: int):
+        """Speculatively loads the given page of the last search into the page cache."""
+        async with self:
+            if page > self.total_pages or page in self._page_cache:
+                return
+            signature = self._page_cache_key
+            search_terms = dict(self._page_cache_terms)
+        trials_data = await asyncio.to_thread(
+            _prefetch_trials_page, search_terms, page, self.items_per_page
+        )
+        if trials_data is None:
+            return
+        async with self:
+            if self._page_cache_key != signature:
+                return
+            self._page_cache[page] = trials_data
+            while len(self._page_cache) > PAGE_CACHE_SIZE:
+                farthest = max(
+                    self._page_cache, key=lambda p: abs(p - self.current_page)
+                )
+                del self._page_cache[farthest]
+
+    @rx.event(background=True)
+    async def prefetch_trial(self, nct_id: str):
+        """Warms the trial detail cache for a card the user is hovering."""
+        await asyncio.to_thread(prefetch_trial_detail, nct_id)
 
     @rx.event
     def set_search_term(self, name: str, value: str):
         self.search_terms[name] = value
+        self._input_events += 1
+        if self.search_as_you_type:
+            self.current_page = 1
+            return BrowseState.fetch_trials
+
+    @rx.event
+    def set_search_as_you_type(self, value: bool):
+        self.search_as_you_type = value
+
+    @rx.event
+    def apply_facet(self, name: str, value: str):
+        self.search_terms[name] = value
+        self.current_page = 1
+        return BrowseState.fetch_trials
 
     @rx.event
     def handle_search(self, form_data: dict[str, Any]):
@@ -1,9 +1,31 @@
 import reflex as rx
 import logging
+import polars as pl
 from app.utils.db import get_db_connection, return_db_connection
+from app.utils.study_snapshot import get_study_snapshot
+from app.states.freshness import FreshnessMixin
 
+DASHBOARD_TTL_SECONDS = 300
 
-class DashboardState(rx.State):
+
+def _snapshot_counts() -> dict[str, int] | None:
+    """Counts the dashboard headline figures from the study snapshot in one pass."""
+    studies = get_study_snapshot()
+    if studies is None:
+        return None
+    status, phase = pl.col("overall_status"), pl.col("phase")
+    return studies.select(
+        total=pl.len(),
+        active=(status == "RECRUITING").sum(),
+        completed=(status == "COMPLETED").sum(),
+        phase_1=(phase == "PHASE1").sum(),
+        phase_2=(phase == "PHASE2").sum(),
+        phase_3=(phase == "PHASE3").sum(),
+        phase_4=(phase == "PHASE4").sum(),
+    ).row(0, named=True)
+
+
+class DashboardState(FreshnessMixin, rx.State):
     """The state for the dashboard page."""
 
     is_loading: bool = True
@@ -18,40 +40,31 @@ class DashboardState(rx.State):
 
     @rx.event(background=True)
     async def load_dashboard_data(self):
-        """Load dashboard metrics from the database."""
+        """Load dashboard metrics, revalidating in the background once loaded."""
         async with self:
-            self.is_loading = True
+            if self._is_fresh("dashboard", DASHBOARD_TTL_SECONDS):
+                self.is_loading = False
+                return
+            self.is_loading = not self._has_loaded("dashboard")
         conn = None
         try:
             conn = get_db_connection()
             if conn:
                 with conn.cursor() as cur:
-                    cur.execute("SELECT COUNT(*) FROM ctgov.studies")
-                    total = cur.fetchone()[0]
-                    cur.execute(
-                        "SELECT COUNT(*) FROM ctgov.studies WHERE overall_status = 'RECRUITING'"
-                    )
-                    active = cur.fetchone()[0]
-                    cur.execute(
-                        "SELECT COUNT(*) FROM ctgov.studies WHERE overall_status = 'COMPLETED'"
-                    )
-                    completed = cur.fetchone()[0]
-                    cur.execute(
-                        "SELECT COUNT(*) FROM ctgov.studies WHERE phase = 'PHASE1'"
-                    )
-                    phase_1 = cur.fetchone()[0]
-                    cur.execute(
-                        "SELECT COUNT(*) FROM ctgov.studies WHERE phase = 'PHASE2'"
-                    )
-                    phase_2 = cur.fetchone()[0]
-                    cur.execute(
-                        "SELECT COUNT(*) FROM ctgov.studies WHERE phase = 'PHASE3'"
-                    )
-                    phase_3 = cur.fetchone()[0]
-                    cur.execute(
-                        "SELECT COUNT(*) FROM ctgov.studies WHERE phase = 'PHASE4'"
-                    )
-                    phase_4 = cur.fetchone()[0]
+                    counts = _snapshot_counts()
+                    if counts is None:
+                        counts = {}
+                        for name, where in (
+                            ("total", "TRUE"),
+                            ("active", "overall_status = 'RECRUITING'"),
+                            ("completed", "overall_status = 'COMPLETED'"),
+                            ("phase_1", "phase = 'PHASE1'"),
+                            ("phase_2", "phase = 'PHASE2'"),
+                            ("phase_3", "phase = 'PHASE3'"),
+                            ("phase_4", "phase = 'PHASE4'"),
+                        ):
+                            cur.execute(f"SELECT COUNT(*) FROM ctgov.studies WHERE {where}")
+                            counts[name] = cur.fetchone()[0]
                     cur.execute(
                         "SELECT nct_id, brief_title, overall_status, phase, enrollment, start_date FROM ctgov.studies ORDER BY study_first_posted_date DESC LIMIT 8"
                     )
@@ -60,14 +73,17 @@ class DashboardState(rx.State):
                         for row in cur.fetchall()
                     ]
                     async with self:
-                        self.total_trials = total
-                        self.active_trials = active
-                        self.completed_trials = completed
-                        self.phase_1_trials = phase_1
-                        self.phase_2_trials = phase_2
-                        self.phase_3_trials = phase_3
-                        self.phase_4_trials = phase_4
-                        self.recent_trials = recent
+                        self._assign_if_changed(
+                            total_trials=counts["total"],
+                            active_trials=counts["active"],
+                            completed_trials=counts["completed"],
+                            phase_1_trials=counts["phase_1"],
+                            phase_2_trials=counts["phase_2"],
+                            phase_3_trials=counts["phase_3"],
+                            phase_4_trials=counts["phase_4"],
+                            recent_trials=recent,
+                        )
+                        self._mark_loaded("dashboard")
                     yield
             else:
                 logging.error("Failed to get database connection.")
@@ -77,4 +93,5 @@ class DashboardState(rx.State):
             if conn:
                 return_db_connection(conn)
             async with self:
-                self.is_loading = False
\ No newline at end of file
+                if self.is_loading:
+                    self.is_loading = False
\ No newline at end of file
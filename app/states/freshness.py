@@ -0,0 +1,39 @@
+import time
+import reflex as rx
+
+
+class FreshnessMixin(rx.State, mixin=True):
+    """
+    Stale-while-revalidate bookkeeping for page states.
+
+    A page load is skipped while the state's data is younger than its TTL.
+    Once stale, the existing data stays on screen while it reloads in the
+    background, and only the vars whose values changed are sent to the client.
+    """
+
+    _loaded_at: dict[str, float] = {}
+
+    def _is_fresh(self, key: str, ttl_seconds: float) -> bool:
+        loaded_at = self._loaded_at.get(key)
+        return loaded_at is not None and time.monotonic() - loaded_at < ttl_seconds
+
+    def _has_loaded(self, key: str) -> bool:
+        return key in self._loaded_at
+
+    def _mark_loaded(self, key: str):
+        self._loaded_at[key] = time.monotonic()
+
+    def _invalidate(self, key: str | None = None):
+        if key is None:
+            self._loaded_at = {}
+        else:
+            self._loaded_at.pop(key, None)
+
+    def _assign_if_changed(self, **values) -> list[str]:
+        """Sets each var only if its value differs, so unchanged vars send no delta."""
+        changed = []
+        for name, value in values.items():
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                changed.append(name)
+        return changed
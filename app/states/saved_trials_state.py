@@ -1,4 +1,5 @@
 import reflex as rx
+import asyncio
 import logging
 import datetime
 from typing import cast
@@ -7,11 +8,11 @@ from app.models.saved_trial import SavedTrial
 from app.states.auth_state import AuthState
 from app.utils.db import get_db_connection, return_db_connection
 from app.utils.polars_db import export_df_to_csv
+from app.states.freshness import FreshnessMixin
+from app.utils.user_store import get_user_store
 
-_saved_trials_db: dict[str, dict[str, SavedTrial]] = {}
 
-
-class SavedTrialsState(rx.State):
+class SavedTrialsState(FreshnessMixin, rx.State):
     saved_trials: list[SavedTrial] = []
     is_loading: bool = False
     selected_nct_ids: list[str] = []
@@ -35,33 +36,45 @@ class SavedTrialsState(rx.State):
     def available_tags_for_bulk_add(self) -> list[str]:
         return [tag for tag in self.available_tags if tag != "All"]
 
-    async def _get_user_trials(self) -> dict[str, SavedTrial] | None:
+    async def _get_user_email(self) -> str | None:
         auth_state = await self.get_state(AuthState)
-        user = auth_state.user
-        if not user:
+        if auth_state.user:
+            return auth_state.user["email"]
+        return None
+
+    async def _get_user_trials(self) -> dict[str, SavedTrial] | None:
+        user_email = await self._get_user_email()
+        if not user_email:
             return None
-        if user["email"] not in _saved_trials_db:
-            _saved_trials_db[user["email"]] = {}
-        return _saved_trials_db[user["email"]]
+        return await asyncio.to_thread(get_user_store().saved_trials, user_email)
+
+    async def _put_user_trials(self, trials: list[SavedTrial]):
+        user_email = await self._get_user_email()
+        if user_email and trials:
+            await asyncio.to_thread(get_user_store().put_saved_trials, user_email, trials)
 
     @rx.event(background=True)
     async def load_saved_trials(self):
         async with self:
-            self.is_loading = True
+            self.is_loading = not self._has_loaded("saved_trials")
         try:
             user_trials = await self._get_user_trials()
             if user_trials is not None:
                 async with self:
-                    self.saved_trials = sorted(
-                        list(user_trials.values()),
-                        key=lambda t: t["saved_date"],
-                        reverse=True,
+                    self._assign_if_changed(
+                        saved_trials=sorted(
+                            list(user_trials.values()),
+                            key=lambda t: t["saved_date"],
+                            reverse=True,
+                        )
                     )
+                    self._mark_loaded("saved_trials")
         except Exception as e:
             logging.exception(f"Error loading saved trials: {e}")
         finally:
             async with self:
-                self.is_loading = False
+                if self.is_loading:
+                    self.is_loading = False
 
     @rx.event(background=True)
     async def save_trial(self, nct_id: str):
@@ -96,8 +109,8 @@ class SavedTrialsState(rx.State):
                             notes="",
                             last_updated=now,
                         )
-                        user_trials[nct_id] = saved_trial
                         async with self:
+                            await self._put_user_trials([saved_trial])
                             self.saved_trials.insert(0, saved_trial)
                             yield rx.toast.success(f"Trial {nct_id} saved!")
                     else:
@@ -113,9 +126,12 @@ class SavedTrialsState(rx.State):
 
     @rx.event
     async def remove_trial(self, nct_id: str):
+        user_email = await self._get_user_email()
         user_trials = await self._get_user_trials()
         if user_trials and nct_id in user_trials:
-            del user_trials[nct_id]
+            await asyncio.to_thread(
+                get_user_store().remove_saved_trials, user_email, [nct_id]
+            )
             self.saved_trials = [t for t in self.saved_trials if t["nct_id"] != nct_id]
             self.selected_nct_ids = [i for i in self.selected_nct_ids if i != nct_id]
             return rx.toast.info(f"Trial {nct_id} removed.")
@@ -129,6 +145,7 @@ class SavedTrialsState(rx.State):
                 user_trials[nct_id]["last_updated"] = datetime.datetime.now(
                     datetime.timezone.utc
                 ).isoformat()
+                await self._put_user_trials([user_trials[nct_id]])
                 self.saved_trials = list(user_trials.values())
 
     @rx.event
@@ -140,6 +157,7 @@ class SavedTrialsState(rx.State):
                 user_trials[nct_id]["last_updated"] = datetime.datetime.now(
                     datetime.timezone.utc
                 ).isoformat()
+                await self._put_user_trials([user_trials[nct_id]])
                 self.saved_trials = list(user_trials.values())
 
     @rx.event
@@ -150,6 +168,7 @@ class SavedTrialsState(rx.State):
             user_trials[nct_id]["last_updated"] = datetime.datetime.now(
                 datetime.timezone.utc
             ).isoformat()
+            await self._put_user_trials([user_trials[nct_id]])
             self.saved_trials = list(user_trials.values())
 
     @rx.event
@@ -161,13 +180,14 @@ class SavedTrialsState(rx.State):
 
     @rx.event
     async def bulk_remove(self):
+        user_email = await self._get_user_email()
         user_trials = await self._get_user_trials()
         if user_trials:
-            removed_count = 0
-            for nct_id in self.selected_nct_ids:
-                if nct_id in user_trials:
-                    del user_trials[nct_id]
-                    removed_count += 1
+            removed = [i for i in self.selected_nct_ids if i in user_trials]
+            await asyncio.to_thread(
+                get_user_store().remove_saved_trials, user_email, removed
+            )
+            removed_count = len(removed)
             self.saved_trials = [
                 t for t in self.saved_trials if t["nct_id"] not in self.selected_nct_ids
             ]
@@ -178,11 +198,13 @@ class SavedTrialsState(rx.State):
     async def bulk_add_tag(self, tag: str):
         user_trials = await self._get_user_trials()
         if user_trials:
-            updated_count = 0
+            updated = []
             for nct_id in self.selected_nct_ids:
                 if nct_id in user_trials and tag not in user_trials[nct_id]["tags"]:
                     user_trials[nct_id]["tags"].append(tag)
-                    updated_count += 1
+                    updated.append(user_trials[nct_id])
+            await self._put_user_trials(updated)
+            updated_count = len(updated)
             self.saved_trials = list(user_trials.values())
             self.selected_nct_ids = []
             return rx.toast.success(f"Tag '{tag}' added to {updated_count} trials.")
@@ -0,0 +1,74 @@
+import reflex as rx
+import logging
+from typing import TypedDict
+from app.utils.ai_helper import ai_client
+from app.utils.prompt_builder import build_trial_chat_prompt
+from app.utils.trial_index import get_trial_chunk_index
+from app.states.trial_detail_state import TrialDetailState
+
+RETRIEVAL_TOP_K = 4
+
+
+class ChatMessage(TypedDict):
+    role: str
+    content: str
+    sources: list[str]
+
+
+class TrialChatState(rx.State):
+    """State for the conversational Q&A panel on the trial detail page."""
+
+    conversations: dict[str, list[ChatMessage]] = {}
+    is_answering: bool = False
+    question: str = ""
+
+    @rx.event
+    def set_question(self, value: str):
+        self.question = value
+
+    @rx.event
+    def clear_conversation(self, nct_id: str):
+        self.conversations.pop(nct_id, None)
+
+    @rx.event(background=True)
+    async def ask_question(self, form_data: dict):
+        question = form_data.get("question", "").strip()
+        async with self:
+            if self.is_answering or not question:
+                return
+            trial_detail_state = await self.get_state(TrialDetailState)
+            trial = trial_detail_state._trial
+            view = trial_detail_state._view
+            nct_id = trial.get("nct_id") if trial else None
+            if not nct_id:
+                yield rx.toast.error("Trial data not available for chat.")
+                return
+            self.is_answering = True
+            self.question = ""
+            history = list(self.conversations.get(nct_id, []))
+            self.conversations[nct_id] = history + [
+                ChatMessage(role="user", content=question, sources=[])
+            ]
+        try:
+            index = get_trial_chunk_index(
+                trial, view["inclusion_criteria"], view["exclusion_criteria"]
+            )
+            retrieved = [
+                chunk for chunk, _ in index.search(question, top_k=RETRIEVAL_TOP_K)
+            ]
+            prompt = build_trial_chat_prompt(trial, question, retrieved, history)
+            answer = ai_client.generate_content(prompt, feature="trial_chat")
+            sources = sorted({chunk["section"] for chunk in retrieved})
+            async with self:
+                self.conversations[nct_id] = self.conversations.get(nct_id, []) + [
+                    ChatMessage(role="assistant", content=answer, sources=sources)
+                ]
+                if answer.startswith("Error:"):
+                    yield rx.toast.error(answer)
+        except Exception as e:
+            logging.exception(f"Error answering trial chat question: {e}")
+            async with self:
+                yield rx.toast.error("Failed to answer the question.")
+        finally:
+            async with self:
+                self.is_answering = False
@@ -1,11 +1,24 @@
 import reflex as rx
+import asyncio
 import logging
 import re
-from typing import cast, TypedDict
-from app.models.trial import Trial, TrialDetail
+from typing import cast, Optional, TypedDict
+from app.models.trial import (
+    Trial,
+    TrialDetail,
+    Location,
+    DesignGroup,
+    Sponsor,
+    StudyReference,
+)
 from app.utils.db import get_db_connection, return_db_connection
+from app.utils.trial_cache import get_trial_detail
+from app.utils.gazetteer import geocode_locations
+from app.utils.marker_clusters import FacilityPoints, MapCluster
+from app.utils.similarity_index import SimilarTrial, find_similar_trials
+from app.utils.semantic_index import more_like_this
 from app.models.trial import DesignOutcome
-from reflex_enterprise.components.map.types import LatLng, latlng
+from reflex_enterprise.components.map.types import LatLng, MoveEvent, latlng
 import datetime
 
 
@@ -23,313 +36,391 @@ class ComplexityFactors(TypedDict):
     design_groups: int
 
 
-class TrialDetailState(rx.State):
-    is_loading: bool = True
-    trial: TrialDetail = cast(TrialDetail, {})
-    similar_trials: list[Trial] = []
-    sponsor_portfolio: list[Trial] = []
-    map_center: LatLng = latlng(lat=0, lng=0)
-    map_zoom: float = 2.0
+class LocationMarker(TypedDict):
+    position: LatLng
+    popup: str
 
-    @rx.var
-    def _nct_id_from_route(self) -> str:
-        """Get the nct_id from the router params."""
-        return self.router.page.params.get("nct_id", "")
 
-    @rx.var
-    def primary_outcomes(self) -> list[DesignOutcome]:
-        """Return primary design outcomes."""
-        outcomes = self.trial.get("design_outcomes", [])
-        if not outcomes:
-            return []
-        return [o for o in outcomes if o.get("outcome_type") == "primary"]
+class TrialView(TypedDict):
+    """Fields derived from a trial document, computed once when it loads."""
 
-    @rx.var
-    def secondary_outcomes(self) -> list[DesignOutcome]:
-        """Return secondary design outcomes."""
-        outcomes = self.trial.get("design_outcomes", [])
-        if not outcomes:
-            return []
-        return [o for o in outcomes if o.get("outcome_type") == "secondary"]
-
-    def _parse_criteria(self, text: str | None) -> tuple[list[str], list[str], str]:
-        if not text:
-            return ([], [], "")
-        inclusion_keywords = ("Inclusion Criteria:", "Key Inclusion Criteria:")
-        exclusion_keywords = ("Exclusion Criteria:", "Key Exclusion Criteria:")
-        note_keyword = "Note:"
-        text = text.replace(
-            "\\n",
-            """
-""",
-        )
-        parts = re.split(f"({'|'.join(exclusion_keywords)})", text, flags=re.IGNORECASE)
-        inclusion_text = parts[0]
-        exclusion_text = "".join(parts[1:]) if len(parts) > 1 else ""
-        for keyword in inclusion_keywords:
-            if keyword.lower() in inclusion_text.lower():
-                inclusion_text = re.split(keyword, inclusion_text, flags=re.IGNORECASE)[
-                    -1
-                ]
-                break
-        note_parts = re.split(f"({note_keyword})", exclusion_text, flags=re.IGNORECASE)
-        main_exclusion_text = note_parts[0]
-        note = "".join(note_parts[1:]).strip() if len(note_parts) > 1 else ""
-        for keyword in exclusion_keywords:
-            if keyword.lower() in main_exclusion_text.lower():
-                main_exclusion_text = re.split(
-                    keyword, main_exclusion_text, flags=re.IGNORECASE
-                )[-1]
-                break
-        inclusion_items = [
-            item.strip() for item in inclusion_text.split("*") if item.strip()
-        ]
-        exclusion_items = [
-            item.strip() for item in main_exclusion_text.split("*") if item.strip()
-        ]
-        return (inclusion_items, exclusion_items, note)
+    inclusion_criteria: list[str]
+    exclusion_criteria: list[str]
+    eligibility_note: str
+    complexity_factors: ComplexityFactors
+    complexity_score: int
+    complexity_rating: str
+    lead_sponsor: Optional[Sponsor]
+    trial_duration_days: int
+    location_markers: list[LocationMarker]
+    primary_outcomes: list[DesignOutcome]
+    secondary_outcomes: list[DesignOutcome]
+    map_center: LatLng
+    map_zoom: float
 
-    @rx.var
-    def inclusion_criteria(self) -> list[str]:
-        criteria_text = self.trial.get("eligibility_criteria")
-        return self._parse_criteria(criteria_text)[0]
 
-    @rx.var
-    def exclusion_criteria(self) -> list[str]:
-        criteria_text = self.trial.get("eligibility_criteria")
-        return self._parse_criteria(criteria_text)[1]
+HEAVY_TRIAL_FIELDS = (
+    "detailed_description",
+    "eligibility_criteria",
+    "locations",
+    "design_groups",
+    "design_outcomes",
+    "references",
+)
+_TEXT_FIELDS = ("detailed_description", "eligibility_criteria")
+DETAIL_TABS = {
+    "overview": (),
+    "description": ("detailed_description",),
+    "eligibility": ("eligibility_criteria",),
+    "locations": ("locations",),
+    "design": ("design_groups", "design_outcomes"),
+    "references": ("references",),
+}
+TAB_VIEW_FIELDS = {
+    "eligibility": ("inclusion_criteria", "exclusion_criteria", "eligibility_note"),
+    "design": ("primary_outcomes", "secondary_outcomes"),
+}
 
-    @rx.var
-    def eligibility_note(self) -> str:
-        """Extract note section from eligibility criteria if present."""
-        criteria = self.trial.get("eligibility_criteria", "")
-        if not criteria:
-            return ""
-        note_lines = []
-        capture = False
-        for line in criteria.split("""
-"""):
-            line_stripped = line.strip()
-            if line_stripped.lower().startswith("note:"):
-                capture = True
-            if capture and line_stripped:
-                note_lines.append(line_stripped)
-        if note_lines:
-            note_lines[0] = note_lines[0][5:].strip()
-            return " ".join(filter(None, note_lines))
+
+def _complexity_factors(trial: dict) -> ComplexityFactors:
+    return {
+        "locations": len(trial.get("locations") or []),
+        "interventions": len(trial.get("interventions") or []),
+        "outcomes": len(trial.get("design_outcomes") or []),
+        "sponsors": len(trial.get("sponsors") or []),
+        "design_groups": len(trial.get("design_groups") or []),
+    }
+
+
+def _complexity_rating(score: int) -> str:
+    if score < 10:
+        return "Low"
+    if score < 25:
+        return "Medium"
+    if score < 50:
+        return "High"
+    return "Very High"
+
+
+def parse_criteria(text: str | None) -> tuple[list[str], list[str], str]:
+    """
+    Splits an eligibility criteria block into inclusion and exclusion items.
+
+    Args:
+        text: The raw AACT eligibility criteria text.
+
+    Returns:
+        The inclusion items, the exclusion items and any trailing note.
+    """
+    if not text:
+        return ([], [], "")
+    inclusion_keywords = ("Inclusion Criteria:", "Key Inclusion Criteria:")
+    exclusion_keywords = ("Exclusion Criteria:", "Key Exclusion Criteria:")
+    note_keyword = "Note:"
+    text = text.replace(
+        "\\n",
+        """
+""",
+    )
+    parts = re.split(f"({'|'.join(exclusion_keywords)})", text, flags=re.IGNORECASE)
+    inclusion_text = parts[0]
+    exclusion_text = "".join(parts[1:]) if len(parts) > 1 else ""
+    for keyword in inclusion_keywords:
+        if keyword.lower() in inclusion_text.lower():
+            inclusion_text = re.split(keyword, inclusion_text, flags=re.IGNORECASE)[-1]
+            break
+    note_parts = re.split(f"({note_keyword})", exclusion_text, flags=re.IGNORECASE)
+    main_exclusion_text = note_parts[0]
+    note = "".join(note_parts[1:]).strip() if len(note_parts) > 1 else ""
+    for keyword in exclusion_keywords:
+        if keyword.lower() in main_exclusion_text.lower():
+            main_exclusion_text = re.split(
+                keyword, main_exclusion_text, flags=re.IGNORECASE
+            )[-1]
+            break
+    inclusion_items = [
+        item.strip() for item in inclusion_text.split("*") if item.strip()
+    ]
+    exclusion_items = [
+        item.strip() for item in main_exclusion_text.split("*") if item.strip()
+    ]
+    return (inclusion_items, exclusion_items, note)
+
+
+def _eligibility_note(criteria: str | None) -> str:
+    """Extract note section from eligibility criteria if present."""
+    if not criteria:
         return ""
+    note_lines = []
+    capture = False
+    for line in criteria.split("""
+"""):
+        line_stripped = line.strip()
+        if line_stripped.lower().startswith("note:"):
+            capture = True
+        if capture and line_stripped:
+            note_lines.append(line_stripped)
+    if note_lines:
+        note_lines[0] = note_lines[0][5:].strip()
+        return " ".join(filter(None, note_lines))
+    return ""
 
-    @rx.var
-    def complexity_factors(self) -> ComplexityFactors:
-        if not self.trial:
-            return {
-                "locations": 0,
-                "interventions": 0,
-                "outcomes": 0,
-                "sponsors": 0,
-                "design_groups": 0,
+
+def _as_date(value) -> datetime.date | None:
+    if isinstance(value, datetime.date):
+        return value
+    if isinstance(value, str) and value:
+        return datetime.date.fromisoformat(value[:10])
+    return None
+
+
+def _trial_duration_days(trial: dict) -> int:
+    try:
+        start = _as_date(trial.get("start_date"))
+        end = _as_date(trial.get("completion_date"))
+    except ValueError as e:
+        logging.exception(f"Error calculating trial duration: {e}")
+        return 0
+    if not start or not end:
+        return 0
+    return (end - start).days
+
+
+def _location_markers(locations: list[dict]) -> list[LocationMarker]:
+    markers = []
+    for loc, geocode in zip(locations, geocode_locations(locations)):
+        if geocode is None:
+            continue
+        approximate = (
+            " (approximate)" if geocode["precision"] == "country" else ""
+        )
+        markers.append(
+            {
+                "position": latlng(lat=geocode["lat"], lng=geocode["lng"]),
+                "popup": f"<strong>{loc.get('facility', 'N/A')}</strong><br/>{loc.get('city', '')}, {loc.get('country', '')}{approximate}<br/>Status: {loc.get('status', 'N/A')}",
             }
-        return {
-            "locations": len(self.trial.get("locations", [])),
-            "interventions": len(self.trial.get("interventions", [])),
-            "outcomes": len(self.trial.get("design_outcomes", [])),
-            "sponsors": len(self.trial.get("sponsors", [])),
-            "design_groups": len(self.trial.get("design_groups", [])),
-        }
+        )
+    return markers
 
-    @rx.var
-    def complexity_score(self) -> int:
-        factors = self.complexity_factors
-        score = sum(factors.values())
-        return score
 
-    @rx.var
-    def lead_sponsor(self) -> dict | None:
-        sponsors = self.trial.get("sponsors", [])
-        if not sponsors:
-            return None
-        for sponsor in sponsors:
-            if sponsor.get("lead_or_collaborator") == "lead":
-                return sponsor
-        return None
+def _map_view(
+    markers: list[LocationMarker], locations: list[dict]
+) -> tuple[LatLng, float]:
+    """Centers the map on the mean marker position, zoomed in for single-country trials."""
+    if not markers:
+        return (latlng(lat=0, lng=0), 2.0)
+    lat = sum(m["position"]["lat"] for m in markers) / len(markers)
+    lng = sum(m["position"]["lng"] for m in markers) / len(markers)
+    countries = {loc.get("country") for loc in locations}
+    return (latlng(lat=lat, lng=lng), 4.0 if len(countries) == 1 else 2.0)
 
-    @rx.var
-    def complexity_rating(self) -> str:
-        score = self.complexity_score
-        if score < 10:
-            return "Low"
-        if score < 25:
-            return "Medium"
-        if score < 50:
-            return "High"
-        return "Very High"
 
-    @rx.var
-    def trial_duration_days(self) -> int:
-        if not self.trial.get("start_date") or not self.trial.get("completion_date"):
-            return 0
-        try:
-            start = datetime.datetime.fromisoformat(self.trial["start_date"])
-            end = datetime.datetime.fromisoformat(self.trial["completion_date"])
-            return (end - start).days
-        except (ValueError, TypeError) as e:
-            logging.exception(f"Error calculating trial duration: {e}")
-            return 0
+def build_trial_view(trial: dict) -> TrialView:
+    """
+    Computes every derived trial detail field in one pass.
+
+    The detail page, AI summary, trial chat and PDF report all read from the
+    result, so the eligibility text is parsed once per trial load.
+
+    Args:
+        trial: The full trial document from get_trial_detail.
+
+    Returns:
+        The derived fields.
+    """
+    inclusion, exclusion, _ = parse_criteria(trial.get("eligibility_criteria"))
+    factors = _complexity_factors(trial)
+    score = sum(factors.values())
+    outcomes = trial.get("design_outcomes") or []
+    locations = trial.get("locations") or []
+    markers = _location_markers(locations)
+    map_center, map_zoom = _map_view(markers, locations)
+    return {
+        "inclusion_criteria": inclusion,
+        "exclusion_criteria": exclusion,
+        "eligibility_note": _eligibility_note(trial.get("eligibility_criteria")),
+        "complexity_factors": factors,
+        "complexity_score": score,
+        "complexity_rating": _complexity_rating(score),
+        "lead_sponsor": next(
+            (
+                s
+                for s in trial.get("sponsors") or []
+                if s.get("lead_or_collaborator") == "lead"
+            ),
+            None,
+        ),
+        "trial_duration_days": _trial_duration_days(trial),
+        "location_markers": markers,
+        "primary_outcomes": [o for o in outcomes if o.get("outcome_type") == "primary"],
+        "secondary_outcomes": [
+            o for o in outcomes if o.get("outcome_type") == "secondary"
+        ],
+        "map_center": map_center,
+        "map_zoom": map_zoom,
+    }
+
+
+_EMPTY_VIEW = build_trial_view({})
+
+
+class TrialDetailState(rx.State):
+    """
+    State for the trial detail page.
+
+    The full document lives in the backend-only _trial var and its derived
+    fields in _view, built once at load. The frontend trial var carries the
+    lightweight fields, and each tab's heavy and derived fields are copied
+    into their own vars the first time the tab opens, so they are only
+    serialized to the browser when needed.
+    """
+
+    is_loading: bool = True
+    trial: TrialDetail = cast(TrialDetail, {})
+    _trial: dict = {}
+    _view: TrialView = _EMPTY_VIEW
+    active_tab: str = "overview"
+    _loaded_tabs: set[str] = set()
+    detailed_description: str = ""
+    eligibility_criteria: str = ""
+    locations: list[Location] = []
+    design_groups: list[DesignGroup] = []
+    design_outcomes: list[DesignOutcome] = []
+    references: list[StudyReference] = []
+    inclusion_criteria: list[str] = []
+    exclusion_criteria: list[str] = []
+    eligibility_note: str = ""
+    map_clusters: list[MapCluster] = []
+    primary_outcomes: list[DesignOutcome] = []
+    secondary_outcomes: list[DesignOutcome] = []
+    complexity_factors: ComplexityFactors = _EMPTY_VIEW["complexity_factors"]
+    complexity_score: int = 0
+    complexity_rating: str = _EMPTY_VIEW["complexity_rating"]
+    lead_sponsor: Optional[Sponsor] = None
+    trial_duration_days: int = 0
+    similar_trials: list[SimilarTrial] = []
+    related_trials: list[SimilarTrial] = []
+    sponsor_portfolio: list[Trial] = []
+    map_center: LatLng = latlng(lat=0, lng=0)
+    map_zoom: float = 2.0
+    _viewport_center: LatLng = latlng(lat=0, lng=0)
+    _viewport_zoom: float = 2.0
 
     @rx.var
-    def location_markers(self) -> list[dict]:
-        markers = []
-        if not self.trial.get("locations"):
-            return []
-        known_locations = {
-            "United States": latlng(39.8, -98.6),
-            "Canada": latlng(56.1, -106.3),
-            "France": latlng(46.2, 2.2),
-            "Germany": latlng(51.1, 10.4),
-            "United Kingdom": latlng(55.4, -3.4),
-        }
-        locations = self.trial.get("locations", [])
-        if not locations:
-            return []
-        for loc in locations:
-            country = loc.get("country")
-            if country in known_locations:
-                base_latlng = known_locations[country]
-                lat = base_latlng["lat"] + hash(loc.get("city", "")) % 100 / 100.0 - 0.5
-                lng = (
-                    base_latlng["lng"]
-                    + hash(loc.get("facility", "")) % 100 / 100.0
-                    - 0.5
-                )
-                markers.append(
-                    {
-                        "position": latlng(lat=lat, lng=lng),
-                        "popup": f"<strong>{loc.get('facility', 'N/A')}</strong><br/>{loc.get('city', '')}, {country}<br/>Status: {loc.get('status', 'N/A')}",
-                    }
-                )
-        return markers
+    def _nct_id_from_route(self) -> str:
+        """Get the nct_id from the router params."""
+        return self.router.page.params.get("nct_id", "")
+
+    def _reset_tab_fields(self):
+        for field in HEAVY_TRIAL_FIELDS:
+            setattr(self, field, "" if field in _TEXT_FIELDS else [])
+        for fields in TAB_VIEW_FIELDS.values():
+            for field in fields:
+                setattr(self, field, _EMPTY_VIEW[field])
 
     @rx.event(background=True)
     async def load_trial_details(self):
         async with self:
             self.is_loading = True
             self.trial = cast(TrialDetail, {})
+            self._trial = {}
+            self._view = _EMPTY_VIEW
+            self.active_tab = "overview"
+            self._loaded_tabs = {"overview"}
+            self._reset_tab_fields()
+            self.map_clusters = []
             self.similar_trials = []
+            self.related_trials = []
             self.sponsor_portfolio = []
-        conn = None
         try:
-            conn = get_db_connection()
             nct_id = self._nct_id_from_route
-            if conn and nct_id:
-                with conn.cursor() as cur:
-                    study_query = """
-                    SELECT 
-                        s.nct_id, s.brief_title, s.official_title, s.overall_status, s.phase,
-                        s.study_type, s.enrollment, s.start_date, s.completion_date,
-                        bs.description as brief_summary,
-                        dd.description as detailed_description,
-                        e.criteria as eligibility_criteria
-                    FROM ctgov.studies s
-                    LEFT JOIN ctgov.brief_summaries bs ON s.nct_id = bs.nct_id
-                    LEFT JOIN ctgov.detailed_descriptions dd ON s.nct_id = dd.nct_id
-                    LEFT JOIN ctgov.eligibilities e ON s.nct_id = e.nct_id
-                    WHERE s.nct_id = %s
-                    """
-                    cur.execute(study_query, (nct_id,))
-                    row = cur.fetchone()
-                    if not row:
-                        async with self:
-                            self.is_loading = False
-                        return
-                    trial_data = dict(zip([desc[0] for desc in cur.description], row))
-                    cur.execute(
-                        "SELECT name as facility, status, city, state, zip, country FROM ctgov.facilities WHERE nct_id = %s",
-                        (nct_id,),
-                    )
-                    trial_data["locations"] = [
-                        dict(zip([d[0] for d in cur.description], r))
-                        for r in cur.fetchall()
-                    ]
-                    cur.execute(
-                        "SELECT intervention_type, name FROM ctgov.interventions WHERE nct_id = %s",
-                        (nct_id,),
-                    )
-                    trial_data["interventions"] = [
-                        dict(zip([d[0] for d in cur.description], r))
-                        for r in cur.fetchall()
-                    ]
-                    cur.execute(
-                        "SELECT agency_class, lead_or_collaborator, name FROM ctgov.sponsors WHERE nct_id = %s",
-                        (nct_id,),
-                    )
-                    trial_data["sponsors"] = [
-                        dict(zip([d[0] for d in cur.description], r))
-                        for r in cur.fetchall()
-                    ]
-                    cur.execute(
-                        "SELECT group_type, title, description FROM ctgov.design_groups WHERE nct_id = %s",
-                        (nct_id,),
-                    )
-                    trial_data["design_groups"] = [
-                        dict(zip([d[0] for d in cur.description], r))
-                        for r in cur.fetchall()
-                    ]
-                    cur.execute(
-                        "SELECT outcome_type, measure, time_frame, description FROM ctgov.design_outcomes WHERE nct_id = %s",
-                        (nct_id,),
-                    )
-                    trial_data["design_outcomes"] = [
-                        dict(zip([d[0] for d in cur.description], r))
-                        for r in cur.fetchall()
-                    ]
-                    cur.execute(
-                        "SELECT citation, reference_type FROM ctgov.study_references WHERE nct_id = %s",
-                        (nct_id,),
-                    )
-                    trial_data["references"] = [
-                        dict(zip([d[0] for d in cur.description], r))
-                        for r in cur.fetchall()
-                    ]
-                    cur.execute(
-                        "SELECT mesh_term FROM ctgov.browse_conditions WHERE nct_id = %s",
-                        (nct_id,),
-                    )
-                    trial_data["mesh_terms"] = [r[0] for r in cur.fetchall()]
-                    cur.execute(
-                        "SELECT name FROM ctgov.conditions WHERE nct_id = %s", (nct_id,)
+            trial_data = get_trial_detail(nct_id) if nct_id else None
+            if trial_data:
+                view = build_trial_view(trial_data)
+                async with self:
+                    self._trial = trial_data
+                    self._view = view
+                    self.trial = cast(
+                        TrialDetail,
+                        {
+                            k: v
+                            for k, v in trial_data.items()
+                            if k not in HEAVY_TRIAL_FIELDS
+                        },
                     )
-                    trial_data["conditions"] = [r[0] for r in cur.fetchall()]
-                    async with self:
-                        self.trial = cast(TrialDetail, trial_data)
-                        if self.trial.get("locations"):
-                            first_country = self.trial["locations"][0].get("country")
-                            country_centers = {
-                                "United States": latlng(39.8, -98.6),
-                                "Canada": latlng(56.1, -106.3),
-                                "France": latlng(46.2, 2.2),
-                                "Germany": latlng(51.1, 10.4),
-                                "United Kingdom": latlng(55.4, -3.4),
-                            }
-                            self.map_center = country_centers.get(
-                                first_country, latlng(0, 0)
-                            )
-                            self.map_zoom = (
-                                4.0 if first_country in country_centers else 2.0
-                            )
-                    yield TrialDetailState.fetch_similar_trials(nct_id, self.trial)
-                    yield TrialDetailState.fetch_sponsor_portfolio(self.trial)
+                    self.complexity_factors = view["complexity_factors"]
+                    self.complexity_score = view["complexity_score"]
+                    self.complexity_rating = view["complexity_rating"]
+                    self.lead_sponsor = view["lead_sponsor"]
+                    self.trial_duration_days = view["trial_duration_days"]
+                    self.map_center = view["map_center"]
+                    self.map_zoom = view["map_zoom"]
+                    self._viewport_center = view["map_center"]
+                    self._viewport_zoom = view["map_zoom"]
+                yield TrialDetailState.fetch_similar_trials(nct_id, self.trial)
+                yield TrialDetailState.fetch_related_trials(nct_id)
+                yield TrialDetailState.fetch_sponsor_portfolio(self.trial)
         except Exception as e:
             logging.exception(f"Error fetching trial details: {e}")
         finally:
-            if conn:
-                return_db_connection(conn)
             async with self:
                 self.is_loading = False
 
+    @rx.event
+    def set_active_tab(self, tab: str):
+        """Switches tabs, copying the tab's fields from backend storage on first open."""
+        if tab not in DETAIL_TABS:
+            return
+        self.active_tab = tab
+        if tab in self._loaded_tabs:
+            return
+        for field in DETAIL_TABS[tab]:
+            default = "" if field in _TEXT_FIELDS else []
+            setattr(self, field, self._trial.get(field) or default)
+        for field in TAB_VIEW_FIELDS.get(tab, ()):
+            setattr(self, field, self._view[field])
+        if tab == "locations":
+            self._update_map_clusters()
+        self._loaded_tabs.add(tab)
+
+    def _update_map_clusters(self):
+        points = FacilityPoints(self._view["location_markers"])
+        self.map_clusters = points.clusters(self._viewport_center, self._viewport_zoom)
+
+    @rx.event
+    def update_map_viewport(self, event: MoveEvent):
+        """Re-clusters the facilities for the viewport after the map is panned or zoomed."""
+        center = event.get("last_center") or self._viewport_center
+        zoom = event.get("target", {}).get("zoom")
+        self._viewport_center = latlng(lat=center["lat"], lng=center["lng"])
+        if zoom is not None:
+            self._viewport_zoom = float(zoom)
+        self._update_map_clusters()
+
+    @rx.event(background=True)
+    async def fetch_related_trials(self, nct_id: str):
+        """Finds trials whose title, summary and outcomes read most like this one's."""
+        try:
+            related = await asyncio.to_thread(more_like_this, nct_id, 5)
+        except Exception as e:
+            logging.exception(f"Error fetching related trials: {e}")
+            return
+        async with self:
+            self.related_trials = related or []
+
     @rx.event(background=True)
     async def fetch_similar_trials(self, nct_id: str, trial_data: TrialDetail):
+        """
+        Finds the trials most similar to this one by condition, MeSH and intervention
+        overlap, falling back to a same-phase condition match while the index builds.
+        """
         conn = None
         try:
+            similar = await asyncio.to_thread(find_similar_trials, nct_id, 5)
+            if similar is not None:
+                async with self:
+                    self.similar_trials = similar
+                return
             conn = get_db_connection()
             if conn:
                 with conn.cursor() as cur:
@@ -368,10 +459,14 @@ class TrialDetailState(rx.State):
                             trial_data.get("study_type"),
                         ),
                     )
-                    similar_trials_data = [
-                        dict(zip([desc[0] for desc in cur.description], row))
-                        for row in cur.fetchall()
-                    ]
+                    columns = [desc[0] for desc in cur.description]
+                    similar_trials_data = []
+                    for row in cur.fetchall():
+                        trial = dict(zip(columns, row))
+                        trial["similarity"] = round(
+                            trial.pop("matching_conditions") / len(conditions), 3
+                        )
+                        similar_trials_data.append(trial)
                     async with self:
                         self.similar_trials = similar_trials_data
         except Exception as e:
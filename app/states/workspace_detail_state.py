@@ -1,5 +1,7 @@
 import reflex as rx
 import uuid
+import asyncio
+import logging
 import datetime
 from typing import cast, Optional
 from app.models.workspace import (
@@ -11,7 +13,7 @@ from app.models.workspace import (
 from app.models.trial import Trial
 from app.states.auth_state import AuthState
 from app.utils.db import get_db_connection, return_db_connection
-from app.states.workspace_state import _workspaces_db, _user_workspaces_db
+from app.utils.user_store import get_user_store
 
 
 class WorkspaceDetailState(rx.State):
@@ -36,8 +38,8 @@ class WorkspaceDetailState(rx.State):
             async with self:
                 self.is_loading = False
             return
-        if workspace_id in _workspaces_db:
-            workspace_data = _workspaces_db[workspace_id]
+        workspace_data = await asyncio.to_thread(get_user_store().workspace, workspace_id)
+        if workspace_data is not None:
             nct_ids = [t["nct_id"] for t in workspace_data["trials"]]
             trials = []
             if nct_ids:
@@ -76,11 +78,10 @@ class WorkspaceDetailState(rx.State):
                 yield rx.toast.info(f"{email} is already a member.")
                 return
             now = datetime.datetime.now(datetime.timezone.utc).isoformat()
-            new_member = WorkspaceMember(email=email, role=role, joined_date=now)
-            self.workspace["members"].append(new_member)
-            self.workspace["last_updated"] = now
-            self.workspace["activity"].insert(
-                0,
+            await asyncio.to_thread(
+                get_user_store().add_workspace_member,
+                self.workspace["workspace_id"],
+                WorkspaceMember(email=email, role=role, joined_date=now),
                 WorkspaceActivity(
                     activity_id=str(uuid.uuid4()),
                     user=email,
@@ -90,9 +91,6 @@ class WorkspaceDetailState(rx.State):
                     details=f"{email} was added as a {role}",
                 ),
             )
-            if email not in _user_workspaces_db:
-                _user_workspaces_db[email] = set()
-            _user_workspaces_db[email].add(self.workspace["workspace_id"])
             self.show_add_member_dialog = False
             yield rx.toast.success(f"{email} added to workspace.")
         yield WorkspaceDetailState.load_workspace
@@ -1,5 +1,7 @@
 import reflex as rx
 import uuid
+import asyncio
+import logging
 import datetime
 from typing import cast
 from app.models.workspace import (
@@ -9,9 +11,7 @@ from app.models.workspace import (
     WorkspaceActivity,
 )
 from app.states.auth_state import AuthState
-
-_workspaces_db: dict[str, Workspace] = {}
-_user_workspaces_db: dict[str, set[str]] = {}
+from app.utils.user_store import get_user_store
 
 
 class WorkspaceState(rx.State):
@@ -35,16 +35,14 @@ class WorkspaceState(rx.State):
             if auth_state.user:
                 user_email = auth_state.user.get("email")
         if user_email:
-            user_workspace_ids = _user_workspaces_db.get(user_email, set())
-            user_workspaces_list = [
-                _workspaces_db[ws_id]
-                for ws_id in user_workspace_ids
-                if ws_id in _workspaces_db
-            ]
-            async with self:
-                self.workspaces = sorted(
-                    user_workspaces_list, key=lambda w: w["last_updated"], reverse=True
+            try:
+                workspaces = await asyncio.to_thread(
+                    get_user_store().user_workspaces, user_email
                 )
+                async with self:
+                    self.workspaces = workspaces
+            except Exception as e:
+                logging.exception(f"Error loading workspaces: {e}")
         async with self:
             self.is_loading = False
 
@@ -80,10 +78,7 @@ class WorkspaceState(rx.State):
                 last_updated=now,
                 activity=[],
             )
-            _workspaces_db[workspace_id] = new_workspace
-            if user_email not in _user_workspaces_db:
-                _user_workspaces_db[user_email] = set()
-            _user_workspaces_db[user_email].add(workspace_id)
+            await asyncio.to_thread(get_user_store().create_workspace, new_workspace)
             async with self:
                 self.workspaces.insert(0, new_workspace)
                 self.show_create_dialog = False
@@ -110,10 +105,10 @@ class WorkspaceState(rx.State):
         if not user_email:
             yield rx.toast.error("You must be logged in.")
             return
-        if workspace_id not in _workspaces_db:
+        workspace = await asyncio.to_thread(get_user_store().workspace, workspace_id)
+        if workspace is None:
             yield rx.toast.error("Workspace not found.")
             return
-        workspace = _workspaces_db[workspace_id]
         if user_email not in [m["email"] for m in workspace["members"]]:
             yield rx.toast.error("You are not a member of this workspace.")
             return
@@ -121,14 +116,12 @@ class WorkspaceState(rx.State):
             yield rx.toast.info(f"Trial {nct_id} is already in this workspace.")
             return
         now = datetime.datetime.now(datetime.timezone.utc).isoformat()
-        workspace["trials"].append(
+        await asyncio.to_thread(
+            get_user_store().add_workspace_trial,
+            workspace_id,
             WorkspaceTrial(
                 nct_id=nct_id, added_by=user_email, added_date=now, workspace_notes=""
-            )
-        )
-        workspace["last_updated"] = now
-        workspace["activity"].insert(
-            0,
+            ),
             WorkspaceActivity(
                 activity_id=str(uuid.uuid4()),
                 user=user_email,
@@ -1,11 +1,29 @@
 import reflex as rx
 import os
+import time
 import logging
 from typing import Literal, Optional
 import anthropic
 import google.generativeai as genai
+from app.utils.ai_metrics import AIRequestMetric, record_ai_request
+from app.utils.event_metrics import timed_phase
+from app.utils.tracing import SPAN_KIND_CLIENT, record_error, set_attributes, span
+from app.utils.prompt_builder import count_tokens
+from app.utils.shared_cache import SharedCache
 
-_ai_cache = {}
+AI_CACHE_TTL_SECONDS = int(os.environ.get("CLINCHAT_AI_CACHE_TTL_SECONDS", "86400"))
+_ai_cache = SharedCache("ai", ttl_seconds=AI_CACHE_TTL_SECONDS)
+
+
+def _annotate_span(metric: AIRequestMetric):
+    set_attributes(
+        {
+            "ai.cached": metric["cached"],
+            "ai.input_tokens": metric["input_tokens"],
+            "ai.output_tokens": metric["output_tokens"],
+            "ai.cost_usd": metric["cost_usd"],
+        }
+    )
 
 
 class AIClient:
@@ -37,29 +55,75 @@ class AIClient:
     def get_provider(self) -> Optional[str]:
         return self.current_provider
 
-    def generate_content(self, prompt: str, cache_key: Optional[str] = None) -> str:
-        if cache_key and cache_key in _ai_cache:
+    def generate_content(
+        self, prompt: str, cache_key: Optional[str] = None, feature: str = "general"
+    ) -> str:
+        """Generates content for a prompt and records token usage and latency under `feature`."""
+        with span(
+            "ai.generate_content",
+            {"ai.feature": feature, "ai.provider": self.current_provider or "none"},
+            kind=SPAN_KIND_CLIENT,
+        ):
+            return self._generate_content(prompt, cache_key, feature)
+
+    def _generate_content(
+        self, prompt: str, cache_key: Optional[str], feature: str
+    ) -> str:
+        started = time.perf_counter()
+        cached = _ai_cache.get(cache_key) if cache_key else None
+        if cached is not None:
             logging.info(f"Returning cached response for key: {cache_key}")
-            return _ai_cache[cache_key]
+            result = cached
+            metric = record_ai_request(
+                feature,
+                self.current_provider,
+                count_tokens(prompt),
+                count_tokens(result),
+                (time.perf_counter() - started) * 1000,
+                cached=True,
+            )
+            _annotate_span(metric)
+            return result
         if not self.current_provider:
             return "Error: No AI provider is configured. Please set GOOGLE_API_KEY or ANTHROPIC_API_KEY."
         try:
+            input_tokens = None
+            output_tokens = None
             if self.current_provider == "gemini" and self.gemini_client:
-                response = self.gemini_client.generate_content(prompt)
+                with timed_phase("ai"):
+                    response = self.gemini_client.generate_content(prompt)
                 result = response.text
+                usage = getattr(response, "usage_metadata", None)
+                if usage is not None:
+                    input_tokens = getattr(usage, "prompt_token_count", None)
+                    output_tokens = getattr(usage, "candidates_token_count", None)
             elif self.current_provider == "claude" and self.claude_client:
-                message = self.claude_client.messages.create(
-                    model="claude-3-5-sonnet-20240620",
-                    max_tokens=2048,
-                    messages=[{"role": "user", "content": prompt}],
-                )
+                with timed_phase("ai"):
+                    message = self.claude_client.messages.create(
+                        model="claude-3-5-sonnet-20240620",
+                        max_tokens=2048,
+                        messages=[{"role": "user", "content": prompt}],
+                    )
                 result = message.content[0].text
+                usage = getattr(message, "usage", None)
+                if usage is not None:
+                    input_tokens = getattr(usage, "input_tokens", None)
+                    output_tokens = getattr(usage, "output_tokens", None)
             else:
                 return "Error: AI client not properly initialized."
+            metric = record_ai_request(
+                feature,
+                self.current_provider,
+                input_tokens if input_tokens is not None else count_tokens(prompt),
+                output_tokens if output_tokens is not None else count_tokens(result),
+                (time.perf_counter() - started) * 1000,
+            )
+            _annotate_span(metric)
             if cache_key:
-                _ai_cache[cache_key] = result
+                _ai_cache.set(cache_key, result)
             return result
         except Exception as e:
+            record_error(e)
             logging.exception(
                 f"AI content generation failed for provider {self.current_provider}: {e}"
             )
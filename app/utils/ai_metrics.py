@@ -0,0 +1,143 @@
+import datetime
+import threading
+from collections import deque
+from typing import Optional, TypedDict
+
+MAX_RECORDS_PER_FEATURE = 500
+COST_PER_1K_TOKENS = {
+    "gemini": {"input": 0.000075, "output": 0.0003},
+    "claude": {"input": 0.003, "output": 0.015},
+}
+
+
+class AIRequestMetric(TypedDict):
+    feature: str
+    provider: str
+    input_tokens: int
+    output_tokens: int
+    latency_ms: float
+    cached: bool
+    cost_usd: float
+    timestamp: str
+
+
+class AIFeatureTotals(TypedDict):
+    requests: int
+    cache_hits: int
+    input_tokens: int
+    output_tokens: int
+    cost_usd: float
+    latency_ms: float
+
+
+class AIFeatureSummary(TypedDict):
+    feature: str
+    requests: int
+    cache_hits: int
+    input_tokens: int
+    output_tokens: int
+    avg_latency_ms: float
+    max_latency_ms: float
+    cost_usd: float
+
+
+_ai_metrics: dict[str, deque] = {}
+_ai_totals: dict[str, AIFeatureTotals] = {}
+_ai_metrics_lock = threading.Lock()
+
+
+def estimate_cost(
+    provider: Optional[str], input_tokens: int, output_tokens: int
+) -> float:
+    """Estimates the USD cost of a request from the provider's per-1k token rates."""
+    rates = COST_PER_1K_TOKENS.get(provider or "")
+    if not rates:
+        return 0.0
+    return (
+        input_tokens / 1000 * rates["input"] + output_tokens / 1000 * rates["output"]
+    )
+
+
+def record_ai_request(
+    feature: str,
+    provider: Optional[str],
+    input_tokens: int,
+    output_tokens: int,
+    latency_ms: float,
+    cached: bool = False,
+) -> AIRequestMetric:
+    """Records token counts, latency and cost for a single AI request."""
+    metric = AIRequestMetric(
+        feature=feature,
+        provider=provider or "none",
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        latency_ms=round(latency_ms, 2),
+        cached=cached,
+        cost_usd=0.0 if cached else estimate_cost(provider, input_tokens, output_tokens),
+        timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    )
+    with _ai_metrics_lock:
+        records = _ai_metrics.setdefault(
+            feature, deque(maxlen=MAX_RECORDS_PER_FEATURE)
+        )
+        records.append(metric)
+        totals = _ai_totals.setdefault(
+            feature,
+            AIFeatureTotals(
+                requests=0,
+                cache_hits=0,
+                input_tokens=0,
+                output_tokens=0,
+                cost_usd=0.0,
+                latency_ms=0.0,
+            ),
+        )
+        totals["requests"] += 1
+        totals["cache_hits"] += int(cached)
+        totals["input_tokens"] += input_tokens
+        totals["output_tokens"] += output_tokens
+        totals["cost_usd"] += metric["cost_usd"]
+        if not cached:
+            totals["latency_ms"] += latency_ms
+    return metric
+
+
+def get_ai_metric_totals() -> dict[str, AIFeatureTotals]:
+    """Returns per-feature totals since startup, which unlike the recent records only grow."""
+    with _ai_metrics_lock:
+        return {feature: AIFeatureTotals(**t) for feature, t in _ai_totals.items()}
+
+
+def get_ai_metrics(feature: Optional[str] = None) -> list[AIRequestMetric]:
+    """Returns the recorded requests, optionally restricted to one feature."""
+    with _ai_metrics_lock:
+        if feature is not None:
+            return list(_ai_metrics.get(feature, []))
+        return [m for records in _ai_metrics.values() for m in records]
+
+
+def get_ai_metrics_summary() -> list[AIFeatureSummary]:
+    """Aggregates the recorded requests per feature (summary, comparison insights, ...)."""
+    summaries = []
+    with _ai_metrics_lock:
+        snapshot = {k: list(v) for k, v in _ai_metrics.items()}
+    for feature, records in sorted(snapshot.items()):
+        if not records:
+            continue
+        latencies = [m["latency_ms"] for m in records if not m["cached"]]
+        summaries.append(
+            AIFeatureSummary(
+                feature=feature,
+                requests=len(records),
+                cache_hits=sum((1 for m in records if m["cached"])),
+                input_tokens=sum((m["input_tokens"] for m in records)),
+                output_tokens=sum((m["output_tokens"] for m in records)),
+                avg_latency_ms=round(sum(latencies) / len(latencies), 2)
+                if latencies
+                else 0.0,
+                max_latency_ms=max(latencies) if latencies else 0.0,
+                cost_usd=round(sum((m["cost_usd"] for m in records)), 6),
+            )
+        )
+    return summaries
@@ -0,0 +1,152 @@
+import time
+import logging
+import threading
+from bisect import bisect_left
+from typing import Optional
+import numpy as np
+import polars as pl
+from app.utils.polars_db import load_data_in_bulk
+from app.utils.data_sync import on_data_sync
+
+AUTOCOMPLETE_LIMIT = 8
+PRECOMPUTED_PREFIX_LENGTH = 2
+SUGGESTION_SOURCES = {
+    "condition": [
+        "SELECT name, COUNT(DISTINCT nct_id) AS trial_count FROM ctgov.conditions WHERE name IS NOT NULL GROUP BY name",
+        "SELECT mesh_term AS name, COUNT(DISTINCT nct_id) AS trial_count FROM ctgov.browse_conditions WHERE mesh_term IS NOT NULL GROUP BY mesh_term",
+    ],
+    "intervention": [
+        "SELECT name, COUNT(DISTINCT nct_id) AS trial_count FROM ctgov.interventions WHERE name IS NOT NULL GROUP BY name",
+        "SELECT mesh_term AS name, COUNT(DISTINCT nct_id) AS trial_count FROM ctgov.browse_interventions WHERE mesh_term IS NOT NULL GROUP BY mesh_term",
+    ],
+    "sponsor": [
+        "SELECT name, COUNT(DISTINCT nct_id) AS trial_count FROM ctgov.sponsors WHERE name IS NOT NULL GROUP BY name"
+    ],
+}
+
+
+class PrefixIndex:
+    """
+    Suggests names by prefix from a sorted array, ranked by trial frequency.
+
+    Lookups bisect the sorted lowercase keys to find the prefix range and take
+    the most frequent entries in it. The answers for every prefix of up to
+    PRECOMPUTED_PREFIX_LENGTH characters are computed at build time, since
+    those ranges span a large part of the vocabulary.
+    """
+
+    def __init__(self, names: list[str], counts: list[int]):
+        order = sorted(range(len(names)), key=lambda i: names[i].lower())
+        self.keys = [names[i].lower() for i in order]
+        self.names = [names[i] for i in order]
+        self.counts = np.array([counts[i] for i in order], dtype=np.int64)
+        self._precomputed: dict[str, list[str]] = {}
+        prefixes = {
+            key[:length]
+            for key in self.keys
+            for length in range(1, PRECOMPUTED_PREFIX_LENGTH + 1)
+            if len(key) >= length
+        }
+        for prefix in prefixes:
+            self._precomputed[prefix] = self._rank(prefix, AUTOCOMPLETE_LIMIT)
+
+    def _rank(self, prefix: str, limit: int) -> list[str]:
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + "\uffff", lo=start)
+        if start == end:
+            return []
+        window = self.counts[start:end]
+        if len(window) > limit:
+            top = np.argpartition(-window, limit - 1)[:limit]
+        else:
+            top = np.arange(len(window))
+        top = top[np.argsort(-window[top], kind="stable")]
+        return [self.names[start + int(i)] for i in top]
+
+    def suggest(self, prefix: str, limit: int = AUTOCOMPLETE_LIMIT) -> list[str]:
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH and limit <= AUTOCOMPLETE_LIMIT:
+            return self._precomputed.get(prefix, [])[:limit]
+        return self._rank(prefix, limit)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+_prefix_indexes: dict[str, PrefixIndex] = {}
+_prefix_index_lock = threading.Lock()
+
+
+def _load_vocabulary(queries: list[str]) -> Optional[pl.DataFrame]:
+    frames = []
+    for query in queries:
+        frame = load_data_in_bulk(query)
+        if frame is None:
+            return None
+        frames.append(
+            frame.select(pl.col("name"), pl.col("trial_count").cast(pl.Int64))
+        )
+    combined = pl.concat(frames).with_columns(key=pl.col("name").str.to_lowercase())
+    return combined.group_by("key").agg(
+        pl.col("name").sort_by("trial_count", descending=True).first(),
+        pl.col("trial_count").max(),
+    )
+
+
+def build_prefix_index(field: str) -> Optional[PrefixIndex]:
+    """
+    Builds the suggestion index for one autocomplete field.
+
+    Args:
+        field: One of the SUGGESTION_SOURCES keys.
+
+    Returns:
+        The prefix index, or None if the vocabulary could not be loaded.
+    """
+    vocabulary = _load_vocabulary(SUGGESTION_SOURCES[field])
+    if vocabulary is None or vocabulary.is_empty():
+        return None
+    return PrefixIndex(
+        vocabulary["name"].to_list(), vocabulary["trial_count"].to_list()
+    )
+
+
+def get_suggestions(
+    field: str, prefix: str, limit: int = AUTOCOMPLETE_LIMIT
+) -> list[str]:
+    """
+    Returns the most frequently used names starting with prefix.
+
+    Args:
+        field: One of "condition", "intervention" or "sponsor".
+        prefix: The text typed so far.
+        limit: The maximum number of suggestions.
+
+    Returns:
+        Suggestions ordered by trial count, or an empty list while the index loads.
+    """
+    index = _prefix_indexes.get(field)
+    if index is None:
+        return []
+    return index.suggest(prefix, limit)
+
+
+@on_data_sync
+def refresh_prefix_indexes():
+    """Rebuilds every suggestion index and swaps each in when complete."""
+    if not _prefix_index_lock.acquire(blocking=False):
+        logging.info("Autocomplete refresh already in progress.")
+        return
+    try:
+        for field in SUGGESTION_SOURCES:
+            started = time.perf_counter()
+            index = build_prefix_index(field)
+            if index is not None:
+                _prefix_indexes[field] = index
+                logging.info(
+                    f"Built {field} autocomplete over {len(index)} names in {time.perf_counter() - started:.1f}s"
+                )
+    finally:
+        _prefix_index_lock.release()
@@ -0,0 +1,88 @@
+import os
+import asyncio
+import logging
+from typing import Callable, Optional
+from app.utils.db import get_db_connection, return_db_connection
+from app.utils.shared_cache import broadcast_invalidation, on_invalidation
+
+DATA_SYNC_POLL_SECONDS = int(
+    os.environ.get("CLINCHAT_DATA_SYNC_POLL_SECONDS", "900")
+)
+DATA_SYNC_TOPIC = "data_sync"
+_sync_listeners: list[Callable[[], None]] = []
+_last_data_version: Optional[str] = None
+
+
+def on_data_sync(listener: Callable[[], None]):
+    """
+    Registers a callback to run at startup and whenever the AACT data changes.
+
+    Listeners run in a worker thread, so they may block on database loads.
+    """
+    if listener not in _sync_listeners:
+        _sync_listeners.append(listener)
+    return listener
+
+
+def get_data_version() -> Optional[str]:
+    """Returns a marker that changes whenever the AACT studies table is refreshed."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        if conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT MAX(updated_at), COUNT(*) FROM ctgov.studies")
+                updated_at, count = cur.fetchone()
+                return f"{updated_at}|{count}"
+    except Exception as e:
+        logging.exception(f"Failed to read AACT data version: {e}")
+    finally:
+        if conn:
+            return_db_connection(conn)
+    return None
+
+
+def run_sync_listeners():
+    """Runs every registered listener, logging failures without stopping the rest."""
+    for listener in list(_sync_listeners):
+        try:
+            listener()
+        except Exception as e:
+            logging.exception(f"Data sync listener {listener.__name__} failed: {e}")
+
+
+def check_for_data_sync(broadcast: bool = True) -> bool:
+    """
+    Runs the listeners if the AACT data version changed since the last check.
+
+    Args:
+        broadcast: Tell the other backend workers, so they refresh now instead
+            of at their next poll.
+    """
+    global _last_data_version
+    version = get_data_version()
+    if version is None or version == _last_data_version:
+        return False
+    logging.info(f"AACT data version changed: {_last_data_version} -> {version}")
+    _last_data_version = version
+    run_sync_listeners()
+    if broadcast:
+        broadcast_invalidation(DATA_SYNC_TOPIC, version)
+    return True
+
+
+@on_invalidation(DATA_SYNC_TOPIC)
+def sync_from_peer(version: str):
+    """Refreshes after another worker saw the AACT data change."""
+    if version != _last_data_version:
+        check_for_data_sync(broadcast=False)
+
+
+async def data_sync_monitor():
+    """Lifespan task that warms in-memory indexes and refreshes them on AACT syncs."""
+    while True:
+        try:
+            await asyncio.to_thread(check_for_data_sync)
+        except Exception as e:
+            logging.exception(f"Data sync check failed: {e}")
+        await asyncio.sleep(DATA_SYNC_POLL_SECONDS)
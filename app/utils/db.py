@@ -1,6 +1,9 @@
 import psycopg2
 import logging
 from psycopg2 import pool
+from psycopg2.extensions import cursor
+from app.utils.event_metrics import timed_phase
+from app.utils.tracing import query_span, set_attributes, span
 
 db_config = {
     "host": "aact-db.ctti-clinicaltrials.org",
@@ -12,13 +15,29 @@ db_config = {
 connection_pool = None
 
 
+class TimedCursor(cursor):
+    """A cursor that counts its queries towards the current event's DB time."""
+
+    def execute(self, query, vars=None):
+        with timed_phase("db"), query_span(query) as current:
+            result = super().execute(query, vars)
+            set_attributes({"db.rows": self.rowcount}, current)
+            return result
+
+    def executemany(self, query, vars_list):
+        with timed_phase("db"), query_span(query) as current:
+            result = super().executemany(query, vars_list)
+            set_attributes({"db.rows": self.rowcount}, current)
+            return result
+
+
 def initialize_connection_pool():
     """Initializes the PostgreSQL connection pool."""
     global connection_pool
     if connection_pool is None:
         try:
             connection_pool = pool.SimpleConnectionPool(
-                minconn=2, maxconn=10, **db_config
+                minconn=2, maxconn=10, cursor_factory=TimedCursor, **db_config
             )
             logging.info("Database connection pool initialized.")
         except Exception as e:
@@ -31,7 +50,8 @@ def get_db_connection():
         initialize_connection_pool()
     if connection_pool:
         try:
-            return connection_pool.getconn()
+            with span("db.pool.acquire"):
+                return connection_pool.getconn()
         except Exception as e:
             logging.exception(f"Failed to get connection from pool: {e}")
     return None
@@ -46,6 +66,13 @@ def return_db_connection(conn):
             logging.exception(f"Failed to return connection to pool: {e}")
 
 
+def available_connections() -> int:
+    """Returns how many more connections the pool can hand out right now."""
+    if connection_pool is None:
+        return 0
+    return connection_pool.maxconn - len(connection_pool._used)
+
+
 def close_connection_pool():
     """Closes all connections in the pool."""
     global connection_pool
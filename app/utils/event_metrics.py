@@ -0,0 +1,371 @@
+import time
+import bisect
+import contextlib
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional, TypedDict
+import reflex as rx
+from reflex.middleware import Middleware
+from app.utils.ai_metrics import get_ai_metric_totals
+from app.utils.loop_monitor import get_loop_lag_histogram, get_top_blockers
+from app.utils.tracing import (
+    SPAN_KIND_SERVER,
+    Span,
+    end_span,
+    link_chained_events,
+    pop_chained_parent,
+    set_attributes,
+    start_span,
+    use_span,
+)
+
+PHASES = ("total", "lock_wait", "db", "ai", "serialize")
+DURATION_BUCKETS_SECONDS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+QUANTILES = (0.5, 0.95, 0.99)
+QUANTILE_WINDOW = 512
+
+
+class EventTiming(TypedDict):
+    state: str
+    event: str
+    started: float
+    lock_wait: float
+    db: float
+    ai: float
+    serialize: float
+    db_calls: int
+    ai_calls: int
+    finished: bool
+    span: Optional[Span]
+
+
+class PhaseStats(TypedDict):
+    buckets: list[int]
+    count: int
+    sum: float
+    window: deque
+
+
+class EventStats(TypedDict):
+    phases: dict[str, PhaseStats]
+    events: int
+    db_calls: int
+    ai_calls: int
+
+
+_current_event: ContextVar[Optional[EventTiming]] = ContextVar(
+    "clinchat_current_event", default=None
+)
+_pending_lock_wait: ContextVar[float] = ContextVar(
+    "clinchat_pending_lock_wait", default=0.0
+)
+_event_stats: dict[tuple[str, str], EventStats] = {}
+_event_names: dict[str, tuple[str, str]] = {}
+_stats_lock = threading.Lock()
+
+
+def _add(phase: str, seconds: float, calls: int = 0):
+    timing = _current_event.get()
+    if timing is None:
+        return
+    with _stats_lock:
+        timing[phase] += seconds
+        if calls:
+            timing[f"{phase}_calls"] += calls
+
+
+@contextlib.contextmanager
+def timed_phase(phase: str) -> Iterator[None]:
+    """
+    Adds the time spent in the block to the current event's db or ai time.
+
+    Outside a Reflex event (lifespan tasks, API routes) this does nothing.
+    Time is attributed through a context variable, so calls made from
+    asyncio.to_thread still count towards the event that started them.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add(phase, time.perf_counter() - started, calls=1)
+
+
+def _state_and_event(state: rx.State, name: str) -> tuple[str, str]:
+    labels = _event_names.get(name)
+    if labels is None:
+        path, _, handler = name.rpartition(".")
+        try:
+            state_name = state.get_class_substate(path).__name__
+        except ValueError:
+            state_name = path.rpartition(".")[2]
+        labels = _event_names[name] = (state_name, handler)
+    return labels
+
+
+def _new_phase_stats() -> PhaseStats:
+    return PhaseStats(
+        buckets=[0] * (len(DURATION_BUCKETS_SECONDS) + 1),
+        count=0,
+        sum=0.0,
+        window=deque(maxlen=QUANTILE_WINDOW),
+    )
+
+
+def _record_event(timing: EventTiming):
+    total = time.perf_counter() - timing["started"]
+    key = (timing["state"], timing["event"])
+    with _stats_lock:
+        stats = _event_stats.get(key)
+        if stats is None:
+            stats = _event_stats[key] = EventStats(
+                phases={phase: _new_phase_stats() for phase in PHASES},
+                events=0,
+                db_calls=0,
+                ai_calls=0,
+            )
+        stats["events"] += 1
+        stats["db_calls"] += timing["db_calls"]
+        stats["ai_calls"] += timing["ai_calls"]
+        for phase in PHASES:
+            seconds = total if phase == "total" else timing[phase]
+            phase_stats = stats["phases"][phase]
+            phase_stats["buckets"][bisect.bisect_left(DURATION_BUCKETS_SECONDS, seconds)] += 1
+            phase_stats["count"] += 1
+            phase_stats["sum"] += seconds
+            phase_stats["window"].append(seconds)
+
+
+class EventTimingMiddleware(Middleware):
+    """
+    Times every event handler, tagged by state class and event name.
+
+    An event is timed from when its state lock is granted, plus the wait for
+    it, until its final update has been serialized and sent. Background
+    events end with the last update their handler yields, so the time they
+    spend re-taking the lock in `async with self` counts as lock wait.
+
+    Each event also gets a trace span. An event chained by another handler
+    (`yield State.event`) continues that handler's trace; any other event
+    starts a new one.
+    """
+
+    async def preprocess(self, app, state, event):
+        state_name, event_name = _state_and_event(state, event.name)
+        lock_wait = _pending_lock_wait.get()
+        _pending_lock_wait.set(0.0)
+        parent = pop_chained_parent(event.token, event.name)
+        event_span = start_span(
+            f"{state_name}.{event_name}",
+            {
+                "reflex.state": state_name,
+                "reflex.event": event_name,
+                "reflex.chained": parent is not None,
+            },
+            kind=SPAN_KIND_SERVER,
+            parent=parent,
+            root=True,
+        )
+        if event_span is not None:
+            event_span["start_ns"] -= int(lock_wait * 1e9)
+        use_span(event_span)
+        _current_event.set(
+            EventTiming(
+                state=state_name,
+                event=event_name,
+                started=time.perf_counter() - lock_wait,
+                lock_wait=lock_wait,
+                db=0.0,
+                ai=0.0,
+                serialize=0.0,
+                db_calls=0,
+                ai_calls=0,
+                finished=False,
+                span=event_span,
+            )
+        )
+        return None
+
+    async def postprocess(self, app, state, event, update):
+        timing = _current_event.get()
+        if timing is None:
+            return update
+        if update.events:
+            link_chained_events(
+                timing["span"],
+                event.token,
+                [e.name for e in update.events if not e.name.startswith("_")],
+            )
+        if update.final:
+            timing["finished"] = True
+        return update
+
+
+def _time_lock_wait(modify_state):
+    @contextlib.asynccontextmanager
+    async def modify_state_timed(token: str) -> AsyncIterator[rx.State]:
+        started = time.perf_counter()
+        in_event = _current_event.get() is not None
+        lock_span = start_span("reflex.state_lock") if in_event else None
+        async with modify_state(token) as state:
+            end_span(lock_span)
+            waited = time.perf_counter() - started
+            if not in_event:
+                _pending_lock_wait.set(waited)
+            else:
+                _add("lock_wait", waited)
+            yield state
+
+    return modify_state_timed
+
+
+def _time_serialization(emit_update):
+    async def emit_update_timed(update, token: str):
+        started = time.perf_counter()
+        await emit_update(update=update, token=token)
+        _add("serialize", time.perf_counter() - started)
+        timing = _current_event.get()
+        if timing is not None and timing["finished"]:
+            _current_event.set(None)
+            _record_event(timing)
+            set_attributes(
+                {
+                    "lock_wait_ms": round(timing["lock_wait"] * 1000, 3),
+                    "db_ms": round(timing["db"] * 1000, 3),
+                    "ai_ms": round(timing["ai"] * 1000, 3),
+                    "serialize_ms": round(timing["serialize"] * 1000, 3),
+                    "db.calls": timing["db_calls"],
+                    "ai.calls": timing["ai_calls"],
+                },
+                timing["span"],
+            )
+            end_span(timing["span"])
+
+    return emit_update_timed
+
+
+def instrument_app(app: rx.App):
+    """
+    Adds event timing to the app.
+
+    Installs EventTimingMiddleware and wraps the state manager's
+    modify_state, to measure state lock waits (including loading the state
+    from Redis), and the event namespace's emit_update, to measure
+    serializing and sending updates.
+    """
+    app.add_middleware(EventTimingMiddleware())
+    manager = app.state_manager
+    manager.modify_state = _time_lock_wait(manager.modify_state)
+    namespace = app.event_namespace
+    if namespace is not None:
+        namespace.emit_update = _time_serialization(namespace.emit_update)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _quantile(values: list[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def render_prometheus_metrics() -> str:
+    """
+    Renders event timings, AI usage and event-loop lag in the Prometheus text format.
+
+    Durations are cumulative histograms since startup; the p50/p95/p99
+    quantiles cover each event's last QUANTILE_WINDOW occurrences.
+    """
+    with _stats_lock:
+        snapshot = {
+            key: (
+                stats["events"],
+                stats["db_calls"],
+                stats["ai_calls"],
+                {
+                    phase: (list(s["buckets"]), s["count"], s["sum"], sorted(s["window"]))
+                    for phase, s in stats["phases"].items()
+                },
+            )
+            for key, stats in sorted(_event_stats.items())
+        }
+    lines = [
+        "# HELP clinchat_event_duration_seconds Reflex event time by phase.",
+        "# TYPE clinchat_event_duration_seconds histogram",
+    ]
+    for (state, event), (_, _, _, phases) in snapshot.items():
+        for phase, (buckets, count, total, _) in phases.items():
+            cumulative = 0
+            for bound, n in zip((*DURATION_BUCKETS_SECONDS, "+Inf"), buckets):
+                cumulative += n
+                lines.append(
+                    f"clinchat_event_duration_seconds_bucket"
+                    f"{_labels(state=state, event=event, phase=phase, le=str(bound))} {cumulative}"
+                )
+            labels = _labels(state=state, event=event, phase=phase)
+            lines.append(f"clinchat_event_duration_seconds_sum{labels} {total:.6f}")
+            lines.append(f"clinchat_event_duration_seconds_count{labels} {count}")
+    lines += [
+        "# HELP clinchat_event_latency_seconds Recent Reflex event time quantiles by phase.",
+        "# TYPE clinchat_event_latency_seconds summary",
+    ]
+    for (state, event), (_, _, _, phases) in snapshot.items():
+        for phase, (_, count, total, window) in phases.items():
+            for q in QUANTILES:
+                lines.append(
+                    f"clinchat_event_latency_seconds"
+                    f"{_labels(state=state, event=event, phase=phase, quantile=str(q))} "
+                    f"{_quantile(window, q):.6f}"
+                )
+            labels = _labels(state=state, event=event, phase=phase)
+            lines.append(f"clinchat_event_latency_seconds_sum{labels} {total:.6f}")
+            lines.append(f"clinchat_event_latency_seconds_count{labels} {count}")
+    for name, index, help_text in (
+        ("clinchat_events_total", 0, "Reflex events handled."),
+        ("clinchat_event_db_calls_total", 1, "Database calls made by Reflex events."),
+        ("clinchat_event_ai_calls_total", 2, "AI provider calls made by Reflex events."),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (state, event), values in snapshot.items():
+            lines.append(f"{name}{_labels(state=state, event=event)} {values[index]}")
+    ai_totals = get_ai_metric_totals()
+    for name, key, scale, help_text in (
+        ("clinchat_ai_requests_total", "requests", 1, "AI requests, including cache hits."),
+        ("clinchat_ai_cache_hits_total", "cache_hits", 1, "AI requests answered from cache."),
+        ("clinchat_ai_input_tokens_total", "input_tokens", 1, "AI prompt tokens."),
+        ("clinchat_ai_output_tokens_total", "output_tokens", 1, "AI completion tokens."),
+        ("clinchat_ai_cost_usd_total", "cost_usd", 1, "Estimated AI cost in USD."),
+        ("clinchat_ai_latency_seconds_total", "latency_ms", 1000, "AI provider time, excluding cache hits."),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for feature, totals in sorted(ai_totals.items()):
+            lines.append(f"{name}{_labels(feature=feature)} {totals[key] / scale:g}")
+    lag = get_loop_lag_histogram()
+    lines += [
+        "# HELP clinchat_event_loop_lag_seconds Event-loop scheduling lag.",
+        "# TYPE clinchat_event_loop_lag_seconds histogram",
+    ]
+    cumulative = 0
+    for bound, n in zip((*lag["buckets_ms"], None), lag["counts"]):
+        cumulative += n
+        le = "+Inf" if bound is None else str(bound / 1000)
+        lines.append(f"clinchat_event_loop_lag_seconds_bucket{_labels(le=le)} {cumulative}")
+    lines.append(f"clinchat_event_loop_lag_seconds_sum {lag['sum_ms'] / 1000:.6f}")
+    lines.append(f"clinchat_event_loop_lag_seconds_count {lag['count']}")
+    lines += [
+        "# HELP clinchat_event_loop_stalls_total Event-loop stalls by blocking call site.",
+        "# TYPE clinchat_event_loop_stalls_total counter",
+    ]
+    for blocker in get_top_blockers():
+        lines.append(
+            f"clinchat_event_loop_stalls_total"
+            f"{_labels(call_site=blocker['call_site'], blocking_call=blocker['blocking_call'])} "
+            f"{blocker['stalls']}"
+        )
+    return "\n".join(lines) + "\n"
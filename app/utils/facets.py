@@ -0,0 +1,153 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, TypedDict
+from app.utils.db import get_db_connection, return_db_connection
+from app.utils.data_sync import on_data_sync
+from app.utils.filter_index import get_filter_index
+from app.utils.trial_query import TrialQuery
+
+FACET_TOP_LIMIT = 10
+FACET_CACHE_SIZE = 512
+FACET_FIELDS = ("status", "phase", "study_type", "country", "sponsor")
+FACET_QUERY = """
+WITH filtered AS (
+    SELECT s.nct_id, s.overall_status, s.phase, s.study_type
+    FROM ctgov.studies s
+    WHERE {where_sql}
+),
+category_counts AS (
+    SELECT
+        CASE
+            WHEN GROUPING(overall_status) = 0 THEN 'status'
+            WHEN GROUPING(phase) = 0 THEN 'phase'
+            ELSE 'study_type'
+        END AS facet,
+        COALESCE(overall_status, phase, study_type) AS value,
+        COUNT(*) AS trial_count
+    FROM filtered
+    GROUP BY GROUPING SETS ((overall_status), (phase), (study_type))
+),
+country_counts AS (
+    SELECT 'country' AS facet, f.country AS value, COUNT(DISTINCT f.nct_id) AS trial_count
+    FROM ctgov.facilities f
+    JOIN filtered USING (nct_id)
+    WHERE f.country IS NOT NULL
+    GROUP BY f.country
+    ORDER BY trial_count DESC
+    LIMIT %(facet_limit)s
+),
+sponsor_counts AS (
+    SELECT 'sponsor' AS facet, sp.name AS value, COUNT(DISTINCT sp.nct_id) AS trial_count
+    FROM ctgov.sponsors sp
+    JOIN filtered USING (nct_id)
+    WHERE sp.name IS NOT NULL
+    GROUP BY sp.name
+    ORDER BY trial_count DESC
+    LIMIT %(facet_limit)s
+)
+SELECT facet, value, trial_count FROM category_counts WHERE value IS NOT NULL
+UNION ALL
+SELECT facet, value, trial_count FROM country_counts
+UNION ALL
+SELECT facet, value, trial_count FROM sponsor_counts
+"""
+
+
+class FacetCount(TypedDict):
+    value: str
+    count: int
+
+
+_facet_cache: OrderedDict[str, dict[str, list[FacetCount]]] = OrderedDict()
+_facet_cache_lock = threading.Lock()
+
+
+def facet_signature(filters: dict[str, str]) -> str:
+    """Returns a cache key that ignores empty filters and key order."""
+    return json.dumps(
+        {k: v.strip().lower() for k, v in filters.items() if v and v.strip()},
+        sort_keys=True,
+    )
+
+
+def _to_facets(raw: dict[str, list[tuple[str, int]]]) -> dict[str, list[FacetCount]]:
+    facets: dict[str, list[FacetCount]] = {field: [] for field in FACET_FIELDS}
+    for field, pairs in raw.items():
+        facets[field] = [FacetCount(value=v, count=c) for v, c in pairs]
+    return facets
+
+
+def _query_facet_counts(
+    where_sql: str, params: dict
+) -> Optional[dict[str, list[FacetCount]]]:
+    conn = None
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return None
+        with conn.cursor() as cur:
+            cur.execute(
+                FACET_QUERY.format(where_sql=where_sql),
+                {**params, "facet_limit": FACET_TOP_LIMIT},
+            )
+            raw: dict[str, list[tuple[str, int]]] = {}
+            for facet, value, count in cur.fetchall():
+                raw.setdefault(facet, []).append((value, count))
+            return _to_facets(raw)
+    except Exception as e:
+        logging.exception(f"Failed to compute facet counts: {e}")
+        return None
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+
+def get_facet_counts(
+    filters: dict[str, str], query: TrialQuery
+) -> Optional[dict[str, list[FacetCount]]]:
+    """
+    Counts trials per status, phase, study type, top country and top sponsor.
+
+    The counts are resolved against the in-memory filter index when it is ready
+    and with a single GROUPING SETS query otherwise, then cached per filter
+    signature so paging through results reuses them. Text and location
+    searches count only their hits; while the text index is still loading
+    they have none, and those counts are not cached.
+
+    Args:
+        filters: The current Browse search terms.
+        query: The trial query compiled from the filters.
+
+    Returns:
+        The facet counts keyed by facet name, or None if they could not be computed.
+    """
+    signature = facet_signature(filters)
+    with _facet_cache_lock:
+        cached = _facet_cache.get(signature)
+        if cached is not None:
+            _facet_cache.move_to_end(signature)
+            return cached
+    index = get_filter_index()
+    local_filters = query.local_filters()
+    if index is not None and local_filters is not None:
+        facets = _to_facets(
+            index.facet_counts(local_filters, FACET_TOP_LIMIT, ranked=query.ranked)
+        )
+    else:
+        facets = _query_facet_counts(*query.where())
+    if facets is None or query.ranked == []:
+        return facets
+    with _facet_cache_lock:
+        _facet_cache[signature] = facets
+        while len(_facet_cache) > FACET_CACHE_SIZE:
+            _facet_cache.popitem(last=False)
+    return facets
+
+
+@on_data_sync
+def clear_facet_cache():
+    """Drops cached facet counts after the AACT data changes."""
+    with _facet_cache_lock:
+        _facet_cache.clear()
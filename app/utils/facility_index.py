@@ -0,0 +1,325 @@
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Mapping, Optional
+import numpy as np
+import polars as pl
+from app.utils.polars_db import load_data_in_bulk
+from app.utils.data_sync import on_data_sync
+from app.utils.gazetteer import Geocode, get_gazetteer
+
+FACILITY_INDEX_ENABLED = os.environ.get("CLINCHAT_FACILITY_INDEX", "1") == "1"
+FACILITIES_QUERY = "SELECT nct_id, status, city, state, zip, country FROM ctgov.facilities WHERE country IS NOT NULL"
+ADDRESS_COLUMNS = ["country", "state", "city", "zip"]
+GEO_SEARCH_TERMS = ("near", "radius_km", "site_status")
+GRID_CELL_DEGREES = 0.5
+GRID_COLUMNS = int(360 / GRID_CELL_DEGREES)
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.195
+DEFAULT_RADIUS_KM = 50
+MAX_RADIUS_KM = 1000
+RADIUS_OPTIONS_KM = ["10", "25", "50", "100", "250"]
+_NEARBY_CACHE_SIZE = 256
+
+
+def _grid_cells(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    rows = np.floor((lat + 90.0) / GRID_CELL_DEGREES).astype(np.int32)
+    cols = np.floor((lng + 180.0) / GRID_CELL_DEGREES).astype(np.int32)
+    cols %= GRID_COLUMNS
+    return rows * GRID_COLUMNS + cols
+
+
+def haversine_km(
+    lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray
+) -> np.ndarray:
+    """Great-circle distances in kilometres from one point to many."""
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    lat2 = np.radians(lats.astype(np.float64))
+    lng2 = np.radians(lngs.astype(np.float64))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class FacilityIndex:
+    """
+    Grid index over geocoded trial facilities.
+
+    Facilities are sorted by their 0.5 degree grid cell, so the facilities in a
+    run of adjacent cells on one grid row form a contiguous slice found by
+    binary search. A radius query scans only the cells overlapping the
+    search circle's bounding box and computes exact haversine distances
+    for those candidates.
+    """
+
+    def __init__(
+        self,
+        nct_ids: np.ndarray,
+        trial_codes: np.ndarray,
+        statuses: list[str],
+        status_codes: np.ndarray,
+        lat: np.ndarray,
+        lng: np.ndarray,
+    ):
+        cells = _grid_cells(lat, lng)
+        order = np.argsort(cells, kind="stable")
+        self.nct_ids = nct_ids
+        self.statuses = statuses
+        self.cells = cells[order]
+        self.trial_codes = trial_codes[order].astype(np.int32)
+        self.status_codes = status_codes[order].astype(np.int8)
+        self.lat = lat[order].astype(np.float32)
+        self.lng = lng[order].astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def _candidates(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        lat_min, lat_max = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        widest = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+        dlng = radius_km / (KM_PER_DEGREE_LAT * max(widest, 1e-6))
+        row_min = int((lat_min + 90.0) // GRID_CELL_DEGREES)
+        row_max = int(
+            min((lat_max + 90.0) // GRID_CELL_DEGREES, 180 / GRID_CELL_DEGREES - 1)
+        )
+        if dlng >= 180:
+            col_ranges = [(0, GRID_COLUMNS - 1)]
+        else:
+            col_min = int((lng - dlng + 180.0) // GRID_CELL_DEGREES) % GRID_COLUMNS
+            col_max = int((lng + dlng + 180.0) // GRID_CELL_DEGREES) % GRID_COLUMNS
+            if col_min <= col_max:
+                col_ranges = [(col_min, col_max)]
+            else:
+                col_ranges = [(col_min, GRID_COLUMNS - 1), (0, col_max)]
+        slices = []
+        for row in range(row_min, row_max + 1):
+            for col_min, col_max in col_ranges:
+                base = row * GRID_COLUMNS
+                start = np.searchsorted(self.cells, base + col_min, "left")
+                end = np.searchsorted(self.cells, base + col_max, "right")
+                if end > start:
+                    slices.append(np.arange(start, end))
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def nearby(
+        self,
+        lat: float,
+        lng: float,
+        radius_km: float,
+        site_status: Optional[str] = None,
+    ) -> dict[str, float]:
+        """
+        Finds the trials with a facility within radius_km of a point.
+
+        Args:
+            lat: Latitude of the search center.
+            lng: Longitude of the search center.
+            radius_km: The search radius.
+            site_status: Only count facilities with this recruiting status.
+
+        Returns:
+            Each matching trial's distance to its nearest facility, in km,
+            ordered nearest first.
+        """
+        candidates = self._candidates(lat, lng, radius_km)
+        if site_status:
+            if site_status not in self.statuses:
+                return {}
+            code = self.statuses.index(site_status)
+            candidates = candidates[self.status_codes[candidates] == code]
+        if not len(candidates):
+            return {}
+        distances = haversine_km(lat, lng, self.lat[candidates], self.lng[candidates])
+        within = distances <= radius_km
+        candidates, distances = candidates[within], distances[within]
+        by_distance = np.argsort(distances, kind="stable")
+        trials = self.trial_codes[candidates[by_distance]]
+        _, first = np.unique(trials, return_index=True)
+        first.sort()
+        return {
+            str(self.nct_ids[trials[i]]): round(float(distances[by_distance[i]]), 1)
+            for i in first
+        }
+
+    def memory_usage(self) -> int:
+        return int(
+            self.cells.nbytes
+            + self.trial_codes.nbytes
+            + self.status_codes.nbytes
+            + self.lat.nbytes
+            + self.lng.nbytes
+        )
+
+
+_facility_index: Optional[FacilityIndex] = None
+_facility_index_lock = threading.Lock()
+_nearby_cache: OrderedDict[tuple, dict[str, float]] = OrderedDict()
+_nearby_cache_lock = threading.Lock()
+
+
+def build_facility_index() -> Optional[FacilityIndex]:
+    """
+    Loads every facility, geocodes each distinct address with the gazetteer
+    and builds a new spatial index.
+
+    Facilities that only resolve to a country centroid are left out, since a
+    radius around a centroid says nothing about where the site is, so
+    without city or postal data (see gazetteer.fetch_gazetteer) no index is
+    built.
+    """
+    started = time.perf_counter()
+    gazetteer = get_gazetteer()
+    if len(gazetteer) == 0:
+        logging.error(
+            "Skipping the facility index: the gazetteer has no cities or postal codes to place facilities with."
+        )
+        return None
+    facilities = load_data_in_bulk(FACILITIES_QUERY)
+    if facilities is None or facilities.is_empty():
+        return None
+    facilities = facilities.with_columns(
+        [pl.col(c).fill_null("") for c in ADDRESS_COLUMNS]
+        + [pl.col("status").fill_null("UNKNOWN")]
+    )
+    addresses = facilities.select(ADDRESS_COLUMNS).unique()
+    lats, lngs = [], []
+    for country, state, city, postal in addresses.iter_rows():
+        geocode = gazetteer.locate(country, state, city, postal)
+        if geocode is None or geocode["precision"] == "country":
+            lats.append(None)
+            lngs.append(None)
+        else:
+            lats.append(geocode["lat"])
+            lngs.append(geocode["lng"])
+    addresses = addresses.with_columns(
+        lat=pl.Series(lats, dtype=pl.Float32), lng=pl.Series(lngs, dtype=pl.Float32)
+    ).drop_nulls(["lat"])
+    located = facilities.join(addresses, on=ADDRESS_COLUMNS, how="inner")
+    nct_ids, trial_codes = np.unique(
+        located["nct_id"].to_numpy(), return_inverse=True
+    )
+    statuses, status_codes = np.unique(
+        located["status"].to_numpy(), return_inverse=True
+    )
+    index = FacilityIndex(
+        nct_ids,
+        trial_codes,
+        [str(s) for s in statuses],
+        status_codes,
+        located["lat"].to_numpy(),
+        located["lng"].to_numpy(),
+    )
+    logging.info(
+        f"Built facility index over {len(index)} of {len(facilities)} facilities ({index.memory_usage() / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s"
+    )
+    return index
+
+
+def get_facility_index() -> Optional[FacilityIndex]:
+    """Returns the current facility index, or None while it is disabled or building."""
+    return _facility_index
+
+
+@on_data_sync
+def refresh_facility_index():
+    """Rebuilds the facility index and swaps it in once the new one is complete."""
+    global _facility_index
+    if not FACILITY_INDEX_ENABLED:
+        return
+    if not _facility_index_lock.acquire(blocking=False):
+        logging.info("Facility index refresh already in progress.")
+        return
+    try:
+        index = build_facility_index()
+        if index is not None:
+            _facility_index = index
+            with _nearby_cache_lock:
+                _nearby_cache.clear()
+    finally:
+        _facility_index_lock.release()
+
+
+def resolve_place(text: str) -> Optional[Geocode]:
+    """Geocodes a search location such as "Boston", "Boston, MA" or "75012, France"."""
+    return get_gazetteer().resolve_place(text)
+
+
+def parse_radius_km(value: Optional[str]) -> float:
+    """Reads a radius search term, falling back to DEFAULT_RADIUS_KM."""
+    try:
+        radius = float(value) if value else DEFAULT_RADIUS_KM
+    except ValueError:
+        radius = DEFAULT_RADIUS_KM
+    return min(max(radius, 1.0), MAX_RADIUS_KM)
+
+
+def nearby_trials(
+    place: str, radius_km: float, site_status: Optional[str] = None
+) -> Optional[dict[str, float]]:
+    """
+    Finds the trials with a facility within radius_km of a named place.
+
+    Args:
+        place: The search location, resolved with the gazetteer.
+        radius_km: The search radius.
+        site_status: Only count facilities with this status, e.g. "RECRUITING".
+
+    Returns:
+        Trial distances in km ordered nearest first, or None if the place
+        cannot be resolved or the index is still building.
+    """
+    index = get_facility_index()
+    if index is None:
+        return None
+    key = (place.strip().lower(), radius_km, site_status or "")
+    with _nearby_cache_lock:
+        if key in _nearby_cache:
+            _nearby_cache.move_to_end(key)
+            return _nearby_cache[key]
+    center = resolve_place(place)
+    if center is None:
+        return None
+    result = index.nearby(center["lat"], center["lng"], radius_km, site_status)
+    with _nearby_cache_lock:
+        _nearby_cache[key] = result
+        while len(_nearby_cache) > _NEARBY_CACHE_SIZE:
+            _nearby_cache.popitem(last=False)
+    return result
+
+
+def nearby_trials_for_terms(
+    terms: Mapping[str, Optional[str]],
+) -> Optional[dict[str, float]]:
+    """
+    Applies the near / radius_km / site_status search terms.
+
+    Returns:
+        None when no location is set, otherwise the matching trial distances,
+        which are empty if the location cannot be searched.
+    """
+    place = (terms.get("near") or "").strip()
+    if not place:
+        return None
+    radius_km = parse_radius_km(terms.get("radius_km"))
+    nearby = nearby_trials(place, radius_km, terms.get("site_status") or None)
+    return nearby if nearby is not None else {}
+
+
+def location_search_problem(terms: Mapping[str, Optional[str]]) -> Optional[str]:
+    """Explains why a location search cannot run, or returns None if it can."""
+    place = (terms.get("near") or "").strip()
+    if not place:
+        return None
+    if len(get_gazetteer()) == 0:
+        return "Location search is unavailable because no place data is installed."
+    if get_facility_index() is None:
+        return "Location search is still loading. Please try again shortly."
+    if resolve_place(place) is None:
+        return f"Couldn't find a city or postal code matching '{place}'."
+    return None
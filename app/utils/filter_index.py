@@ -0,0 +1,289 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+import polars as pl
+from app.utils.polars_db import load_data_in_bulk
+from app.utils.data_sync import on_data_sync
+from app.utils.shared_cache import on_invalidation
+from app.utils.study_snapshot import SNAPSHOT_QUERY, SNAPSHOT_TOPIC, get_study_snapshot
+
+FILTER_INDEX_ENABLED = os.environ.get("CLINCHAT_FILTER_INDEX", "1") == "1"
+CATEGORICAL_FIELDS = {
+    "status": "overall_status",
+    "phase": "phase",
+    "study_type": "study_type",
+}
+POSTING_QUERIES = {
+    "condition": "SELECT nct_id, name FROM ctgov.conditions WHERE name IS NOT NULL",
+    "intervention": "SELECT nct_id, name FROM ctgov.interventions WHERE name IS NOT NULL",
+    "sponsor": "SELECT nct_id, name FROM ctgov.sponsors WHERE name IS NOT NULL",
+    "country": "SELECT DISTINCT nct_id, country AS name FROM ctgov.facilities WHERE country IS NOT NULL",
+}
+_MATCH_CACHE_SIZE = 256
+
+
+class CategoricalBitmaps:
+    """One boolean bitmap per distinct value of a low-cardinality study column."""
+
+    def __init__(self, values: list[Optional[str]]):
+        self.labels = sorted({v for v in values if v})
+        lookup = {label: code for code, label in enumerate(self.labels)}
+        self.codes = np.array([lookup.get(v, -1) for v in values], dtype=np.int16)
+        self.bitmaps = {
+            label: self.codes == code for code, label in enumerate(self.labels)
+        }
+
+    def mask(self, value: str) -> np.ndarray:
+        bitmap = self.bitmaps.get(value)
+        if bitmap is None:
+            return np.zeros(len(self.codes), dtype=bool)
+        return bitmap
+
+    def counts(self, mask: np.ndarray) -> dict[str, int]:
+        """Counts the masked studies per value."""
+        codes = self.codes[mask]
+        tally = np.bincount(codes[codes >= 0], minlength=len(self.labels))
+        return {label: int(tally[code]) for code, label in enumerate(self.labels)}
+
+    def nbytes(self) -> int:
+        return self.codes.nbytes + sum((b.nbytes for b in self.bitmaps.values()))
+
+
+class PostingList:
+    """
+    Maps each distinct name to the ordinals of the studies that reference it.
+
+    Entries are stored sorted by term (CSR layout), so a substring filter that
+    matches thousands of names is resolved with one vectorized pass.
+    """
+
+    def __init__(self, ordinals: np.ndarray, names: list[str], size: int):
+        self.size = size
+        distinct, inverse = np.unique(np.array(names, dtype=object), return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        self.names: list[str] = distinct.tolist()
+        self.lowered = [n.lower() for n in self.names]
+        self.doc = ordinals[order].astype(np.int32)
+        self.term = inverse[order].astype(np.int32)
+        self.offsets = np.searchsorted(self.term, np.arange(len(self.names) + 1))
+        self._match_cache: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def matching_terms(self, needle: str) -> np.ndarray:
+        """Returns a boolean mask over names containing needle (case-insensitive)."""
+        needle = needle.lower()
+        cached = self._match_cache.get(needle)
+        if cached is not None:
+            self._match_cache.move_to_end(needle)
+            return cached
+        terms = np.fromiter(
+            (needle in name for name in self.lowered), dtype=bool, count=len(self.lowered)
+        )
+        self._match_cache[needle] = terms
+        while len(self._match_cache) > _MATCH_CACHE_SIZE:
+            self._match_cache.popitem(last=False)
+        return terms
+
+    def mask(self, needle: str) -> np.ndarray:
+        result = np.zeros(self.size, dtype=bool)
+        result[self.doc[self.matching_terms(needle)[self.term]]] = True
+        return result
+
+    def top_counts(self, mask: np.ndarray, limit: int) -> list[tuple[str, int]]:
+        """Returns the names referenced by the most masked studies."""
+        tally = np.bincount(self.term[mask[self.doc]], minlength=len(self.names))
+        limit = min(limit, int(np.count_nonzero(tally)))
+        if limit == 0:
+            return []
+        top = np.argpartition(-tally, limit - 1)[:limit]
+        top = top[np.argsort(-tally[top], kind="stable")]
+        return [(self.names[term], int(tally[term])) for term in top]
+
+    def nbytes(self) -> int:
+        return self.doc.nbytes + self.term.nbytes + self.offsets.nbytes
+
+
+class TrialFilterIndex:
+    """
+    An in-process filter engine over the studies table.
+
+    Studies are addressed by ordinal. Browse filters become bitmap intersections,
+    the start-date sort order is precomputed, and the card columns for a page are
+    gathered from an in-memory frame, so paging needs no database round trip.
+    """
+
+    def __init__(self, studies: pl.DataFrame, postings: dict[str, pl.DataFrame]):
+        self.size = len(studies)
+        self.nct_ids: list[str] = studies["nct_id"].to_list()
+        self.ordinals = {nct_id: i for i, nct_id in enumerate(self.nct_ids)}
+        self.cards = studies
+        self.categoricals = {
+            field: CategoricalBitmaps(studies[column].to_list())
+            for field, column in CATEGORICAL_FIELDS.items()
+        }
+        ordinal_frame = pl.DataFrame(
+            {"nct_id": self.nct_ids, "ordinal": np.arange(self.size, dtype=np.int32)}
+        )
+        self.postings: dict[str, PostingList] = {}
+        for field, frame in postings.items():
+            joined = frame.join(ordinal_frame, on="nct_id", how="inner")
+            self.postings[field] = PostingList(
+                joined["ordinal"].to_numpy(), joined["name"].to_list(), self.size
+            )
+        start_days = (
+            studies["start_date"]
+            .cast(pl.Date)
+            .to_physical()
+            .cast(pl.Int64)
+            .fill_null(np.iinfo(np.int32).min)
+            .to_numpy()
+        )
+        self.order = np.argsort(-start_days, kind="stable").astype(np.int32)
+
+    def supports(self, filters: dict[str, str]) -> bool:
+        known = {"nct_id", *self.categoricals, *self.postings}
+        return all((key in known for key, value in filters.items() if value))
+
+    def resolve(self, filters: dict[str, str]) -> np.ndarray:
+        """Returns the bitmap of studies matching every non-empty filter."""
+        mask = np.ones(self.size, dtype=bool)
+        for key, value in filters.items():
+            if not value:
+                continue
+            if key == "nct_id":
+                needle = value.upper()
+                mask &= np.fromiter(
+                    (needle in n for n in self.nct_ids), dtype=bool, count=self.size
+                )
+            elif key in self.categoricals:
+                mask &= self.categoricals[key].mask(value)
+            elif key in self.postings:
+                mask &= self.postings[key].mask(value)
+        return mask
+
+    def search(
+        self,
+        filters: dict[str, str],
+        page: int,
+        per_page: int,
+        ranked: Optional[list[str]] = None,
+    ) -> tuple[int, list[dict]]:
+        """
+        Returns the total match count and the requested page of trial cards.
+
+        Results are ordered by start date, or restricted to and ordered like
+        ranked when it is given.
+        """
+        mask = self.resolve(filters)
+        order = self.order
+        if ranked is not None:
+            order = np.fromiter(
+                (self.ordinals[n] for n in ranked if n in self.ordinals),
+                dtype=np.int32,
+            )
+        hits = order[mask[order]]
+        start = max(page - 1, 0) * per_page
+        rows = hits[start : start + per_page].tolist()
+        return (len(hits), self.cards[rows].to_dicts() if rows else [])
+
+    def facet_counts(
+        self,
+        filters: dict[str, str],
+        limit: int,
+        ranked: Optional[list[str]] = None,
+    ) -> dict[str, list[tuple[str, int]]]:
+        """
+        Counts the filtered studies per status, phase, study type, country and sponsor.
+
+        With ranked given, only those studies are counted, as in search.
+        """
+        mask = self.resolve(filters)
+        if ranked is not None:
+            in_ranked = np.zeros(self.size, dtype=bool)
+            in_ranked[[self.ordinals[n] for n in ranked if n in self.ordinals]] = True
+            mask &= in_ranked
+        facets = {
+            field: list(bitmaps.counts(mask).items())
+            for field, bitmaps in self.categoricals.items()
+        }
+        for field in ("country", "sponsor"):
+            facets[field] = self.postings[field].top_counts(mask, limit)
+        return facets
+
+    def memory_usage(self) -> dict[str, int]:
+        """Reports the approximate memory held by each part of the index, in bytes."""
+        usage = {
+            "cards": int(self.cards.estimated_size()),
+            "sort_order": int(self.order.nbytes),
+        }
+        for field, bitmaps in self.categoricals.items():
+            usage[field] = bitmaps.nbytes()
+        for field, posting_list in self.postings.items():
+            usage[field] = posting_list.nbytes()
+        usage["total"] = sum(usage.values())
+        return usage
+
+
+_filter_index: Optional[TrialFilterIndex] = None
+_filter_index_lock = threading.Lock()
+
+
+def build_filter_index() -> Optional[TrialFilterIndex]:
+    """
+    Builds a new filter index over the study snapshot and bulk-loaded posting lists.
+
+    The card columns stay memory-mapped from the snapshot, so they are shared
+    by every worker; only the bitmaps, posting lists and sort order are built
+    per process. Without a snapshot the studies are loaded in bulk instead.
+    """
+    started = time.perf_counter()
+    studies = get_study_snapshot()
+    if studies is None:
+        studies = load_data_in_bulk(SNAPSHOT_QUERY)
+    if studies is None or studies.is_empty():
+        return None
+    postings = {}
+    for field, query in POSTING_QUERIES.items():
+        frame = load_data_in_bulk(query)
+        if frame is None:
+            return None
+        postings[field] = frame
+    index = TrialFilterIndex(studies, postings)
+    usage = index.memory_usage()
+    logging.info(
+        f"Built filter index over {index.size} studies in {time.perf_counter() - started:.1f}s, using {usage['total'] / 1048576:.1f} MiB: {usage}"
+    )
+    return index
+
+
+def get_filter_index() -> Optional[TrialFilterIndex]:
+    """Returns the current filter index, or None while it is disabled or building."""
+    return _filter_index
+
+
+def refresh_filter_index():
+    """Rebuilds the filter index and swaps it in once the new one is complete."""
+    global _filter_index
+    if not FILTER_INDEX_ENABLED:
+        return
+    if not _filter_index_lock.acquire(blocking=False):
+        logging.info("Filter index refresh already in progress.")
+        return
+    try:
+        index = build_filter_index()
+        if index is not None:
+            _filter_index = index
+    finally:
+        _filter_index_lock.release()
+
+
+on_data_sync(refresh_filter_index)
+
+
+@on_invalidation(SNAPSHOT_TOPIC)
+def rebuild_filter_index(version: str):
+    """Rebuilds the filter index over the snapshot another worker just published."""
+    refresh_filter_index()
@@ -0,0 +1,437 @@
+import os
+import re
+import glob
+import time
+import asyncio
+import hashlib
+import zipfile
+import argparse
+import logging
+import sqlite3
+import threading
+import unicodedata
+import urllib.request
+from typing import Iterable, Optional, TypedDict
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+COUNTRIES_PATH = os.path.join(DATA_DIR, "countries.tsv")
+GAZETTEER_DIR = os.environ.get(
+    "CLINCHAT_GAZETTEER_DIR", os.path.join(DATA_DIR, "gazetteer")
+)
+GEOCODE_DB_PATH = os.environ.get("CLINCHAT_GEOCODE_DB", "geocodes.sqlite3")
+GEONAMES_URL = "https://download.geonames.org/export"
+GEONAMES_FILES = {
+    "cities15000.txt": f"{GEONAMES_URL}/dump/cities15000.zip",
+    "admin1CodesASCII.txt": f"{GEONAMES_URL}/dump/admin1CodesASCII.txt",
+}
+GEONAMES_POSTAL_URL = f"{GEONAMES_URL}/zip/allCountries.zip"
+PERSISTED_PRECISIONS = ("postal", "city")
+ANY_COUNTRY = "*"
+_SQLITE_BATCH = 500
+
+
+class Geocode(TypedDict):
+    lat: float
+    lng: float
+    precision: str
+
+
+def normalize_place(value: Optional[str]) -> str:
+    """Lowercases, strips accents and collapses punctuation so spellings compare equal."""
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKD", value)
+    value = "".join(c for c in value if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", " ", value.lower()).strip()
+
+
+def _postal_variants(postal: Optional[str]) -> list[str]:
+    if not postal:
+        return []
+    compact = re.sub(r"\s+", "", postal.upper())
+    variants = [compact, compact.split("-")[0], compact[:3]]
+    return list(dict.fromkeys(v for v in variants if v))
+
+
+def _key_hash(key: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(), "little"
+    )
+
+
+class Gazetteer:
+    """
+    Offline place lookup over GeoNames-format dumps.
+
+    Every place is stored under 64-bit hashes of its (country, postal code),
+    (country, region, city) and (country, city) keys, kept in one sorted
+    uint64 array with parallel float32 coordinate arrays, so a lookup is a
+    binary search and a million places take about 16 MB. When two places
+    share a key the more populous one wins. Countries without a matching
+    place fall back to the centroid from data/countries.tsv, so every
+    facility with a known country gets a position.
+    """
+
+    def __init__(self, countries_path: str = COUNTRIES_PATH):
+        self.country_codes: dict[str, str] = {}
+        self.centroids: dict[str, tuple[float, float]] = {}
+        self._load_countries(countries_path)
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.lat = np.empty(0, dtype=np.float32)
+        self.lng = np.empty(0, dtype=np.float32)
+
+    def _load_countries(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#") or not line.strip():
+                    continue
+                iso, name, lat, lng, *aliases = line.rstrip("\n").split("\t")
+                self.centroids[iso] = (float(lat), float(lng))
+                for spelling in [iso, name, *"|".join(aliases).split("|")]:
+                    if spelling:
+                        self.country_codes[normalize_place(spelling)] = iso
+
+    def country_code(self, country: Optional[str]) -> Optional[str]:
+        return self.country_codes.get(normalize_place(country))
+
+    def build(self, places: Iterable[tuple[str, float, float, int]]):
+        """
+        Replaces the place index.
+
+        Args:
+            places: (key, latitude, longitude, population) tuples, where key is
+                built by city_key or postal_key.
+        """
+        hashes, lats, lngs, populations = [], [], [], []
+        for key, lat, lng, population in places:
+            hashes.append(_key_hash(key))
+            lats.append(lat)
+            lngs.append(lng)
+            populations.append(population)
+        hashes = np.array(hashes, dtype=np.uint64)
+        order = np.lexsort((-np.array(populations, dtype=np.int64), hashes))
+        hashes = hashes[order]
+        _, first = np.unique(hashes, return_index=True)
+        self.hashes = hashes[first]
+        self.lat = np.array(lats, dtype=np.float32)[order][first]
+        self.lng = np.array(lngs, dtype=np.float32)[order][first]
+
+    def _find(self, key: str) -> Optional[tuple[float, float]]:
+        target = np.uint64(_key_hash(key))
+        i = int(np.searchsorted(self.hashes, target))
+        if i < len(self.hashes) and self.hashes[i] == target:
+            return (round(float(self.lat[i]), 5), round(float(self.lng[i]), 5))
+        return None
+
+    def locate(
+        self,
+        country: Optional[str],
+        state: Optional[str] = None,
+        city: Optional[str] = None,
+        postal: Optional[str] = None,
+    ) -> Optional[Geocode]:
+        """
+        Geocodes an address, trying the postal code, then the city, then the country.
+
+        Returns:
+            The position and the precision it was resolved at, or None if the
+            country is unknown.
+        """
+        iso = self.country_code(country)
+        if iso is None:
+            return None
+        candidates = [("postal", postal_key(iso, p)) for p in _postal_variants(postal)]
+        if city:
+            if state:
+                candidates.append(("city", city_key(iso, state, city)))
+            candidates.append(("city", city_key(iso, None, city)))
+        for precision, key in candidates:
+            found = self._find(key)
+            if found:
+                return {"lat": found[0], "lng": found[1], "precision": precision}
+        if iso in self.centroids:
+            lat, lng = self.centroids[iso]
+            return {"lat": lat, "lng": lng, "precision": "country"}
+        return None
+
+    def resolve_place(self, text: str) -> Optional[Geocode]:
+        """
+        Geocodes free text such as "Boston", "Cambridge, MA" or "75012, France".
+
+        The text is read as a city or postal code, then an optional region,
+        then an optional country. Without a country the most populous city of
+        that name anywhere wins. US state abbreviations and names collide with
+        countries (MA is Morocco, CA is Canada, Georgia is both), so when the
+        last part reads as a country but no city or postal code matches there,
+        it is retried as a region in any country.
+
+        Returns:
+            The position, or None unless the place resolves to a city or
+            postal code.
+        """
+        parts = [p.strip() for p in text.split(",") if p.strip()]
+        if not parts:
+            return None
+        iso = self.country_code(parts[-1]) if len(parts) > 1 else None
+        if iso:
+            place, region = parts[0], (parts[1] if len(parts) > 2 else None)
+            postal = place if any(c.isdigit() for c in place) else None
+            geocode = self.locate(iso, region, place, postal)
+            if geocode and geocode["precision"] != "country":
+                return geocode
+        place, region = parts[0], (parts[1] if len(parts) > 1 else None)
+        for key in (
+            city_key(ANY_COUNTRY, region, place) if region else None,
+            city_key(ANY_COUNTRY, None, place),
+        ):
+            found = self._find(key) if key else None
+            if found:
+                return {"lat": found[0], "lng": found[1], "precision": "city"}
+        return None
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+
+def city_key(iso: str, region: Optional[str], city: str) -> str:
+    return f"{iso}|{normalize_place(region)}|{normalize_place(city)}"
+
+
+def postal_key(iso: str, postal: str) -> str:
+    return f"{iso}|zip|{postal}"
+
+
+def _read_admin1_names(path: str) -> dict[str, str]:
+    names = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                code, name, ascii_name, *_ = line.rstrip("\n").split("\t")
+                names[code] = ascii_name or name
+    return names
+
+
+def _iter_cities(path: str, admin1_names: dict[str, str]):
+    """Yields places from a GeoNames citiesNNN.txt / allCountries.txt dump."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 15 or cols[6] != "P":
+                continue
+            name, ascii_name, iso, admin1 = cols[1], cols[2], cols[8], cols[10]
+            lat, lng = float(cols[4]), float(cols[5])
+            population = int(cols[14] or 0)
+            regions = {None, admin1, admin1_names.get(f"{iso}.{admin1}")}
+            for city in {name, ascii_name}:
+                for region in regions:
+                    yield (city_key(iso, region, city), lat, lng, population)
+                    yield (city_key(ANY_COUNTRY, region, city), lat, lng, population)
+
+
+def _iter_postal_codes(path: str):
+    """Yields places from a GeoNames postal code dump."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 11 or not cols[9] or not cols[10]:
+                continue
+            iso, postal, place, region, region_code = cols[:5]
+            lat, lng = float(cols[9]), float(cols[10])
+            yield (postal_key(iso, re.sub(r"\s+", "", postal.upper())), lat, lng, 0)
+            for r in (region, region_code):
+                yield (city_key(iso, r, place), lat, lng, 0)
+
+
+def build_gazetteer(directory: str = GAZETTEER_DIR) -> Gazetteer:
+    """
+    Builds the gazetteer from the dumps in directory.
+
+    Reads a GeoNames cities file (cities*.txt), admin1CodesASCII.txt for region
+    names, and a GeoNames postal code dump saved as postal_codes.txt, as
+    downloaded by fetch_gazetteer. Any of them may be missing; lookups then
+    resolve at country precision and free-text places do not resolve at all.
+    """
+    started = time.perf_counter()
+    gazetteer = Gazetteer()
+    cities_paths = sorted(glob.glob(os.path.join(directory, "cities*.txt")))
+    if not cities_paths:
+        logging.error(
+            f"No GeoNames cities file in {directory}; location search will not resolve any place. Run `python -m app.utils.gazetteer` to download one."
+        )
+    admin1_names = _read_admin1_names(os.path.join(directory, "admin1CodesASCII.txt"))
+
+    def places():
+        for path in cities_paths[:1]:
+            yield from _iter_cities(path, admin1_names)
+        postal_path = os.path.join(directory, "postal_codes.txt")
+        if os.path.exists(postal_path):
+            yield from _iter_postal_codes(postal_path)
+
+    gazetteer.build(places())
+    logging.info(
+        f"Loaded gazetteer with {len(gazetteer)} place keys and {len(gazetteer.centroids)} countries in {time.perf_counter() - started:.1f}s"
+    )
+    return gazetteer
+
+
+def _download(url: str, path: str):
+    """Downloads url to path, extracting the dump (the largest member) from a zip."""
+    logging.info(f"Downloading {url}")
+    tmp_path = f"{path}.part"
+    with urllib.request.urlopen(url, timeout=300) as response, open(tmp_path, "wb") as f:
+        while chunk := response.read(1 << 20):
+            f.write(chunk)
+    if url.endswith(".zip"):
+        with zipfile.ZipFile(tmp_path) as archive:
+            dump = max(archive.infolist(), key=lambda info: info.file_size)
+            with archive.open(dump) as src, open(path, "wb") as dst:
+                while chunk := src.read(1 << 20):
+                    dst.write(chunk)
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+
+
+def fetch_gazetteer(directory: str = GAZETTEER_DIR, postal: bool = False):
+    """
+    Downloads the GeoNames dumps that build_gazetteer reads into directory.
+
+    Args:
+        directory: Where to save the files, GAZETTEER_DIR by default.
+        postal: Also download the worldwide postal code dump (about 20 MB
+            compressed) as postal_codes.txt.
+    """
+    os.makedirs(directory, exist_ok=True)
+    files = dict(GEONAMES_FILES)
+    if postal:
+        files["postal_codes.txt"] = GEONAMES_POSTAL_URL
+    for name, url in files.items():
+        _download(url, os.path.join(directory, name))
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+_geocodes: dict[str, Optional[Geocode]] = {}
+
+
+def get_gazetteer() -> Gazetteer:
+    """Returns the process-wide gazetteer, building it on first use."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = build_gazetteer()
+    return _gazetteer
+
+
+async def load_gazetteer():
+    """Builds the gazetteer in a worker thread at startup."""
+    try:
+        await asyncio.to_thread(get_gazetteer)
+    except Exception as e:
+        logging.exception(f"Failed to load gazetteer: {e}")
+
+
+def location_key(location: dict) -> str:
+    return "|".join(
+        normalize_place(location.get(field))
+        for field in ("country", "state", "city", "zip")
+    )
+
+
+def _geocode_db() -> sqlite3.Connection:
+    conn = sqlite3.connect(GEOCODE_DB_PATH)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS facility_geocodes (
+            location_key TEXT PRIMARY KEY,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            precision TEXT NOT NULL
+        )
+        """
+    )
+    return conn
+
+
+def _read_persisted(keys: list[str]) -> dict[str, Geocode]:
+    found = {}
+    with _geocode_db() as conn:
+        for i in range(0, len(keys), _SQLITE_BATCH):
+            batch = keys[i : i + _SQLITE_BATCH]
+            rows = conn.execute(
+                f"SELECT location_key, latitude, longitude, precision FROM facility_geocodes WHERE location_key IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+            for key, lat, lng, precision in rows:
+                found[key] = {"lat": lat, "lng": lng, "precision": precision}
+    return found
+
+
+def _persist(geocodes: dict[str, Geocode]):
+    with _geocode_db() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO facility_geocodes VALUES (?, ?, ?, ?)",
+            [
+                (key, g["lat"], g["lng"], g["precision"])
+                for key, g in geocodes.items()
+            ],
+        )
+
+
+def geocode_locations(locations: list[dict]) -> list[Optional[Geocode]]:
+    """
+    Geocodes trial facilities, resolving each distinct address once.
+
+    Results are cached in memory and city or postal level matches are also
+    persisted to sqlite, so an address is only looked up in the gazetteer the
+    first time any trial lists it. Country-level fallbacks are not persisted,
+    so they improve once fuller gazetteer dumps are installed.
+
+    Args:
+        locations: Facility dicts with country, state, city and zip.
+
+    Returns:
+        One geocode per location, None where the country is unknown.
+    """
+    keys = [location_key(loc) for loc in locations]
+    missing = list({k for k in keys if k not in _geocodes})
+    if missing:
+        try:
+            persisted = _read_persisted(missing)
+        except sqlite3.Error as e:
+            logging.exception(f"Failed to read persisted geocodes: {e}")
+            persisted = {}
+        _geocodes.update(persisted)
+        gazetteer = get_gazetteer()
+        resolved = {}
+        for loc, key in zip(locations, keys):
+            if key in _geocodes:
+                continue
+            geocode = gazetteer.locate(
+                loc.get("country"), loc.get("state"), loc.get("city"), loc.get("zip")
+            )
+            _geocodes[key] = geocode
+            if geocode and geocode["precision"] in PERSISTED_PRECISIONS:
+                resolved[key] = geocode
+        if resolved:
+            try:
+                _persist(resolved)
+            except sqlite3.Error as e:
+                logging.exception(f"Failed to persist geocodes: {e}")
+    return [_geocodes[k] for k in keys]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Download the GeoNames place data used for location search."
+    )
+    parser.add_argument("--dir", default=GAZETTEER_DIR, help="Target directory")
+    parser.add_argument(
+        "--postal", action="store_true", help="Also download postal codes"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    fetch_gazetteer(args.dir, args.postal)
+    print(f"{len(build_gazetteer(args.dir))} place keys in {args.dir}")
@@ -0,0 +1,225 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from typing import Optional, TypedDict
+
+LOOP_MONITOR_ENABLED = os.environ.get("CLINCHAT_LOOP_MONITOR", "1") != "0"
+LOOP_LAG_INTERVAL_MS = float(os.environ.get("CLINCHAT_LOOP_LAG_INTERVAL_MS", "50"))
+LOOP_LAG_THRESHOLD_MS = float(os.environ.get("CLINCHAT_LOOP_LAG_THRESHOLD_MS", "100"))
+LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+MAX_BLOCKERS = 200
+STACK_DEPTH = 30
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LagHistogram(TypedDict):
+    buckets_ms: list[float]
+    counts: list[int]
+    count: int
+    sum_ms: float
+    max_ms: float
+    stalls: int
+    threshold_ms: float
+
+
+class BlockerSummary(TypedDict):
+    call_site: str
+    blocking_call: str
+    task: str
+    stalls: int
+    total_ms: float
+    max_ms: float
+    last_seen: float
+    stack: list[str]
+
+
+class _StallCapture(TypedDict):
+    call_site: str
+    blocking_call: str
+    task: str
+    stack: list[str]
+
+
+_lag_counts = [0] * (len(LAG_BUCKETS_MS) + 1)
+_lag_count = 0
+_lag_sum_ms = 0.0
+_lag_max_ms = 0.0
+_stalls = 0
+_blockers: dict[str, BlockerSummary] = {}
+_pending_capture: Optional[_StallCapture] = None
+_metrics_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread_id: Optional[int] = None
+_last_tick = 0.0
+_tick_seq = 0
+
+
+def _format_frame(frame: traceback.FrameSummary) -> str:
+    path = frame.filename
+    if path.startswith(APP_ROOT):
+        path = os.path.relpath(path, os.path.dirname(APP_ROOT))
+    return f"{path}:{frame.lineno} in {frame.name}"
+
+
+def _capture_loop_stack() -> Optional[_StallCapture]:
+    """
+    Samples what the event-loop thread is running while it is blocked.
+
+    The blocking call is the innermost frame; the call site is the innermost
+    frame inside the app package, i.e. the handler line that made the call.
+    """
+    frame = sys._current_frames().get(_loop_thread_id)
+    if frame is None:
+        return None
+    frames = traceback.extract_stack(frame)[-STACK_DEPTH:]
+    if not frames:
+        return None
+    app_frames = [f for f in frames if f.filename.startswith(APP_ROOT)]
+    call_site = app_frames[-1] if app_frames else frames[-1]
+    task_name = "unknown"
+    try:
+        task = asyncio.current_task(_loop)
+        if task is not None:
+            task_name = task.get_coro().__qualname__
+    except Exception:
+        pass
+    return _StallCapture(
+        call_site=_format_frame(call_site),
+        blocking_call=_format_frame(frames[-1]),
+        task=task_name,
+        stack=[_format_frame(f) for f in frames],
+    )
+
+
+def _watchdog():
+    """
+    Thread that samples the loop's stack once per stall.
+
+    A stall is seen here while it is still happening, which is the only time
+    the blocking frame can be captured; its length is recorded by the
+    monitor task once the loop runs again.
+    """
+    global _pending_capture
+    poll = LOOP_LAG_INTERVAL_MS / 2000
+    captured_seq = -1
+    while True:
+        time.sleep(poll)
+        seq, last_tick = _tick_seq, _last_tick
+        if seq == captured_seq:
+            continue
+        blocked_ms = (time.monotonic() - last_tick) * 1000 - LOOP_LAG_INTERVAL_MS
+        if blocked_ms < LOOP_LAG_THRESHOLD_MS:
+            continue
+        captured_seq = seq
+        capture = _capture_loop_stack()
+        if capture is not None:
+            with _metrics_lock:
+                _pending_capture = capture
+
+
+def _record_lag(lag_ms: float):
+    global _lag_count, _lag_sum_ms, _lag_max_ms, _stalls, _pending_capture
+    bucket = next(
+        (i for i, bound in enumerate(LAG_BUCKETS_MS) if lag_ms <= bound),
+        len(LAG_BUCKETS_MS),
+    )
+    with _metrics_lock:
+        _lag_counts[bucket] += 1
+        _lag_count += 1
+        _lag_sum_ms += lag_ms
+        _lag_max_ms = max(_lag_max_ms, lag_ms)
+        if lag_ms < LOOP_LAG_THRESHOLD_MS:
+            _pending_capture = None
+            return
+        _stalls += 1
+        capture, _pending_capture = _pending_capture, None
+        if capture is None:
+            capture = _StallCapture(
+                call_site="unknown", blocking_call="unknown", task="unknown", stack=[]
+            )
+        key = f"{capture['call_site']}|{capture['blocking_call']}"
+        blocker = _blockers.get(key)
+        if blocker is None:
+            if len(_blockers) >= MAX_BLOCKERS:
+                del _blockers[min(_blockers, key=lambda k: _blockers[k]["last_seen"])]
+            blocker = _blockers[key] = BlockerSummary(
+                call_site=capture["call_site"],
+                blocking_call=capture["blocking_call"],
+                task=capture["task"],
+                stalls=0,
+                total_ms=0.0,
+                max_ms=0.0,
+                last_seen=0.0,
+                stack=capture["stack"],
+            )
+        blocker["stalls"] += 1
+        blocker["total_ms"] += lag_ms
+        blocker["max_ms"] = max(blocker["max_ms"], lag_ms)
+        blocker["last_seen"] = time.time()
+        blocker["stack"] = capture["stack"] or blocker["stack"]
+    logging.warning(
+        f"Event loop blocked for {lag_ms:.0f} ms at {capture['call_site']} "
+        f"({capture['blocking_call']}, task {capture['task']})\n  "
+        + "\n  ".join(capture["stack"][-10:])
+    )
+
+
+async def loop_lag_monitor():
+    """
+    Lifespan task that measures event-loop scheduling lag.
+
+    Sleeps LOOP_LAG_INTERVAL_MS at a time and records how late each wake-up
+    is. A watchdog thread samples the loop's stack whenever a wake-up is
+    overdue by LOOP_LAG_THRESHOLD_MS, so each stall is attributed to the
+    blocking call and the handler line that made it.
+    """
+    global _loop, _loop_thread_id, _last_tick, _tick_seq
+    if not LOOP_MONITOR_ENABLED:
+        return
+    _loop = asyncio.get_running_loop()
+    _loop_thread_id = threading.get_ident()
+    _last_tick = time.monotonic()
+    threading.Thread(target=_watchdog, name="loop-lag-watchdog", daemon=True).start()
+    interval = LOOP_LAG_INTERVAL_MS / 1000
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        lag_ms = max(0.0, (now - _last_tick - interval) * 1000)
+        _last_tick = now
+        _tick_seq += 1
+        _record_lag(lag_ms)
+
+
+def get_loop_lag_histogram() -> LagHistogram:
+    """
+    Returns the lag distribution since startup.
+
+    counts[i] is the number of wake-ups with lag up to buckets_ms[i] (and above
+    the previous bound); the extra last count is for lags above every bound.
+    """
+    with _metrics_lock:
+        return LagHistogram(
+            buckets_ms=list(LAG_BUCKETS_MS),
+            counts=list(_lag_counts),
+            count=_lag_count,
+            sum_ms=round(_lag_sum_ms, 3),
+            max_ms=round(_lag_max_ms, 3),
+            stalls=_stalls,
+            threshold_ms=LOOP_LAG_THRESHOLD_MS,
+        )
+
+
+def get_top_blockers(limit: int = 20) -> list[BlockerSummary]:
+    """Returns the call sites that blocked the loop longest in total, worst first."""
+    with _metrics_lock:
+        blockers = [BlockerSummary(**b) for b in _blockers.values()]
+    blockers.sort(key=lambda b: b["total_ms"], reverse=True)
+    for blocker in blockers:
+        blocker["total_ms"] = round(blocker["total_ms"], 3)
+        blocker["max_ms"] = round(blocker["max_ms"], 3)
+    return blockers[:limit]
+
@@ -0,0 +1,135 @@
+import os
+import math
+from typing import TypedDict
+import numpy as np
+from reflex_enterprise.components.map.types import LatLng, latlng
+
+TILE_SIZE = 256
+CLUSTER_CELL_PX = 80
+MAX_MAP_ZOOM = 18
+CLUSTER_EXPAND_ZOOM_STEP = 2
+MAP_VIEWPORT_PX = (1200, 400)
+VIEWPORT_PADDING = 0.5
+CLUSTER_MIN_FACILITIES = int(os.environ.get("CLINCHAT_CLUSTER_MIN_FACILITIES", "50"))
+MAX_LIST_POPUP_SITES = 100
+
+
+class MapCluster(TypedDict):
+    position: LatLng
+    count: int
+    popup: str
+    radius: float
+    expand_zoom: float
+
+
+def _project(lat: np.ndarray, lng: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Web Mercator world pixel coordinates at zoom 0."""
+    lat = np.clip(lat, -85.05112878, 85.05112878)
+    x = (lng + 180.0) / 360.0 * TILE_SIZE
+    sin = np.sin(np.radians(lat))
+    y = (0.5 - np.log((1 + sin) / (1 - sin)) / (4 * math.pi)) * TILE_SIZE
+    return x, y
+
+
+class FacilityPoints:
+    """Projected facility coordinates for one trial, ready to cluster at any zoom."""
+
+    def __init__(self, markers: list[dict]):
+        self.popups = [m["popup"] for m in markers]
+        self.lat = np.array([m["position"]["lat"] for m in markers], dtype=np.float64)
+        self.lng = np.array([m["position"]["lng"] for m in markers], dtype=np.float64)
+        self.x, self.y = _project(self.lat, self.lng)
+
+    def __len__(self) -> int:
+        return len(self.popups)
+
+    def _list_popup(self, members: np.ndarray) -> str:
+        """Lists the popups of co-located facilities in one scrollable popup."""
+        items = [self.popups[i] for i in members[:MAX_LIST_POPUP_SITES]]
+        if len(members) > MAX_LIST_POPUP_SITES:
+            items.append(f"and {len(members) - MAX_LIST_POPUP_SITES} more sites")
+        return (
+            f'<div style="max-height:16rem;overflow-y:auto"><strong>{len(members)} sites</strong><hr/>'
+            + "<hr/>".join(items)
+            + "</div>"
+        )
+
+    def clusters(self, center: LatLng, zoom: float) -> list[MapCluster]:
+        """
+        Groups the facilities in and around the viewport into grid clusters.
+
+        The grid has CLUSTER_CELL_PX cells at the current zoom, and only
+        facilities inside the viewport plus VIEWPORT_PADDING screens on each
+        side are considered, so the number of clusters is bounded by the
+        viewport size rather than the number of facilities. A cluster of one
+        is returned with its facility popup. Facilities are geocoded to their
+        city, so many share one point; a cluster whose members all share one
+        point, or any cluster at MAX_MAP_ZOOM, cannot be split by zooming and
+        gets a popup listing its facilities instead. Other clusters have an
+        empty popup and carry the zoom level that splits them.
+
+        Args:
+            center: The map center.
+            zoom: The map zoom level.
+
+        Returns:
+            The clusters, largest first.
+        """
+        if not len(self):
+            return []
+        zoom = max(0, min(int(round(zoom)), MAX_MAP_ZOOM))
+        scale = 2**zoom
+        cx, cy = _project(np.array([center["lat"]]), np.array([center["lng"]]))
+        px, py = self.x * scale, self.y * scale
+        half_w = MAP_VIEWPORT_PX[0] * (0.5 + VIEWPORT_PADDING)
+        half_h = MAP_VIEWPORT_PX[1] * (0.5 + VIEWPORT_PADDING)
+        world = TILE_SIZE * scale
+        dx = (px - cx[0] * scale + world / 2) % world - world / 2
+        visible = np.flatnonzero(
+            (np.abs(dx) <= half_w) & (np.abs(py - cy[0] * scale) <= half_h)
+        )
+        if not len(visible):
+            return []
+        if len(self) < CLUSTER_MIN_FACILITIES:
+            lat_e5 = np.round(self.lat[visible] * 1e5).astype(np.int64)
+            lng_e5 = np.round(self.lng[visible] * 1e5).astype(np.int64)
+            cells = lat_e5 * 36_000_001 + lng_e5
+        else:
+            cell_x = (px[visible] // CLUSTER_CELL_PX).astype(np.int64)
+            cell_y = (py[visible] // CLUSTER_CELL_PX).astype(np.int64)
+            cells = cell_x * (world // CLUSTER_CELL_PX + 1) + cell_y
+        _, first, inverse, counts = np.unique(
+            cells, return_index=True, return_inverse=True, return_counts=True
+        )
+        lat = np.bincount(inverse, weights=self.lat[visible]) / counts
+        lng = np.bincount(inverse, weights=self.lng[visible]) / counts
+        spread = np.zeros(len(counts))
+        np.maximum.at(
+            spread,
+            inverse,
+            np.abs(self.lat[visible] - lat[inverse])
+            + np.abs(self.lng[visible] - lng[inverse]),
+        )
+        members = np.split(
+            visible[np.argsort(inverse, kind="stable")], np.cumsum(counts)[:-1]
+        )
+        expand_zoom = min(zoom + CLUSTER_EXPAND_ZOOM_STEP, MAX_MAP_ZOOM)
+        clusters = []
+        for i in np.argsort(-counts, kind="stable"):
+            count = int(counts[i])
+            if count == 1:
+                popup = self.popups[visible[first[i]]]
+            elif zoom == MAX_MAP_ZOOM or spread[i] < 1e-9:
+                popup = self._list_popup(members[i])
+            else:
+                popup = ""
+            clusters.append(
+                {
+                    "position": latlng(lat=float(lat[i]), lng=float(lng[i])),
+                    "count": count,
+                    "popup": popup,
+                    "radius": float(min(10 + 4 * math.log2(count), 28)),
+                    "expand_zoom": float(expand_zoom),
+                }
+            )
+        return clusters
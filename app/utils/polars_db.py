@@ -2,7 +2,63 @@ import reflex as rx
 import polars as pl
 import logging
 from typing import Optional, Any
-from app.utils.db import db_config
+from app.utils.db import db_config, get_db_connection, return_db_connection
+from app.utils.event_metrics import timed_phase
+from app.utils.tracing import query_span, set_attributes
+from app.utils.study_snapshot import scan_study_snapshot
+
+COMPARISON_COLUMNS = "nct_id, brief_title, overall_status, phase, study_type, enrollment, start_date, completion_date"
+PHASES = [
+    "EARLY_PHASE1",
+    "PHASE1",
+    "PHASE1/PHASE2",
+    "PHASE2",
+    "PHASE2/PHASE3",
+    "PHASE3",
+    "PHASE4",
+    "NA",
+]
+STATUSES = [
+    "NOT_YET_RECRUITING",
+    "RECRUITING",
+    "ENROLLING_BY_INVITATION",
+    "ACTIVE_NOT_RECRUITING",
+    "SUSPENDED",
+    "TERMINATED",
+    "COMPLETED",
+    "WITHDRAWN",
+    "UNKNOWN",
+    "AVAILABLE",
+    "NO_LONGER_AVAILABLE",
+    "TEMPORARILY_NOT_AVAILABLE",
+    "APPROVED_FOR_MARKETING",
+    "WITHHELD",
+]
+STUDY_TYPES = ["INTERVENTIONAL", "OBSERVATIONAL", "EXPANDED_ACCESS"]
+AGENCY_CLASSES = ["INDUSTRY", "NIH", "FED", "OTHER_GOV", "NETWORK", "INDIV", "AMBIG", "OTHER", "UNKNOWN"]
+INTERVENTION_TYPES = [
+    "DRUG",
+    "DEVICE",
+    "BIOLOGICAL",
+    "PROCEDURE",
+    "RADIATION",
+    "BEHAVIORAL",
+    "GENETIC",
+    "DIETARY_SUPPLEMENT",
+    "COMBINATION_PRODUCT",
+    "DIAGNOSTIC_TEST",
+    "OTHER",
+]
+ENUM_COLUMNS = {
+    "phase": PHASES,
+    "overall_status": STATUSES,
+    "study_type": STUDY_TYPES,
+    "agency_class": AGENCY_CLASSES,
+    "intervention_type": INTERVENTION_TYPES,
+}
+CATEGORICAL_COLUMNS = ("country",)
+_INT_DOWNCASTS = (pl.Int8, pl.Int16, pl.Int32)
+_INT_RANGES = {pl.Int8: (-(2**7), 2**7 - 1), pl.Int16: (-(2**15), 2**15 - 1), pl.Int32: (-(2**31), 2**31 - 1)}
 
 
 def get_polars_db_connection_string() -> str:
@@ -10,6 +66,58 @@ def get_polars_db_connection_string() -> str:
     return f"postgresql://{db_config['user']}:{db_config['password']}@{db_config['host']}:{db_config['port']}/{db_config['database']}"
 
 
+def _enum_or_categorical(frame: pl.DataFrame, column: str) -> pl.Expr:
+    # AACT stores missing categories as empty strings as well as NULL.
+    values = pl.when(pl.col(column) != "").then(pl.col(column)).alias(column)
+    vocabulary = ENUM_COLUMNS[column]
+    unknown = set(frame[column].drop_nulls().unique().to_list()) - set(vocabulary) - {""}
+    if unknown:
+        logging.warning(
+            f"Unexpected {column} values {sorted(unknown)[:5]}; loading it as Categorical instead of Enum."
+        )
+        return values.cast(pl.Categorical)
+    return values.cast(pl.Enum(vocabulary))
+
+
+def _smallest_int(series: pl.Series) -> Optional[pl.DataType]:
+    low, high = series.min(), series.max()
+    if low is None:
+        return None
+    for dtype in _INT_DOWNCASTS:
+        min_value, max_value = _INT_RANGES[dtype]
+        if min_value <= low and high <= max_value:
+            return dtype if dtype != series.dtype else None
+    return None
+
+
+def apply_column_types(frame: pl.DataFrame) -> pl.DataFrame:
+    """
+    Casts a loaded frame to compact types.
+
+    Known categorical columns become pl.Enum over their AACT vocabulary, or
+    pl.Categorical if the data holds a value the vocabulary does not, and
+    country becomes pl.Categorical, so group-bys hash small integer codes
+    instead of strings. Integers are downcast to the smallest signed type
+    that holds them (cast back to Int64 before summing large columns), and
+    *_date columns loaded as text or timestamps are parsed to pl.Date.
+    """
+    casts = []
+    for column, dtype in frame.schema.items():
+        if dtype == pl.String and column in ENUM_COLUMNS:
+            casts.append(_enum_or_categorical(frame, column))
+        elif dtype == pl.String and column in CATEGORICAL_COLUMNS:
+            casts.append(pl.col(column).cast(pl.Categorical))
+        elif column.endswith("_date") and dtype == pl.String:
+            casts.append(pl.col(column).str.to_date(strict=False))
+        elif column.endswith("_date") and isinstance(dtype, pl.Datetime):
+            casts.append(pl.col(column).dt.date())
+        elif dtype.is_integer():
+            smaller = _smallest_int(frame[column])
+            if smaller is not None:
+                casts.append(pl.col(column).cast(smaller))
+    return frame.with_columns(casts) if casts else frame
+
+
 def load_data_in_bulk(
     query: str, partition_on: Optional[str] = None
 ) -> Optional[pl.DataFrame]:
@@ -26,9 +134,12 @@ def load_data_in_bulk(
     conn_str = get_polars_db_connection_string()
     try:
         logging.info(f"Executing bulk data query with Polars: {query[:100]}...")
-        df = pl.read_database_uri(
-            query, conn_str, engine="connectorx", partition_on=partition_on
-        )
+        with timed_phase("db"), query_span(query) as current:
+            df = pl.read_database_uri(
+                query, conn_str, engine="connectorx", partition_on=partition_on
+            )
+            set_attributes({"db.rows": len(df)}, current)
+        df = apply_column_types(df)
         logging.info(f"Successfully loaded {len(df)} rows into DataFrame.")
         return df
     except Exception as e:
@@ -49,7 +160,10 @@ def execute_analytics_query(query: str) -> Optional[pl.DataFrame]:
     conn_str = get_polars_db_connection_string()
     try:
         logging.info(f"Executing analytics query: {query[:100]}...")
-        df = pl.read_database_uri(query, conn_str, engine="connectorx")
+        with timed_phase("db"), query_span(query) as current:
+            df = pl.read_database_uri(query, conn_str, engine="connectorx")
+            set_attributes({"db.rows": len(df)}, current)
+        df = apply_column_types(df)
         logging.info(f"Analytics query returned {len(df)} rows.")
         return df
     except Exception as e:
@@ -57,6 +171,36 @@ def execute_analytics_query(query: str) -> Optional[pl.DataFrame]:
         return None
 
 
+def execute_parameterized_query(query: str, params: dict) -> Optional[pl.DataFrame]:
+    """
+    Runs a parameterized query on the connection pool and returns the rows as a Polars DataFrame.
+
+    Args:
+        query: The SQL query with psycopg2 named placeholders.
+        params: The values bound to the placeholders.
+
+    Returns:
+        A Polars DataFrame with the query results, or None on failure.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return None
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            columns = [desc[0] for desc in cur.description]
+            return apply_column_types(
+                pl.DataFrame(cur.fetchall(), schema=columns, orient="row")
+            )
+    except Exception as e:
+        logging.exception(f"Parameterized query failed: {e}")
+        return None
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+
 def export_df_to_csv(df: pl.DataFrame, filename: str = "export.csv") -> Optional[bytes]:
     """
     Exports a Polars DataFrame to a CSV file in memory.
@@ -97,13 +241,24 @@ def prepare_for_comparison(nct_ids: list[str]) -> Optional[pl.DataFrame]:
     Returns:
         A Polars DataFrame with key comparable fields, or None on failure.
     """
+    from app.utils.trial_query import TrialQuery
+
     if not nct_ids:
         return pl.DataFrame()
-    query = f"""    SELECT \n        nct_id, brief_title, overall_status, phase, study_type, enrollment,\n        start_date, completion_date\n    FROM ctgov.studies\n    WHERE nct_id IN ({", ".join([f"'{nid}'" for nid in nct_ids])})    """
-    return execute_analytics_query(query)
+    sql, params = TrialQuery(nct_ids=nct_ids).select(COMPARISON_COLUMNS)
+    return execute_parameterized_query(sql, params)
 
 
 def get_phase_distribution() -> Optional[pl.DataFrame]:
+    studies = scan_study_snapshot()
+    if studies is not None:
+        return (
+            studies.filter(pl.col("phase").is_not_null())
+            .group_by("phase")
+            .agg(pl.len().alias("count"))
+            .sort("phase")
+            .collect()
+        )
     query = """
     SELECT phase, COUNT(*) as count
     FROM ctgov.studies
@@ -115,6 +270,16 @@ def get_phase_distribution() -> Optional[pl.DataFrame]:
 
 
 def get_status_distribution() -> Optional[pl.DataFrame]:
+    studies = scan_study_snapshot()
+    if studies is not None:
+        return (
+            studies.filter(pl.col("overall_status").is_not_null())
+            .group_by(pl.col("overall_status").alias("status"))
+            .agg(pl.len().alias("count"))
+            .sort("count", descending=True)
+            .head(10)
+            .collect()
+        )
     query = """
     SELECT overall_status as status, COUNT(*) as count
     FROM ctgov.studies
@@ -127,6 +292,18 @@ def get_status_distribution() -> Optional[pl.DataFrame]:
 
 
 def get_enrollment_trends() -> Optional[pl.DataFrame]:
+    studies = scan_study_snapshot()
+    if studies is not None:
+        return (
+            studies.filter(pl.col("enrollment").is_not_null() & pl.col("phase").is_not_null())
+            .group_by("phase")
+            .agg(
+                pl.col("enrollment").mean().alias("avg_enrollment"),
+                pl.col("enrollment").median().alias("median_enrollment"),
+            )
+            .sort("phase")
+            .collect()
+        )
     query = """
     SELECT 
         phase, 
@@ -165,6 +342,16 @@ def get_top_sponsors() -> Optional[pl.DataFrame]:
 
 
 def get_timeline_data() -> Optional[pl.DataFrame]:
+    studies = scan_study_snapshot()
+    if studies is not None:
+        return (
+            studies.select(pl.col("start_date").cast(pl.Date).dt.year().alias("year"))
+            .filter(pl.col("year") >= 2000)
+            .group_by("year")
+            .agg(pl.len().alias("count"))
+            .sort("year")
+            .collect()
+        )
     query = """
     SELECT 
         EXTRACT(YEAR FROM start_date) as year, 
@@ -0,0 +1,32 @@
+import os
+import threading
+from contextlib import contextmanager
+from app.utils.db import available_connections
+
+PREFETCH_MAX_CONCURRENT = int(os.environ.get("CLINCHAT_PREFETCH_MAX_CONCURRENT", "2"))
+PREFETCH_MIN_FREE_CONNECTIONS = int(
+    os.environ.get("CLINCHAT_PREFETCH_MIN_FREE_CONNECTIONS", "4")
+)
+_prefetch_slots = threading.BoundedSemaphore(max(PREFETCH_MAX_CONCURRENT, 1))
+
+
+@contextmanager
+def prefetch_slot():
+    """
+    Yields whether a speculative query may run now.
+
+    A prefetch is allowed only while fewer than PREFETCH_MAX_CONCURRENT others
+    are running and the pool still has PREFETCH_MIN_FREE_CONNECTIONS spare
+    connections for foreground queries. It never waits for either.
+    """
+    if (
+        PREFETCH_MAX_CONCURRENT <= 0
+        or available_connections() < PREFETCH_MIN_FREE_CONNECTIONS
+        or not _prefetch_slots.acquire(blocking=False)
+    ):
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        _prefetch_slots.release()
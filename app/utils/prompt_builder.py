@@ -0,0 +1,250 @@
+import os
+import re
+import math
+from typing import Optional, TypedDict
+
+_TOKEN_PATTERN = re.compile("\\w+|[^\\w\\s]")
+_CHARS_PER_TOKEN = 4
+DEFAULT_PROMPT_TOKEN_BUDGET = int(
+    os.environ.get("CLINCHAT_PROMPT_TOKEN_BUDGET", "1800")
+)
+
+
+class PromptSection(TypedDict):
+    title: str
+    items: list[str]
+    priority: int
+    max_tokens: int
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """
+    Approximates the number of model tokens in a piece of text without a network call.
+
+    Words are split on word boundaries and long words are charged one token per
+    four characters, which tracks BPE tokenizers closely enough for budgeting.
+
+    Args:
+        text: The text to measure.
+
+    Returns:
+        The estimated token count.
+    """
+    if not text:
+        return 0
+    total = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        total += max(1, math.ceil(len(match.group(0)) / _CHARS_PER_TOKEN))
+    return total
+
+
+def truncate_to_tokens(text: Optional[str], max_tokens: int) -> str:
+    """
+    Truncates text so that its estimated token count fits within max_tokens.
+
+    Args:
+        text: The text to truncate.
+        max_tokens: The maximum number of tokens to keep.
+
+    Returns:
+        The original text if it fits, otherwise a prefix ending in an ellipsis.
+    """
+    if not text or max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    used = 0
+    end = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        cost = max(1, math.ceil(len(match.group(0)) / _CHARS_PER_TOKEN))
+        if used + cost > max_tokens - 1:
+            break
+        used += cost
+        end = match.end()
+    return text[:end].rstrip() + " …"
+
+
+def fit_sections(sections: list[PromptSection], budget: int) -> str:
+    """
+    Renders prompt sections within a token budget.
+
+    Sections are filled in priority order (lowest first), each limited to its own
+    max_tokens cap (0 means uncapped). A section keeps whole items while they fit
+    and truncates the first item that does not, so the most relevant leading
+    criteria and outcomes always survive trimming.
+
+    Args:
+        sections: The candidate sections with their list items.
+        budget: The number of tokens available for all sections combined.
+
+    Returns:
+        The rendered sections, in their original order.
+    """
+    rendered: dict[int, list[str]] = {}
+    remaining = budget
+    order = sorted(range(len(sections)), key=lambda i: sections[i]["priority"])
+    for index in order:
+        section = sections[index]
+        items = [item.strip() for item in section["items"] if item and item.strip()]
+        header_cost = count_tokens(section["title"]) + 2
+        if not items or remaining <= header_cost:
+            continue
+        remaining -= header_cost
+        allowance = remaining
+        if section["max_tokens"]:
+            allowance = min(allowance, section["max_tokens"])
+        kept = []
+        for item in items:
+            cost = count_tokens(item) + 1
+            if cost <= allowance:
+                kept.append(item)
+                allowance -= cost
+                remaining -= cost
+            else:
+                if allowance > 8:
+                    kept.append(truncate_to_tokens(item, allowance - 1))
+                    remaining -= allowance
+                break
+        omitted = len(items) - len(kept)
+        if omitted > 0:
+            kept.append(f"({omitted} more omitted)")
+        rendered[index] = kept
+    blocks = []
+    for index, section in enumerate(sections):
+        if index in rendered:
+            lines = "\n".join((f"- {item}" for item in rendered[index]))
+            blocks.append(f"{section['title']}:\n{lines}")
+    return "\n\n".join(blocks)
+
+
+def build_trial_summary_prompt(
+    trial: dict,
+    inclusion_criteria: list[str],
+    exclusion_criteria: list[str],
+    budget: int = DEFAULT_PROMPT_TOKEN_BUDGET,
+) -> str:
+    """
+    Builds the AI summary prompt for a trial within a token budget.
+
+    Instead of pasting the raw eligibility text, the prompt uses the parsed
+    inclusion/exclusion items and the primary design outcomes, trimming the
+    lowest-priority material first when the budget is tight.
+
+    Args:
+        trial: The trial detail document.
+        inclusion_criteria: Parsed inclusion criteria items.
+        exclusion_criteria: Parsed exclusion criteria items.
+        budget: The maximum number of prompt tokens.
+
+    Returns:
+        The prompt text.
+    """
+    header = f"Please provide a concise, expert-level summary for the clinical trial with NCT ID {trial.get('nct_id')}.\nThe trial is titled '{trial.get('brief_title')}' and is currently in status '{trial.get('overall_status')}' and phase '{trial.get('phase')}'."
+    instructions = "Based on this information, generate a summary covering the following points in bullet format:\n- **Key Objective**: What is the main goal of this study?\n- **Primary Population**: Who are the main participants (based on inclusion/exclusion criteria)?\n- **Key Endpoints**: What are the primary outcomes being measured?\n- **Potential Significance**: What is the potential impact or significance of this trial in its field?\n\nKeep the language professional and targeted at a clinical research audience."
+    outcomes = trial.get("design_outcomes") or []
+    primary_outcomes = [
+        f"{o.get('measure')} (time frame: {o.get('time_frame')})"
+        for o in outcomes
+        if o.get("outcome_type") == "primary"
+    ]
+    if not inclusion_criteria and (not exclusion_criteria):
+        inclusion_criteria = [trial.get("eligibility_criteria") or ""]
+    fixed_cost = count_tokens(header) + count_tokens(instructions)
+    available = max(budget - fixed_cost, 0)
+    sections = [
+        PromptSection(
+            title="Brief summary",
+            items=[trial.get("brief_summary") or ""],
+            priority=0,
+            max_tokens=int(available * 0.35),
+        ),
+        PromptSection(
+            title="Primary outcomes",
+            items=primary_outcomes,
+            priority=1,
+            max_tokens=int(available * 0.2),
+        ),
+        PromptSection(
+            title="Inclusion criteria",
+            items=inclusion_criteria,
+            priority=2,
+            max_tokens=int(available * 0.3),
+        ),
+        PromptSection(
+            title="Exclusion criteria",
+            items=exclusion_criteria,
+            priority=3,
+            max_tokens=0,
+        ),
+    ]
+    body = fit_sections(sections, available)
+    return f"{header}\n\n{body}\n\n{instructions}"
+
+
+def build_comparison_prompt(
+    trials: list[dict], budget: int = DEFAULT_PROMPT_TOKEN_BUDGET
+) -> str:
+    """
+    Builds the AI comparison prompt for a set of trials within a token budget.
+
+    Args:
+        trials: The comparison rows for the selected trials.
+        budget: The maximum number of prompt tokens.
+
+    Returns:
+        The prompt text.
+    """
+    header = "As a clinical research analyst, provide a comparative analysis of the following clinical trials."
+    instructions = "Your analysis should be a narrative that includes:\n1.  **Key Differences**: Highlight the most significant differences in trial design (e.g., phase, status, enrollment size).\n2.  **Potential Similarities**: Identify any underlying similarities in objectives or scope that might not be immediately obvious.\n3.  **Strategic Insight**: Based on the data, offer a brief strategic insight. For example, which trial appears to be higher risk but higher reward? Which is a later-stage validation?\n\nPresent this as a concise report for a strategy meeting. Use bold headings for each section."
+    rows = [
+        f"NCT ID: {t.get('nct_id')}, Title: {t.get('brief_title')}, Status: {t.get('overall_status')}, Phase: {t.get('phase')}, Enrollment: {t.get('enrollment')}"
+        for t in trials
+    ]
+    fixed_cost = count_tokens(header) + count_tokens(instructions)
+    body = fit_sections(
+        [PromptSection(title="Trials", items=rows, priority=0, max_tokens=0)],
+        max(budget - fixed_cost, 0),
+    )
+    return f"{header}\n\n{body}\n\n{instructions}"
+
+
+def build_trial_chat_prompt(
+    trial: dict,
+    question: str,
+    retrieved_chunks: list[dict],
+    history: list[dict],
+    budget: int = DEFAULT_PROMPT_TOKEN_BUDGET,
+) -> str:
+    """
+    Builds a grounded question-answering prompt from the retrieved trial chunks.
+
+    Args:
+        trial: The trial detail document.
+        question: The user's question.
+        retrieved_chunks: The top-ranked chunks, best first.
+        history: Earlier chat messages with role and content keys.
+        budget: The maximum number of prompt tokens.
+
+    Returns:
+        The prompt text.
+    """
+    header = f"You are a clinical research assistant answering questions about the clinical trial {trial.get('nct_id')} ('{trial.get('brief_title')}'). Answer only from the trial excerpts below. If the excerpts do not contain the answer, say that the trial record does not state it. Cite the section names you relied on."
+    instructions = f"Question: {question}\n\nAnswer concisely in plain language for a clinical research audience."
+    fixed_cost = count_tokens(header) + count_tokens(instructions)
+    available = max(budget - fixed_cost, 0)
+    sections = [
+        PromptSection(
+            title="Trial excerpts",
+            items=[f"[{c['section']}] {c['text']}" for c in retrieved_chunks],
+            priority=0,
+            max_tokens=0,
+        ),
+        PromptSection(
+            title="Earlier conversation",
+            items=[f"{m['role']}: {m['content']}" for m in history[-4:]],
+            priority=1,
+            max_tokens=int(available * 0.25),
+        ),
+    ]
+    body = fit_sections(sections, available)
+    return f"{header}\n\n{body}\n\n{instructions}"
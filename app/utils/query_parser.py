@@ -0,0 +1,380 @@
+import re
+import json
+import logging
+import threading
+from collections import deque
+from typing import Optional
+from app.utils.db import get_db_connection, return_db_connection
+from app.utils.data_sync import on_data_sync
+from app.utils.shared_cache import SharedCache
+
+LOCAL_CONFIDENCE_THRESHOLD = 0.6
+VOCABULARY_CONDITION_LIMIT = 5000
+VOCABULARY_SPONSOR_LIMIT = 2000
+STATUS_SYNONYMS = {
+    "recruiting": "RECRUITING",
+    "currently recruiting": "RECRUITING",
+    "open to enrollment": "RECRUITING",
+    "open for enrollment": "RECRUITING",
+    "enrolling": "RECRUITING",
+    "not yet recruiting": "NOT_YET_RECRUITING",
+    "active not recruiting": "ACTIVE_NOT_RECRUITING",
+    "ongoing": "ACTIVE_NOT_RECRUITING",
+    "enrolling by invitation": "ENROLLING_BY_INVITATION",
+    "completed": "COMPLETED",
+    "finished": "COMPLETED",
+    "terminated": "TERMINATED",
+    "stopped": "TERMINATED",
+    "suspended": "SUSPENDED",
+    "withdrawn": "WITHDRAWN",
+}
+PHASE_SYNONYMS = {
+    "early phase 1": "EARLY_PHASE1",
+    "early phase i": "EARLY_PHASE1",
+    "phase 0": "EARLY_PHASE1",
+    "phase 1": "PHASE1",
+    "phase i": "PHASE1",
+    "phase 1/2": "PHASE1/PHASE2",
+    "phase 1/phase 2": "PHASE1/PHASE2",
+    "phase i/ii": "PHASE1/PHASE2",
+    "phase 2": "PHASE2",
+    "phase ii": "PHASE2",
+    "phase 2/3": "PHASE2/PHASE3",
+    "phase 2/phase 3": "PHASE2/PHASE3",
+    "phase ii/iii": "PHASE2/PHASE3",
+    "phase 3": "PHASE3",
+    "phase iii": "PHASE3",
+    "phase 4": "PHASE4",
+    "phase iv": "PHASE4",
+    "post-marketing": "PHASE4",
+    "n/a": "NA",
+}
+_FILLER_WORDS = frozenset(
+    (
+        "a all an and any are as at by show find me list trials trial studies "
+        "study clinical for from in of on the that with which where sponsor "
+        "sponsored since after before between started starting phase"
+    ).split()
+)
+_WORD_PATTERN = re.compile("[a-z0-9][a-z0-9'/.-]*")
+_PARTICIPANTS = "\\s+(?:participants|patients|subjects|people)"
+_PATTERN_FIELDS = (
+    ("\\b(?:since|after|from)\\s+(\\d{4})\\b", "start_date_from", "{}-01-01"),
+    ("\\bbefore\\s+(\\d{4})\\b", "start_date_to", "{}-12-31"),
+    (
+        "\\b(?:at least|more than|over)\\s*(\\d+)" + _PARTICIPANTS,
+        "min_enrollment",
+        "{}",
+    ),
+    (
+        "\\b(?:at most|fewer than|less than|under)\\s*(\\d+)" + _PARTICIPANTS,
+        "max_enrollment",
+        "{}",
+    ),
+)
+
+
+def empty_structured_query() -> dict[str, str]:
+    return {
+        "condition": "",
+        "intervention": "",
+        "sponsor": "",
+        "status": "",
+        "phase": "",
+        "min_enrollment": "",
+        "max_enrollment": "",
+        "start_date_from": "",
+        "start_date_to": "",
+    }
+
+
+def normalize_query(query: str) -> str:
+    """Normalizes query text for dictionary matching and cache keys."""
+    text = query.lower().replace("’", "'")
+    text = re.sub("[^a-z0-9'/.\\s-]", " ", text)
+    return re.sub("\\s+", " ", text).strip()
+
+
+def _is_word_boundary(char: str) -> bool:
+    return not (char.isalnum() or char == "-")
+
+
+class AhoCorasick:
+    """
+    A multi-pattern string matcher.
+
+    All patterns are compiled into a single trie with failure links, so a query
+    is scanned once regardless of how many vocabulary terms are loaded.
+    """
+
+    def __init__(self):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[list[tuple[int, str, str]]] = [[]]
+
+    def add(self, pattern: str, field: str, value: str):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append((len(pattern), field, value))
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[
+                    self._fail[child]
+                ]
+
+    def find_all(self, text: str) -> list[tuple[int, int, str, str]]:
+        """
+        Returns (start, end, field, value) for every whole-word match in text.
+
+        A hyphen does not end a word, so "open-label" or "active-controlled"
+        never match a shorter pattern.
+        """
+        matches = []
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, field, value in self._output[node]:
+                start = index - length + 1
+                end = index + 1
+                if (start == 0 or _is_word_boundary(text[start - 1])) and (
+                    end == len(text) or _is_word_boundary(text[end])
+                ):
+                    matches.append((start, end, field, value))
+        return matches
+
+
+_automaton: Optional[AhoCorasick] = None
+_automaton_lock = threading.Lock()
+_llm_translation_cache = SharedCache("llm_translation")
+
+
+def _load_vocabulary() -> dict[str, dict[str, str]]:
+    """Loads status, phase, condition and sponsor vocabularies from the database."""
+    vocabulary = {
+        "status": dict(STATUS_SYNONYMS),
+        "phase": dict(PHASE_SYNONYMS),
+        "condition": {},
+        "sponsor": {},
+    }
+    conn = None
+    try:
+        conn = get_db_connection()
+        if conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT DISTINCT overall_status FROM ctgov.studies WHERE overall_status IS NOT NULL"
+                )
+                for (status,) in cur.fetchall():
+                    vocabulary["status"].setdefault(
+                        status.lower().replace("_", " "), status
+                    )
+                cur.execute(
+                    "SELECT name FROM ctgov.conditions GROUP BY name ORDER BY COUNT(*) DESC LIMIT %s",
+                    (VOCABULARY_CONDITION_LIMIT,),
+                )
+                for (name,) in cur.fetchall():
+                    key = normalize_query(name)
+                    if len(key) > 2:
+                        vocabulary["condition"].setdefault(key, name)
+                cur.execute(
+                    "SELECT name FROM ctgov.sponsors WHERE lead_or_collaborator = 'lead' GROUP BY name ORDER BY COUNT(*) DESC LIMIT %s",
+                    (VOCABULARY_SPONSOR_LIMIT,),
+                )
+                for (name,) in cur.fetchall():
+                    key = normalize_query(name)
+                    if len(key) > 2:
+                        vocabulary["sponsor"].setdefault(key, name)
+    except Exception as e:
+        logging.exception(f"Failed to load query vocabulary: {e}")
+    finally:
+        if conn:
+            return_db_connection(conn)
+    return vocabulary
+
+
+def get_query_automaton() -> AhoCorasick:
+    """Returns the vocabulary automaton, building it on first use."""
+    global _automaton
+    with _automaton_lock:
+        if _automaton is None:
+            vocabulary = _load_vocabulary()
+            automaton = AhoCorasick()
+            for field, terms in vocabulary.items():
+                for term, value in terms.items():
+                    automaton.add(term, field, value)
+            automaton.build()
+            if not vocabulary["condition"]:
+                return automaton
+            _automaton = automaton
+        return _automaton
+
+
+@on_data_sync
+def refresh_query_vocabulary():
+    """Discards the vocabulary automaton so the next parse reloads it."""
+    global _automaton
+    with _automaton_lock:
+        _automaton = None
+
+
+def parse_query_locally(query: str) -> tuple[dict[str, str], float]:
+    """
+    Parses a natural language query with dictionary lookups and date/size patterns.
+
+    Args:
+        query: The raw natural language query.
+
+    Returns:
+        The structured query and a confidence in [0, 1] measuring how much of the
+        query's meaningful wording was recognized. Words only captured by the
+        condition/sponsor fallback patterns count towards it only once the
+        dictionary and date/size matches alone reach LOCAL_CONFIDENCE_THRESHOLD,
+        so a guess never keeps a query away from the LLM tier.
+    """
+    text = normalize_query(query)
+    terms = empty_structured_query()
+    covered = [False] * len(text)
+    guessed = [False] * len(text)
+    matches = get_query_automaton().find_all(text)
+    matches.sort(key=lambda m: (-(m[1] - m[0]), m[0]))
+    for start, end, field, value in matches:
+        if any(covered[start:end]) or terms[field]:
+            continue
+        terms[field] = value
+        covered[start:end] = [True] * (end - start)
+    for pattern, key, template in _PATTERN_FIELDS:
+        match = re.search(pattern, text)
+        if match:
+            terms[key] = template.format(match.group(1))
+            covered[match.start() : match.end()] = [True] * (
+                match.end() - match.start()
+            )
+    between = re.search("\\bbetween\\s+(\\d{4})\\s+and\\s+(\\d{4})\\b", text)
+    if between:
+        terms["start_date_from"] = f"{between.group(1)}-01-01"
+        terms["start_date_to"] = f"{between.group(2)}-12-31"
+        covered[between.start() : between.end()] = [True] * (
+            between.end() - between.start()
+        )
+    if not terms["condition"]:
+        condition_match = re.search(
+            "\\b(?:on|for|of)\\s+([a-z0-9'\\s-]+?)(?=\\s+(?:since|with|by|in|after|before|between|sponsored)\\b|$)",
+            text,
+        )
+        if condition_match and condition_match.group(1).strip() not in _FILLER_WORDS:
+            terms["condition"] = condition_match.group(1).strip()
+            guessed[condition_match.start(1) : condition_match.end(1)] = [True] * (
+                condition_match.end(1) - condition_match.start(1)
+            )
+    if not terms["sponsor"]:
+        sponsor_match = re.search(
+            "\\b(?:sponsored by|by)\\s+([a-z\\s.&-]+?)(?=\\s+as sponsor|\\s+since|\\s+after|$)",
+            text,
+        )
+        if sponsor_match and not any(
+            covered[sponsor_match.start(1) : sponsor_match.end(1)]
+            + guessed[sponsor_match.start(1) : sponsor_match.end(1)]
+        ):
+            terms["sponsor"] = sponsor_match.group(1).strip()
+            guessed[sponsor_match.start(1) : sponsor_match.end(1)] = [True] * (
+                sponsor_match.end(1) - sponsor_match.start(1)
+            )
+    meaningful = [
+        m
+        for m in _WORD_PATTERN.finditer(text)
+        if m.group(0) not in _FILLER_WORDS and (not m.group(0).isdigit())
+    ]
+    if not meaningful:
+        return (terms, 1.0 if any(terms.values()) else 0.0)
+    recognized = sum((1 for m in meaningful if all(covered[m.start() : m.end()])))
+    if recognized / len(meaningful) >= LOCAL_CONFIDENCE_THRESHOLD:
+        covered = [c or g for c, g in zip(covered, guessed)]
+        recognized = sum((1 for m in meaningful if all(covered[m.start() : m.end()])))
+    return (terms, recognized / len(meaningful))
+
+
+def translate_query_with_llm(query: str) -> Optional[dict[str, str]]:
+    """
+    Translates a natural language query into structured filters using the AI model.
+
+    Translations are cached by normalized query text, so repeating a question never
+    calls the model again.
+
+    Args:
+        query: The raw natural language query.
+
+    Returns:
+        The structured query, or None if the model reply could not be parsed.
+    """
+    from app.utils.ai_helper import ai_client
+
+    key = normalize_query(query)
+    cached = _llm_translation_cache.get(key)
+    if cached is not None:
+        return dict(cached)
+    fields = ", ".join(empty_structured_query().keys())
+    prompt = f"Translate the following clinical trial search request into a JSON object with exactly these string keys: {fields}. Use an empty string for anything not mentioned. status must be one of {sorted(set(STATUS_SYNONYMS.values()))}; phase must be one of {sorted(set(PHASE_SYNONYMS.values()))}; dates use YYYY-MM-DD; enrollment values are integers written as strings. Reply with the JSON object only.\n\nRequest: {query}"
+    reply = ai_client.generate_content(prompt, feature="query_translation")
+    match = re.search("\\{.*\\}", reply, flags=re.DOTALL)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        logging.warning(f"Unparseable query translation for '{query}': {reply[:200]}")
+        return None
+    terms = empty_structured_query()
+    for field in terms:
+        value = data.get(field)
+        if value is not None:
+            terms[field] = str(value).strip()
+    if terms["status"] not in set(STATUS_SYNONYMS.values()):
+        terms["status"] = ""
+    if terms["phase"] not in set(PHASE_SYNONYMS.values()):
+        terms["phase"] = ""
+    for field in ("min_enrollment", "max_enrollment"):
+        if not terms[field].isdigit():
+            terms[field] = ""
+    _llm_translation_cache.set(key, dict(terms))
+    return terms
+
+
+def parse_natural_query(
+    query: str, use_llm: bool = True
+) -> tuple[dict[str, str], str]:
+    """
+    Parses a natural language query with the local tier, escalating to the LLM tier
+    when the local parse is not confident.
+    The LLM translation is then used as-is, since the low-confidence local
+    parse may hold misreadings the LLM rightly left out.
+
+    Returns:
+        The structured query and the tier that produced it ("local" or "llm").
+    """
+    terms, confidence = parse_query_locally(query)
+    if confidence >= LOCAL_CONFIDENCE_THRESHOLD or not use_llm:
+        return (terms, "local")
+    translated = translate_query_with_llm(query)
+    if translated is None:
+        return (terms, "local")
+    return (translated, "llm")
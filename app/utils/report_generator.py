@@ -16,6 +16,7 @@ import openpyxl
 from openpyxl.styles import Font, Alignment, PatternFill
 from openpyxl.utils import get_column_letter
 from typing import Any
+from app.utils.tracing import traced
 
 PRIMARY_COLOR = "#3b82f6"
 PRIMARY_COLOR_LIGHT = "#dbeafe"
@@ -118,13 +119,17 @@ def _get_styles():
     }
 
 
+@traced("report.build", {"report.kind": "trial_detail_pdf"})
 def generate_trial_detail_pdf_from_state(
     state: "app.states.trial_detail_state.TrialDetailState",
 ) -> bytes | None:
     """Generates a PDF for a single trial from the TrialDetailState."""
-    trial = state.trial
+    trial = state._trial
     if not trial:
         return None
+    view = state._view
+    inclusion_criteria = view["inclusion_criteria"]
+    exclusion_criteria = view["exclusion_criteria"]
     buffer = BytesIO()
     doc = SimpleDocTemplate(
         buffer,
@@ -161,7 +166,7 @@ def generate_trial_detail_pdf_from_state(
         ],
         [
             Paragraph("<b>Complexity</b>", styles["Body"]),
-            f"{state.complexity_rating} ({state.complexity_score} pts)",
+            f"{view['complexity_rating']} ({view['complexity_score']} pts)",
         ],
     ]
     summary_table = Table(summary_data, colWidths=[1.5 * inch, 5.5 * inch])
@@ -180,20 +185,21 @@ def generate_trial_detail_pdf_from_state(
         story.append(Paragraph("Brief Summary", styles["Heading1"]))
         story.append(Paragraph(trial["brief_summary"], styles["Body"]))
         story.append(Spacer(1, 0.1 * inch))
-    if state.inclusion_criteria:
+    if inclusion_criteria:
         story.append(Paragraph("Inclusion Criteria", styles["Heading1"]))
-        for item in state.inclusion_criteria:
+        for item in inclusion_criteria:
             story.append(Paragraph(f"• {item}", styles["Bullet"]))
         story.append(Spacer(1, 0.1 * inch))
-    if state.exclusion_criteria:
+    if exclusion_criteria:
         story.append(Paragraph("Exclusion Criteria", styles["Heading1"]))
-        for item in state.exclusion_criteria:
+        for item in exclusion_criteria:
             story.append(Paragraph(f"• {item}", styles["Bullet"]))
         story.append(Spacer(1, 0.1 * inch))
     doc.build(story, onFirstPage=_add_header_footer, onLaterPages=_add_header_footer)
     return buffer.getvalue()
 
 
+@traced("report.build", {"report.kind": "comparison_pdf"})
 def generate_comparison_pdf_from_state(
     state: "app.states.comparison_state.ComparisonState",
 ) -> bytes | None:
@@ -244,6 +250,7 @@ def generate_comparison_pdf_from_state(
     return buffer.getvalue()
 
 
+@traced("report.build", {"report.kind": "saved_trials_excel"})
 def generate_excel_report_from_state(
     state: "app.states.saved_trials_state.SavedTrialsState",
 ) -> bytes | None:
@@ -0,0 +1,466 @@
+import os
+import json
+import glob
+import math
+import time
+import shutil
+import logging
+import threading
+from collections import Counter
+from typing import Mapping, Optional, TypedDict
+import numpy as np
+import polars as pl
+from app.utils.polars_db import load_data_in_bulk
+from app.utils.data_sync import get_data_version, on_data_sync
+from app.utils.text_index import TEXT_SEARCH_TERM, query_terms, term_counts
+from app.utils.similarity_index import SimilarTrial, similar_trial_cards
+from app.utils.shared_cache import broadcast_invalidation, on_invalidation, shared_lock
+from app.utils.tracing import traced
+
+SEMANTIC_INDEX_ENABLED = os.environ.get("CLINCHAT_SEMANTIC_INDEX", "1") == "1"
+SEMANTIC_INDEX_DIR = os.environ.get("CLINCHAT_SEMANTIC_DIR", "semantic_index")
+VECTORS_FILE = "vectors.npy"
+MODEL_FILE = "model.npz"
+POINTER_FILE = "CURRENT"
+SEMANTIC_QUERY = """
+SELECT
+    s.nct_id,
+    CONCAT_WS(' ', s.brief_title, s.official_title) AS title,
+    bs.description AS summary,
+    o.outcomes
+FROM ctgov.studies s
+LEFT JOIN ctgov.brief_summaries bs ON bs.nct_id = s.nct_id
+LEFT JOIN (
+    SELECT nct_id, STRING_AGG(measure, ' ') AS outcomes
+    FROM ctgov.design_outcomes
+    GROUP BY nct_id
+) o ON o.nct_id = s.nct_id
+"""
+FIELD_WEIGHTS = {"title": 2, "summary": 1, "outcomes": 1}
+EMBEDDING_DIM = 128
+SVD_OVERSAMPLE = 10
+SVD_POWER_ITERATIONS = 2
+MIN_DOCUMENT_FREQUENCY = 3
+MAX_DOCUMENT_FRACTION = 0.5
+MAX_VOCABULARY = 100_000
+MAX_SEMANTIC_HITS = 5000
+IVF_PROBES = int(os.environ.get("CLINCHAT_SEMANTIC_IVF_PROBES", "32"))
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50_000
+SEMANTIC_BUILD_LOCK_SECONDS = 3600
+SEMANTIC_INDEX_TOPIC = "semantic_index"
+_SPMM_CHUNK = 250_000
+_SEED = 20240612
+
+
+class SemanticIndexPointer(TypedDict):
+    directory: str
+    data_version: str
+
+
+class SparseMatrix:
+    """A COO matrix kept sorted both by row and by column for X @ A and X.T @ A."""
+
+    def __init__(
+        self, rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, shape: tuple
+    ):
+        self.shape = shape
+        self.rows, self.cols, self.vals = rows, cols, vals
+        by_col = np.argsort(cols, kind="stable")
+        self.t_rows, self.t_cols = cols[by_col], rows[by_col]
+        self.t_vals = vals[by_col]
+
+    @staticmethod
+    def _dot(rows, cols, vals, dense: np.ndarray, num_rows: int) -> np.ndarray:
+        out = np.zeros((num_rows, dense.shape[1]), dtype=np.float32)
+        for start in range(0, len(rows), _SPMM_CHUNK):
+            r = rows[start : start + _SPMM_CHUNK]
+            contrib = dense[cols[start : start + _SPMM_CHUNK]]
+            contrib *= vals[start : start + _SPMM_CHUNK, None]
+            runs = np.flatnonzero(np.r_[True, r[1:] != r[:-1]])
+            out[r[runs]] += np.add.reduceat(contrib, runs, axis=0)
+        return out
+
+    def dot(self, dense: np.ndarray) -> np.ndarray:
+        return self._dot(self.rows, self.cols, self.vals, dense, self.shape[0])
+
+    def t_dot(self, dense: np.ndarray) -> np.ndarray:
+        return self._dot(self.t_rows, self.t_cols, self.t_vals, dense, self.shape[1])
+
+
+def randomized_svd(matrix: SparseMatrix, rank: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes a rank-k truncated SVD with the Halko et al. randomized range finder.
+
+    Returns:
+        The document factors U * S (rows x rank) and the term components
+        V (columns x rank), so that a document's vector is its row times V.
+    """
+    rng = np.random.default_rng(_SEED)
+    width = min(rank + SVD_OVERSAMPLE, *matrix.shape)
+    omega = rng.standard_normal((matrix.shape[1], width)).astype(np.float32)
+    q, _ = np.linalg.qr(matrix.dot(omega))
+    for _ in range(SVD_POWER_ITERATIONS):
+        z, _ = np.linalg.qr(matrix.t_dot(q))
+        q, _ = np.linalg.qr(matrix.dot(z))
+    b = matrix.t_dot(q).T
+    u_b, s, vt = np.linalg.svd(b, full_matrices=False)
+    rank = min(rank, len(s))
+    return q @ (u_b[:, :rank] * s[:rank]), vt[:rank].T.astype(np.float32)
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.concatenate(
+        [
+            np.argmax(vectors[start : start + _SPMM_CHUNK] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), _SPMM_CHUNK)
+        ]
+    )
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int) -> np.ndarray:
+    """Clusters unit vectors by cosine similarity, fitting on a sample of rows."""
+    rng = np.random.default_rng(_SEED)
+    sample_size = min(KMEANS_SAMPLE, len(vectors))
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        labels = _nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        filled = np.bincount(labels, minlength=k) > 0
+        centroids[filled] = _normalize_rows(sums[filled])
+    return centroids
+
+
+class SemanticIndex:
+    """
+    Dense trial embeddings for "more like this" and free-text semantic search.
+
+    Vectors are the TF-IDF rows of each trial's title, summary and outcome
+    measures projected onto their top EMBEDDING_DIM singular vectors (latent
+    semantic analysis), unit-normalized so a dot product is the cosine
+    similarity. Trials are grouped into about sqrt(N) inverted lists by
+    spherical k-means and the memory-mapped vector matrix is stored list by
+    list, so a query scores the centroids, then only the rows of its
+    IVF_PROBES nearest lists, a few percent of the corpus.
+    """
+
+    def __init__(
+        self,
+        nct_ids: list[str],
+        vectors: np.ndarray,
+        terms: list[str],
+        idf: np.ndarray,
+        components: np.ndarray,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        data_version: str,
+    ):
+        self.nct_ids = nct_ids
+        self.rows = {nct_id: i for i, nct_id in enumerate(nct_ids)}
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.idf = idf
+        self.components = components
+        self.data_version = data_version
+
+    def __len__(self) -> int:
+        return len(self.nct_ids)
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """Projects free text into the embedding space, or None if no word is known."""
+        tokens = Counter(query_terms(text))
+        weights = {
+            self.term_ids[t]: 1 + math.log(tf)
+            for t, tf in tokens.items()
+            if t in self.term_ids
+        }
+        if not weights:
+            return None
+        ids = np.fromiter(weights, dtype=np.int64)
+        tfidf = np.fromiter(weights.values(), dtype=np.float32) * self.idf[ids]
+        vector = tfidf @ self.components[ids]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def nearest(
+        self, vector: np.ndarray, limit: int, exclude: Optional[int] = None
+    ) -> list[tuple[str, float]]:
+        """Returns the trials with the highest cosine similarity to vector among the probed lists."""
+        vector = vector.astype(np.float32)
+        probes = min(IVF_PROBES, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ vector), probes - 1)[:probes]
+        spans = [
+            (self.list_offsets[i], self.list_offsets[i + 1])
+            for i in np.sort(lists)
+            if self.list_offsets[i + 1] > self.list_offsets[i]
+        ]
+        if not spans:
+            return []
+        rows = np.concatenate([np.arange(start, end) for start, end in spans])
+        scores = np.concatenate(
+            [self.vectors[start:end] @ vector for start, end in spans]
+        )
+        if exclude is not None:
+            scores[rows == exclude] = -np.inf
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            (self.nct_ids[rows[i]], round(float(scores[i]), 3))
+            for i in top
+            if scores[i] > 0
+        ]
+
+    def more_like_this(self, nct_id: str, limit: int = 5) -> list[tuple[str, float]]:
+        row = self.rows.get(nct_id)
+        if row is None or not self.vectors[row].any():
+            return []
+        return self.nearest(np.asarray(self.vectors[row]), limit, exclude=row)
+
+    def search(
+        self, text: str, limit: int = MAX_SEMANTIC_HITS
+    ) -> list[tuple[str, float]]:
+        vector = self.embed(text)
+        return self.nearest(vector, limit) if vector is not None else []
+
+
+_semantic_index: Optional[SemanticIndex] = None
+_semantic_index_lock = threading.Lock()
+
+
+def _tfidf(
+    counts: pl.DataFrame, num_docs: int
+) -> tuple[SparseMatrix, list[str], np.ndarray]:
+    """Builds the row-normalized sublinear TF-IDF matrix over the kept vocabulary."""
+    frequencies = counts.group_by("term").agg(pl.len().alias("df"))
+    vocabulary = (
+        frequencies.filter(
+            (pl.col("df") >= MIN_DOCUMENT_FREQUENCY)
+            & (pl.col("df") <= MAX_DOCUMENT_FRACTION * num_docs)
+        )
+        .sort("df", descending=True)
+        .head(MAX_VOCABULARY)
+        .sort("term")
+        .with_row_index("col")
+    )
+    entries = counts.join(vocabulary, on="term").sort("doc", "col")
+    idf = (
+        np.log((1 + num_docs) / (1 + vocabulary["df"].to_numpy())) + 1
+    ).astype(np.float32)
+    rows = entries["doc"].to_numpy().astype(np.int64)
+    cols = entries["col"].to_numpy().astype(np.int64)
+    vals = (1 + np.log(entries["tf"].to_numpy().astype(np.float32))) * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights=vals**2, minlength=num_docs))
+    vals = (vals / norms[rows]).astype(np.float32)
+    matrix = SparseMatrix(rows, cols, vals, (num_docs, len(vocabulary)))
+    return matrix, vocabulary["term"].to_list(), idf
+
+
+def _read_pointer() -> Optional[SemanticIndexPointer]:
+    try:
+        with open(os.path.join(SEMANTIC_INDEX_DIR, POINTER_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.exception(f"Failed to read the semantic index pointer: {e}")
+        return None
+
+
+def _remove_stale_builds(keep: set[str]):
+    # The previous build is kept for a worker that read the old pointer but
+    # has not opened its files yet; workers that still map an older vector
+    # file keep reading it after it is unlinked.
+    for path in glob.glob(os.path.join(SEMANTIC_INDEX_DIR, "build-*")):
+        if os.path.basename(path) not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def build_semantic_index(data_version: str) -> bool:
+    """
+    Embeds every trial and writes the vector matrix and model to SEMANTIC_INDEX_DIR.
+
+    Both files go into a directory named for this build, and replacing the
+    pointer file then switches readers to the new vectors and model in one
+    step, so a reader never pairs one build's vectors with another's model.
+    """
+    started = time.perf_counter()
+    docs = load_data_in_bulk(SEMANTIC_QUERY)
+    if docs is None or docs.is_empty():
+        return False
+    counts = term_counts(docs.with_row_index("doc"), FIELD_WEIGHTS)
+    matrix, terms, idf = _tfidf(counts, len(docs))
+    doc_factors, components = randomized_svd(matrix, EMBEDDING_DIM)
+    doc_vectors = _normalize_rows(doc_factors)
+    del doc_factors
+    centroids = spherical_kmeans(
+        doc_vectors, max(1, int(math.sqrt(len(doc_vectors))))
+    )
+    labels = _nearest_centroids(doc_vectors, centroids)
+    order = np.argsort(labels, kind="stable")
+    list_offsets = np.searchsorted(labels[order], np.arange(len(centroids) + 1))
+    name = f"build-{time.time_ns()}"
+    build_dir = os.path.join(SEMANTIC_INDEX_DIR, name)
+    os.makedirs(build_dir)
+    vectors = np.lib.format.open_memmap(
+        os.path.join(build_dir, VECTORS_FILE),
+        mode="w+",
+        dtype=np.float32,
+        shape=doc_vectors.shape,
+    )
+    vectors[:] = doc_vectors[order]
+    vectors.flush()
+    del vectors
+    with open(os.path.join(build_dir, MODEL_FILE), "wb") as f:
+        np.savez(
+            f,
+            nct_ids=np.array(docs["nct_id"].to_list())[order],
+            terms=np.array(terms),
+            idf=idf,
+            components=components,
+            centroids=centroids,
+            list_offsets=list_offsets,
+            data_version=np.array(data_version),
+        )
+    previous = _read_pointer()
+    pointer_path = os.path.join(SEMANTIC_INDEX_DIR, POINTER_FILE)
+    with open(pointer_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(SemanticIndexPointer(directory=name, data_version=data_version), f)
+    os.replace(pointer_path + ".tmp", pointer_path)
+    _remove_stale_builds({name, previous["directory"] if previous else name})
+    logging.info(
+        f"Built semantic index over {len(docs)} trials and {len(terms)} terms in {time.perf_counter() - started:.1f}s"
+    )
+    return True
+
+
+def load_semantic_index() -> Optional[SemanticIndex]:
+    """Memory-maps the build the pointer file names, or returns None if there is none."""
+    pointer = _read_pointer()
+    if pointer is None:
+        return None
+    build_dir = os.path.join(SEMANTIC_INDEX_DIR, pointer["directory"])
+    vectors_path = os.path.join(build_dir, VECTORS_FILE)
+    model_path = os.path.join(build_dir, MODEL_FILE)
+    if not (os.path.exists(vectors_path) and os.path.exists(model_path)):
+        logging.warning(f"Semantic index build {pointer['directory']} is missing; ignoring it.")
+        return None
+    with np.load(model_path, allow_pickle=False) as model:
+        index = SemanticIndex(
+            model["nct_ids"].tolist(),
+            np.load(vectors_path, mmap_mode="r"),
+            model["terms"].tolist(),
+            model["idf"],
+            model["components"],
+            model["centroids"],
+            model["list_offsets"],
+            str(model["data_version"]),
+        )
+    if len(index.vectors) != len(index):
+        logging.warning("Semantic index files are out of step; ignoring them.")
+        return None
+    return index
+
+
+def get_semantic_index() -> Optional[SemanticIndex]:
+    """Returns the current semantic index, or None while it is disabled or building."""
+    return _semantic_index
+
+
+@on_data_sync
+def refresh_semantic_index():
+    """
+    Loads the saved semantic index, rebuilding it first if AACT changed since it was built.
+
+    The saved index is served while a rebuild runs, so restarts do not pay for
+    re-embedding the corpus. Backend workers share the saved index: one worker
+    rebuilds it and the others load the result when it tells them it is done.
+    """
+    global _semantic_index
+    if not SEMANTIC_INDEX_ENABLED:
+        return
+    if not _semantic_index_lock.acquire(blocking=False):
+        logging.info("Semantic index refresh already in progress.")
+        return
+    try:
+        if _semantic_index is None:
+            _semantic_index = load_semantic_index()
+        version = get_data_version()
+        if version is None:
+            return
+        if _semantic_index is not None and _semantic_index.data_version == version:
+            return
+        saved = load_semantic_index()
+        if saved is not None and saved.data_version == version:
+            _semantic_index = saved
+            return
+        with shared_lock("semantic_index", SEMANTIC_BUILD_LOCK_SECONDS) as acquired:
+            if not acquired:
+                logging.info("Another worker is rebuilding the semantic index.")
+                return
+            if build_semantic_index(version):
+                _semantic_index = load_semantic_index()
+                broadcast_invalidation(SEMANTIC_INDEX_TOPIC, version)
+    finally:
+        _semantic_index_lock.release()
+
+
+@on_invalidation(SEMANTIC_INDEX_TOPIC)
+def reload_semantic_index(version: str):
+    """Loads the index another worker just rebuilt."""
+    refresh_semantic_index()
+
+
+@traced("semantic.more_like_this")
+def more_like_this(nct_id: str, limit: int = 5) -> Optional[list[SimilarTrial]]:
+    """
+    Finds the trials whose design and objectives read most like nct_id's.
+
+    Returns:
+        The trials with their cosine similarity, or None while the index is building.
+    """
+    index = get_semantic_index()
+    if index is None:
+        return None
+    return similar_trial_cards(index.more_like_this(nct_id, limit))
+
+
+def semantic_search_for_terms(
+    terms: Mapping[str, Optional[str]],
+) -> Optional[dict[str, float]]:
+    """
+    Ranks trials by semantic similarity to the text search term.
+
+    Returns:
+        None when no text is set, otherwise the cosine similarity of the best
+        matches, best first, which are empty if the index is still building.
+    """
+    text = (terms.get(TEXT_SEARCH_TERM) or "").strip()
+    if not text:
+        return None
+    index = get_semantic_index()
+    if index is None:
+        return {}
+    return dict(index.search(text))
+
+
+def semantic_search_problem(terms: Mapping[str, Optional[str]]) -> Optional[str]:
+    """Explains why a semantic search cannot run, or returns None if it can."""
+    text = (terms.get(TEXT_SEARCH_TERM) or "").strip()
+    if not text:
+        return None
+    index = get_semantic_index()
+    if index is None:
+        return "Semantic search is still loading. Please try again shortly."
+    if index.embed(text) is None:
+        return "None of those words appear in the trial corpus. Try different wording."
+    return None
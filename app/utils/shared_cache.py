@@ -0,0 +1,185 @@
+import os
+import json
+import uuid
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+REDIS_URL = os.environ.get("REDIS_URL") or os.environ.get("REFLEX_REDIS_URL")
+INVALIDATION_CHANNEL = "clinchat:invalidate"
+INVALIDATION_RETRY_SECONDS = 5
+WORKER_ID = uuid.uuid4().hex
+_redis = None
+_redis_lock = threading.Lock()
+_invalidation_handlers: dict[str, list[Callable[[str], None]]] = {}
+
+
+def get_redis():
+    """Returns the process-wide Redis client, or None when REDIS_URL is not set."""
+    global _redis
+    if not REDIS_URL:
+        return None
+    if _redis is None:
+        with _redis_lock:
+            if _redis is None:
+                import redis
+
+                _redis = redis.Redis.from_url(REDIS_URL)
+    return _redis
+
+
+class SharedCache:
+    """
+    A cache of JSON values shared by every backend worker.
+
+    With REDIS_URL set, entries live in Redis under clinchat:<namespace>: and
+    expire after ttl_seconds, so a value cached by one worker is a hit in all
+    of them. Without it an in-process LRU stands in, which is all a single
+    worker, or a test, needs. Redis errors are logged and treated as misses.
+    """
+
+    def __init__(
+        self, namespace: str, maxsize: int = 1024, ttl_seconds: Optional[int] = None
+    ):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._local: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, key: str) -> str:
+        return f"clinchat:{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[Any]:
+        client = get_redis()
+        if client is None:
+            with self._lock:
+                if key not in self._local:
+                    return None
+                self._local.move_to_end(key)
+                return self._local[key]
+        try:
+            raw = client.get(self._key(key))
+        except Exception as e:
+            logging.exception(f"Shared cache {self.namespace} read failed: {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any):
+        client = get_redis()
+        if client is None:
+            with self._lock:
+                self._local[key] = value
+                self._local.move_to_end(key)
+                while len(self._local) > self.maxsize:
+                    self._local.popitem(last=False)
+            return
+        try:
+            client.set(self._key(key), json.dumps(value), ex=self.ttl_seconds)
+        except Exception as e:
+            logging.exception(f"Shared cache {self.namespace} write failed: {e}")
+
+    def clear(self):
+        client = get_redis()
+        if client is None:
+            with self._lock:
+                self._local.clear()
+            return
+        try:
+            keys = list(client.scan_iter(match=self._key("*"), count=1000))
+            if keys:
+                client.delete(*keys)
+        except Exception as e:
+            logging.exception(f"Shared cache {self.namespace} clear failed: {e}")
+
+
+@contextmanager
+def shared_lock(name: str, timeout_seconds: int) -> Iterator[bool]:
+    """
+    Tries to take a lock held across every backend worker, without waiting.
+
+    Yields:
+        Whether this worker holds the lock. Without Redis there is only one
+        worker, so the lock is always granted.
+    """
+    client = get_redis()
+    if client is None:
+        yield True
+        return
+    lock = client.lock(f"clinchat:lock:{name}", timeout=timeout_seconds)
+    try:
+        acquired = lock.acquire(blocking=False)
+    except Exception as e:
+        logging.exception(f"Failed to take shared lock {name}: {e}")
+        acquired = False
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            try:
+                lock.release()
+            except Exception as e:
+                logging.exception(f"Failed to release shared lock {name}: {e}")
+
+
+def on_invalidation(topic: str):
+    """
+    Registers a callback to run when another worker broadcasts an invalidation.
+
+    Handlers receive the broadcast payload and run in a worker thread, so they
+    may block on database loads.
+    """
+
+    def register(handler: Callable[[str], None]):
+        handlers = _invalidation_handlers.setdefault(topic, [])
+        if handler not in handlers:
+            handlers.append(handler)
+        return handler
+
+    return register
+
+
+def broadcast_invalidation(topic: str, payload: str = ""):
+    """Tells every other backend worker to run its handlers for topic."""
+    client = get_redis()
+    if client is None:
+        return
+    message = {"worker": WORKER_ID, "topic": topic, "payload": payload}
+    try:
+        client.publish(INVALIDATION_CHANNEL, json.dumps(message))
+    except Exception as e:
+        logging.exception(f"Failed to broadcast {topic} invalidation: {e}")
+
+
+def _run_handlers(topic: str, payload: str):
+    for handler in list(_invalidation_handlers.get(topic, [])):
+        try:
+            handler(payload)
+        except Exception as e:
+            logging.exception(f"Invalidation handler {handler.__name__} failed: {e}")
+
+
+async def invalidation_listener():
+    """Lifespan task that runs invalidation handlers for broadcasts from other workers."""
+    if not REDIS_URL:
+        return
+    from redis.asyncio import Redis
+
+    while True:
+        try:
+            client = Redis.from_url(REDIS_URL)
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    if data["worker"] == WORKER_ID:
+                        continue
+                    await asyncio.to_thread(_run_handlers, data["topic"], data["payload"])
+        except Exception as e:
+            logging.exception(f"Invalidation listener failed: {e}")
+        await asyncio.sleep(INVALIDATION_RETRY_SECONDS)
@@ -0,0 +1,388 @@
+import os
+import time
+import logging
+import threading
+from typing import Optional, TypedDict
+import numpy as np
+import polars as pl
+from app.utils.db import get_db_connection, return_db_connection
+from app.utils.polars_db import load_data_in_bulk
+from app.utils.data_sync import on_data_sync
+from app.utils.filter_index import get_filter_index
+from app.utils.tracing import traced
+
+SIMILARITY_INDEX_ENABLED = os.environ.get("CLINCHAT_SIMILARITY_INDEX", "1") == "1"
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+MAX_BUCKET_CANDIDATES = 500
+FULL_REBUILD_FRACTION = 0.2
+_HASH_PRIME = np.uint64(4294967311)
+_EMPTY_SIGNATURE = np.iinfo(np.uint32).max
+FEATURE_QUERIES = {
+    "c": "SELECT nct_id, LOWER(name) AS feature FROM ctgov.conditions WHERE name IS NOT NULL",
+    "m": "SELECT nct_id, LOWER(mesh_term) AS feature FROM ctgov.browse_conditions WHERE mesh_term IS NOT NULL",
+    "i": "SELECT nct_id, LOWER(name) AS feature FROM ctgov.interventions WHERE name IS NOT NULL",
+}
+CARD_QUERY = "SELECT nct_id, brief_title, overall_status, phase, enrollment FROM ctgov.studies WHERE nct_id = ANY(%s)"
+
+_rng = np.random.default_rng(20240611)
+_HASH_A = _rng.integers(1, int(_HASH_PRIME), NUM_PERMUTATIONS, dtype=np.uint64)
+_HASH_B = _rng.integers(0, int(_HASH_PRIME), NUM_PERMUTATIONS, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 1 << 61, LSH_ROWS, dtype=np.uint64)
+
+
+class SimilarTrial(TypedDict):
+    nct_id: str
+    brief_title: str
+    overall_status: str
+    phase: Optional[str]
+    enrollment: Optional[int]
+    similarity: float
+
+
+def minhash_signatures(
+    trial_rows: np.ndarray, feature_ids: np.ndarray, num_trials: int
+) -> np.ndarray:
+    """
+    Computes MinHash signatures from (trial, feature) pairs.
+
+    Args:
+        trial_rows: The trial row of each pair.
+        feature_ids: The integer feature id of each pair.
+        num_trials: The number of signature rows to return.
+
+    Returns:
+        A (num_trials, NUM_PERMUTATIONS) uint32 matrix. Trials without features
+        get a signature of all max values, which never shares an LSH bucket.
+    """
+    signatures = np.full((num_trials, NUM_PERMUTATIONS), _EMPTY_SIGNATURE, np.uint32)
+    if not len(trial_rows):
+        return signatures
+    order = np.argsort(trial_rows, kind="stable")
+    trial_rows, x = trial_rows[order], feature_ids[order].astype(np.uint64)
+    starts = np.flatnonzero(np.r_[True, trial_rows[1:] != trial_rows[:-1]])
+    owners = trial_rows[starts]
+    for p in range(NUM_PERMUTATIONS):
+        hashed = ((_HASH_A[p] * x + _HASH_B[p]) % _HASH_PRIME).astype(np.uint32)
+        signatures[owners, p] = np.minimum.reduceat(hashed, starts)
+    return signatures
+
+
+def _signatures_for(trial_features: list[np.ndarray]) -> np.ndarray:
+    lengths = np.fromiter((len(f) for f in trial_features), np.int64)
+    trial_rows = np.repeat(np.arange(len(trial_features)), lengths)
+    feature_ids = (
+        np.concatenate(trial_features) if trial_features else np.empty(0, np.int32)
+    )
+    return minhash_signatures(trial_rows, feature_ids, len(trial_features))
+
+
+def _band_keys(signatures: np.ndarray, band: int) -> np.ndarray:
+    rows = signatures[:, band * LSH_ROWS : (band + 1) * LSH_ROWS].astype(np.uint64)
+    return (rows * _BAND_MIX).sum(axis=1, dtype=np.uint64) ^ np.uint64(band)
+
+
+class SimilarityIndex:
+    """
+    MinHash/LSH index of trials by their condition, MeSH and intervention sets.
+
+    Each trial's feature set is reduced to a NUM_PERMUTATIONS-value MinHash
+    signature, split into LSH_BANDS bands. Trials sharing every value in any
+    band land in the same bucket, so candidates for a trial come from
+    LSH_BANDS binary searches. Candidates are ranked by the exact Jaccard
+    similarity of their feature sets, regardless of phase or study type.
+    """
+
+    def __init__(
+        self,
+        nct_ids: list[str],
+        trial_features: list[np.ndarray],
+        vocabulary: dict[str, int],
+        updated_at,
+        signatures: Optional[np.ndarray] = None,
+    ):
+        self.nct_ids = nct_ids
+        self.rows = {nct_id: i for i, nct_id in enumerate(nct_ids)}
+        self.trial_features = trial_features
+        self.vocabulary = vocabulary
+        self.updated_at = updated_at
+        if signatures is None:
+            signatures = _signatures_for(trial_features)
+        self.signatures = signatures
+        self._build_bands()
+
+    def _build_bands(self):
+        self.band_keys = []
+        self.band_rows = []
+        for band in range(LSH_BANDS):
+            keys = _band_keys(self.signatures, band)
+            order = np.argsort(keys, kind="stable")
+            self.band_keys.append(keys[order])
+            self.band_rows.append(order.astype(np.int32))
+
+    def update(self, changed: dict[str, list[str]], updated_at) -> "SimilarityIndex":
+        """
+        Returns a new index with the feature sets of the changed trials replaced.
+
+        Only the changed trials are re-signed; the LSH tables are rebuilt from
+        the existing signatures.
+
+        Args:
+            changed: The complete feature list of each added or updated trial.
+            updated_at: The AACT update time the changes were read at.
+        """
+        nct_ids = list(self.nct_ids)
+        trial_features = list(self.trial_features)
+        vocabulary = dict(self.vocabulary)
+        changed_rows = []
+        for nct_id, features in changed.items():
+            ids = np.unique(
+                np.array(
+                    [vocabulary.setdefault(f, len(vocabulary)) for f in features],
+                    dtype=np.int32,
+                )
+            )
+            if nct_id in self.rows:
+                row = self.rows[nct_id]
+                trial_features[row] = ids
+            else:
+                row = len(nct_ids)
+                nct_ids.append(nct_id)
+                trial_features.append(ids)
+            changed_rows.append(row)
+        signatures = np.full(
+            (len(nct_ids), NUM_PERMUTATIONS), _EMPTY_SIGNATURE, np.uint32
+        )
+        signatures[: len(self.signatures)] = self.signatures
+        if changed_rows:
+            signatures[changed_rows] = _signatures_for(
+                [trial_features[row] for row in changed_rows]
+            )
+        return SimilarityIndex(
+            nct_ids, trial_features, vocabulary, updated_at, signatures
+        )
+
+    def similar(self, nct_id: str, limit: int = 5) -> list[tuple[str, float]]:
+        """
+        Returns the most similar trials with their Jaccard similarity.
+
+        Args:
+            nct_id: The trial to match.
+            limit: The maximum number of results.
+
+        Returns:
+            (nct_id, similarity) pairs, most similar first.
+        """
+        row = self.rows.get(nct_id)
+        if row is None or not len(self.trial_features[row]):
+            return []
+        signature = self.signatures[row : row + 1]
+        candidates = set()
+        for band in range(LSH_BANDS):
+            key = _band_keys(signature, band)[0]
+            keys = self.band_keys[band]
+            start = np.searchsorted(keys, key, "left")
+            end = min(
+                np.searchsorted(keys, key, "right"), start + MAX_BUCKET_CANDIDATES
+            )
+            candidates.update(self.band_rows[band][start:end].tolist())
+        candidates.discard(row)
+        features = self.trial_features[row]
+        scored = []
+        for candidate in candidates:
+            other = self.trial_features[candidate]
+            shared = len(np.intersect1d(features, other, assume_unique=True))
+            scored.append(
+                (shared / (len(features) + len(other) - shared), self.nct_ids[candidate])
+            )
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return [(nct, round(score, 3)) for score, nct in scored[:limit]]
+
+    def memory_usage(self) -> int:
+        return int(
+            self.signatures.nbytes
+            + sum(k.nbytes + r.nbytes for k, r in zip(self.band_keys, self.band_rows))
+            + sum(f.nbytes for f in self.trial_features)
+        )
+
+
+_similarity_index: Optional[SimilarityIndex] = None
+_similarity_index_lock = threading.Lock()
+
+
+def _load_features() -> Optional[pl.DataFrame]:
+    frames = []
+    for prefix, query in FEATURE_QUERIES.items():
+        frame = load_data_in_bulk(query)
+        if frame is None:
+            return None
+        frames.append(
+            frame.select(
+                pl.col("nct_id"),
+                (pl.lit(f"{prefix}:") + pl.col("feature")).alias("feature"),
+            )
+        )
+    return pl.concat(frames).unique()
+
+
+def _latest_update():
+    conn = None
+    try:
+        conn = get_db_connection()
+        if conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT MAX(updated_at) FROM ctgov.studies")
+                return cur.fetchone()[0]
+    finally:
+        if conn:
+            return_db_connection(conn)
+    return None
+
+
+def build_similarity_index() -> Optional[SimilarityIndex]:
+    """Loads every trial's condition, MeSH and intervention sets and builds a new index."""
+    started = time.perf_counter()
+    updated_at = _latest_update()
+    features = _load_features()
+    if features is None or features.is_empty():
+        return None
+    vocabulary_frame = features.select("feature").unique().with_row_index("feature_id")
+    grouped = (
+        features.join(vocabulary_frame, on="feature")
+        .group_by("nct_id")
+        .agg(pl.col("feature_id").sort())
+    )
+    index = SimilarityIndex(
+        grouped["nct_id"].to_list(),
+        [np.asarray(ids, dtype=np.int32) for ids in grouped["feature_id"].to_list()],
+        dict(
+            zip(
+                vocabulary_frame["feature"].to_list(),
+                vocabulary_frame["feature_id"].to_list(),
+            )
+        ),
+        updated_at,
+    )
+    logging.info(
+        f"Built similarity index over {len(index.nct_ids)} trials ({index.memory_usage() / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s"
+    )
+    return index
+
+
+def _changed_features(index: SimilarityIndex) -> Optional[dict[str, list[str]]]:
+    """Loads the feature sets of trials updated since the index was built, or None if too many changed."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return None
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT nct_id FROM ctgov.studies WHERE updated_at > %s",
+                (index.updated_at,),
+            )
+            nct_ids = [row[0] for row in cur.fetchall()]
+            if len(nct_ids) > FULL_REBUILD_FRACTION * len(index.nct_ids):
+                return None
+            changed = {nct_id: [] for nct_id in nct_ids}
+            for prefix, query in FEATURE_QUERIES.items():
+                cur.execute(f"{query} AND nct_id = ANY(%s)", (nct_ids,))
+                for nct_id, feature in cur.fetchall():
+                    changed[nct_id].append(f"{prefix}:{feature}")
+            return changed
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+
+@on_data_sync
+def refresh_similarity_index():
+    """
+    Brings the similarity index up to date with AACT.
+
+    Trials updated since the last build are re-signed and the LSH tables
+    rebuilt from the existing signatures. A full rebuild runs on first load
+    or when more than FULL_REBUILD_FRACTION of the trials changed.
+    """
+    global _similarity_index
+    if not SIMILARITY_INDEX_ENABLED:
+        return
+    if not _similarity_index_lock.acquire(blocking=False):
+        logging.info("Similarity index refresh already in progress.")
+        return
+    try:
+        current = _similarity_index
+        if current is not None and current.updated_at is not None:
+            updated_at = _latest_update()
+            changed = _changed_features(current)
+            if changed is not None:
+                _similarity_index = current.update(changed, updated_at)
+                logging.info(
+                    f"Updated similarity index with {len(changed)} changed trials."
+                )
+                return
+        index = build_similarity_index()
+        if index is not None:
+            _similarity_index = index
+    finally:
+        _similarity_index_lock.release()
+
+
+def get_similarity_index() -> Optional[SimilarityIndex]:
+    """Returns the current similarity index, or None while it is disabled or building."""
+    return _similarity_index
+
+
+def _trial_cards(nct_ids: list[str]) -> dict[str, dict]:
+    filter_index = get_filter_index()
+    if filter_index is not None:
+        rows = [filter_index.ordinals[n] for n in nct_ids if n in filter_index.ordinals]
+        cards = filter_index.cards[rows].to_dicts() if rows else []
+        return {card["nct_id"]: card for card in cards}
+    conn = None
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return {}
+        with conn.cursor() as cur:
+            cur.execute(CARD_QUERY, (nct_ids,))
+            columns = [desc[0] for desc in cur.description]
+            return {row[0]: dict(zip(columns, row)) for row in cur.fetchall()}
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+
+def similar_trial_cards(matches: list[tuple[str, float]]) -> list[SimilarTrial]:
+    """Attaches the card fields to (nct_id, similarity) matches, keeping their order."""
+    if not matches:
+        return []
+    cards = _trial_cards([n for n, _ in matches])
+    return [
+        {
+            "nct_id": n,
+            "brief_title": cards[n].get("brief_title"),
+            "overall_status": cards[n].get("overall_status"),
+            "phase": cards[n].get("phase"),
+            "enrollment": cards[n].get("enrollment"),
+            "similarity": score,
+        }
+        for n, score in matches
+        if n in cards
+    ]
+
+
+@traced("similarity.find_similar_trials")
+def find_similar_trials(nct_id: str, limit: int = 5) -> Optional[list[SimilarTrial]]:
+    """
+    Looks up the trials most similar to nct_id in the similarity index.
+
+    Returns:
+        The similar trials with their Jaccard similarity, or None while the
+        index is building.
+    """
+    index = get_similarity_index()
+    if index is None:
+        return None
+    return similar_trial_cards(index.similar(nct_id, limit))
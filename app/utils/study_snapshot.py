@@ -0,0 +1,169 @@
+import os
+import json
+import glob
+import time
+import logging
+import threading
+from typing import Optional, TypedDict
+import polars as pl
+from app.utils.data_sync import get_data_version, on_data_sync
+from app.utils.shared_cache import broadcast_invalidation, on_invalidation, shared_lock
+
+SNAPSHOT_DIR = os.environ.get("CLINCHAT_SNAPSHOT_DIR", "snapshots")
+POINTER_FILE = "CURRENT"
+SNAPSHOT_LOCK_SECONDS = 900
+SNAPSHOT_TOPIC = "study_snapshot"
+SNAPSHOT_QUERY = """
+SELECT
+    s.nct_id, s.brief_title, s.overall_status, s.phase, s.enrollment, s.start_date,
+    s.completion_date, s.study_type,
+    COALESCE(f.location_count, 0) AS location_count,
+    COALESCE(i.intervention_count, 0) AS intervention_count,
+    fm.mesh_term AS primary_therapeutic_area
+FROM ctgov.studies s
+LEFT JOIN (
+    SELECT nct_id, COUNT(*) AS location_count FROM ctgov.facilities GROUP BY nct_id
+) f ON f.nct_id = s.nct_id
+LEFT JOIN (
+    SELECT nct_id, COUNT(*) AS intervention_count FROM ctgov.interventions GROUP BY nct_id
+) i ON i.nct_id = s.nct_id
+LEFT JOIN (
+    SELECT DISTINCT ON (nct_id) nct_id, mesh_term
+    FROM ctgov.browse_conditions
+    ORDER BY nct_id, id
+) fm ON fm.nct_id = s.nct_id
+"""
+
+
+class SnapshotPointer(TypedDict):
+    file: str
+    data_version: str
+
+
+_snapshot: Optional[pl.DataFrame] = None
+_snapshot_pointer: Optional[SnapshotPointer] = None
+_snapshot_lock = threading.Lock()
+
+
+def _read_pointer() -> Optional[SnapshotPointer]:
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, POINTER_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.exception(f"Failed to read the study snapshot pointer: {e}")
+        return None
+
+
+def _remove_stale_snapshots(keep: set[str]):
+    # Workers that still map an unlinked snapshot keep reading it until they
+    # swap; the previous file is kept too, for a worker that read the old
+    # pointer but has not opened its file yet.
+    for path in glob.glob(os.path.join(SNAPSHOT_DIR, "studies-*.arrow")):
+        if os.path.basename(path) not in keep:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.warning(f"Could not remove stale study snapshot {path}: {e}")
+
+
+def write_study_snapshot(data_version: str) -> bool:
+    """
+    Loads the core study columns in bulk and publishes them as a new snapshot.
+
+    The frame is written uncompressed, so its buffers can be memory-mapped
+    as they are, to a file named for this build. Replacing the pointer file
+    then switches every reader to it in one step.
+    """
+    from app.utils.polars_db import load_data_in_bulk
+
+    started = time.perf_counter()
+    studies = load_data_in_bulk(SNAPSHOT_QUERY)
+    if studies is None or studies.is_empty():
+        return False
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    name = f"studies-{time.time_ns()}.arrow"
+    path = os.path.join(SNAPSHOT_DIR, name)
+    studies.write_ipc(path + ".tmp", compression="uncompressed")
+    os.replace(path + ".tmp", path)
+    previous = _read_pointer()
+    pointer_path = os.path.join(SNAPSHOT_DIR, POINTER_FILE)
+    with open(pointer_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(SnapshotPointer(file=name, data_version=data_version), f)
+    os.replace(pointer_path + ".tmp", pointer_path)
+    _remove_stale_snapshots({name, previous["file"] if previous else name})
+    logging.info(
+        f"Wrote study snapshot {name} with {len(studies)} studies, {os.path.getsize(path) / 1048576:.1f} MiB, in {time.perf_counter() - started:.1f}s"
+    )
+    return True
+
+
+def _swap_in_snapshot() -> bool:
+    """Maps the snapshot the pointer names, if it is not the one already mapped."""
+    global _snapshot, _snapshot_pointer
+    pointer = _read_pointer()
+    if pointer is None or pointer == _snapshot_pointer:
+        return False
+    try:
+        snapshot = pl.read_ipc(
+            os.path.join(SNAPSHOT_DIR, pointer["file"]), memory_map=True
+        )
+    except Exception as e:
+        logging.exception(f"Failed to map study snapshot {pointer['file']}: {e}")
+        return False
+    _snapshot, _snapshot_pointer = snapshot, pointer
+    return True
+
+
+def get_study_snapshot() -> Optional[pl.DataFrame]:
+    """
+    Returns the memory-mapped core study columns, or None before the first snapshot.
+
+    Every worker maps the same read-only file, so the pages are shared through
+    the OS page cache instead of each worker holding its own copy.
+    """
+    return _snapshot
+
+
+def scan_study_snapshot() -> Optional[pl.LazyFrame]:
+    """Returns a lazy scan over the snapshot for analytics, or None before the first one."""
+    snapshot = _snapshot
+    return snapshot.lazy() if snapshot is not None else None
+
+
+@on_data_sync
+def refresh_study_snapshot():
+    """
+    Maps the current study snapshot, writing a new one first if AACT changed.
+
+    One worker writes each snapshot; the others map it once it is published.
+    Queries already running on the previous snapshot finish on it.
+    """
+    if not _snapshot_lock.acquire(blocking=False):
+        logging.info("Study snapshot refresh already in progress.")
+        return
+    try:
+        _swap_in_snapshot()
+        version = get_data_version()
+        if version is None or (
+            _snapshot_pointer is not None and _snapshot_pointer["data_version"] == version
+        ):
+            return
+        with shared_lock("study_snapshot", SNAPSHOT_LOCK_SECONDS) as acquired:
+            if not acquired:
+                logging.info("Another worker is writing the study snapshot.")
+                return
+            if write_study_snapshot(version) and _swap_in_snapshot():
+                broadcast_invalidation(SNAPSHOT_TOPIC, version)
+    except OSError as e:
+        logging.exception(f"Failed to write study snapshot: {e}")
+    finally:
+        _snapshot_lock.release()
+
+
+@on_invalidation(SNAPSHOT_TOPIC)
+def reload_study_snapshot(version: str):
+    """Maps the snapshot another worker just published."""
+    with _snapshot_lock:
+        _swap_in_snapshot()
@@ -0,0 +1,440 @@
+import os
+import re
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Mapping, Optional
+import numpy as np
+import polars as pl
+from app.models.trial import SnippetPart
+from app.utils.db import get_db_connection, return_db_connection
+from app.utils.polars_db import load_data_in_bulk
+from app.utils.data_sync import on_data_sync
+
+TEXT_INDEX_ENABLED = os.environ.get("CLINCHAT_TEXT_INDEX", "1") == "1"
+TEXT_SEARCH_TERM = "text"
+TEXT_QUERY = """
+SELECT
+    s.nct_id,
+    CONCAT_WS(' ', s.brief_title, s.official_title) AS title,
+    CONCAT_WS(' ', bs.description, dd.description) AS body
+FROM ctgov.studies s
+LEFT JOIN ctgov.brief_summaries bs ON bs.nct_id = s.nct_id
+LEFT JOIN ctgov.detailed_descriptions dd ON dd.nct_id = s.nct_id
+"""
+SNIPPET_QUERY = """
+SELECT s.nct_id, bs.description, dd.description
+FROM ctgov.studies s
+LEFT JOIN ctgov.brief_summaries bs ON bs.nct_id = s.nct_id
+LEFT JOIN ctgov.detailed_descriptions dd ON dd.nct_id = s.nct_id
+WHERE s.nct_id = ANY(%s)
+"""
+TOKEN_PATTERN = "[a-z0-9]+"
+TITLE_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_TEXT_HITS = 5000
+SNIPPET_TOKENS = 30
+_SEARCH_CACHE_SIZE = 256
+STOPWORDS = frozenset(
+    "a an and are as at be been but by for from has have if in into is it its "
+    "not of on or such that the their then there these they this to was were "
+    "which will with who whom than also may can".split()
+)
+_TOKEN_RE = re.compile(TOKEN_PATTERN)
+_VOWEL_RE = re.compile("[aeiouy]")
+
+
+@lru_cache(maxsize=65536)
+def stem(token: str) -> str:
+    """
+    Reduces a lowercase token to its stem with a light Porter-style suffix stripper.
+
+    Plurals, -ed/-ing forms and a trailing e are removed, so "diseases",
+    "diseased" and "disease" share a stem. Numbers and short tokens are kept.
+    """
+    word = token
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("ies"):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and _VOWEL_RE.search(word[: -len(suffix)]):
+            word = word[: -len(suffix)]
+            if word.endswith(("at", "bl", "iz")):
+                word += "e"
+            elif len(word) > 2 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            break
+    if word.endswith("e") and len(word) > 4:
+        word = word[:-1]
+    return word
+
+
+def query_terms(text: str) -> list[str]:
+    """Tokenizes and stems a search query, dropping stopwords and duplicates."""
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        term = stem(token)
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def encode_varints(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes unsigned integers as LEB128 varints.
+
+    Returns:
+        The encoded bytes and the byte offset at which each value starts.
+    """
+    values = values.astype(np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    for bits in (7, 14, 21, 28):
+        sizes += values >= (1 << bits)
+    starts = np.cumsum(sizes) - sizes
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+    for k in range(5):
+        rows = np.flatnonzero(sizes > k)
+        chunk = (values[rows] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (sizes[rows] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[rows] + k] = (chunk | more).astype(np.uint8)
+    return out, starts
+
+
+def decode_varints(data: np.ndarray) -> np.ndarray:
+    """Decodes a run of LEB128 varints produced by encode_varints."""
+    if not len(data):
+        return np.empty(0, dtype=np.int64)
+    ends = (data & 0x80) == 0
+    value_ids = np.cumsum(ends) - ends
+    starts = np.flatnonzero(np.r_[True, ends[:-1]])
+    shifts = 7 * (np.arange(len(data)) - starts[value_ids])
+    parts = (data & 0x7F).astype(np.int64) << shifts
+    return np.bincount(value_ids, weights=parts).astype(np.int64)
+
+
+class TextIndex:
+    """
+    BM25 inverted index over trial titles, summaries and detailed descriptions.
+
+    Each stemmed term maps to a posting list of (trial, term frequency) pairs.
+    Trial ordinals are delta-encoded as varints and the frequencies stored as
+    one byte each, which keeps the full AACT corpus to a few hundred MB. A
+    query decodes only the posting lists of its own terms and accumulates BM25
+    scores into a dense array, so its cost grows with the number of matching
+    trials rather than the corpus size. Title words count TITLE_WEIGHT times.
+    """
+
+    def __init__(
+        self,
+        nct_ids: list[str],
+        terms: list[str],
+        term_offsets: np.ndarray,
+        byte_offsets: np.ndarray,
+        postings: np.ndarray,
+        frequencies: np.ndarray,
+        doc_lengths: np.ndarray,
+    ):
+        self.nct_ids = nct_ids
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.term_offsets = term_offsets
+        self.byte_offsets = byte_offsets
+        self.postings = postings
+        self.frequencies = frequencies
+        average = float(doc_lengths.mean()) if len(doc_lengths) else 1.0
+        self.length_norms = (
+            BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(average, 1.0))
+        ).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.nct_ids)
+
+    def _postings(self, term_id: int) -> tuple[np.ndarray, np.ndarray]:
+        start, end = self.byte_offsets[term_id], self.byte_offsets[term_id + 1]
+        docs = np.cumsum(decode_varints(self.postings[start:end]))
+        start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+        return docs, self.frequencies[start:end].astype(np.float32)
+
+    def search(self, query: str, limit: int = MAX_TEXT_HITS) -> dict[str, float]:
+        """
+        Ranks trials against a free-text query with BM25.
+
+        Args:
+            query: The search text; any matching term makes a trial a hit.
+            limit: The maximum number of hits to return.
+
+        Returns:
+            The BM25 score of each hit, best first.
+        """
+        term_ids = [
+            self.term_ids[t] for t in query_terms(query) if t in self.term_ids
+        ]
+        if not term_ids:
+            return {}
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term_id in term_ids:
+            docs, tf = self._postings(term_id)
+            df = len(docs)
+            idf = math.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + self.length_norms[docs])
+        hits = np.flatnonzero(scores)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return {self.nct_ids[i]: round(float(scores[i]), 3) for i in hits}
+
+    def memory_usage(self) -> int:
+        return int(
+            self.term_offsets.nbytes
+            + self.byte_offsets.nbytes
+            + self.postings.nbytes
+            + self.frequencies.nbytes
+            + self.length_norms.nbytes
+        )
+
+
+_text_index: Optional[TextIndex] = None
+_text_index_lock = threading.Lock()
+_search_cache: OrderedDict[str, dict[str, float]] = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+
+def _token_counts(docs: pl.DataFrame, column: str, weight: int) -> pl.DataFrame:
+    return (
+        docs.select(
+            pl.col("doc"),
+            pl.col(column)
+            .fill_null("")
+            .str.to_lowercase()
+            .str.extract_all(TOKEN_PATTERN)
+            .alias("token"),
+        )
+        .explode("token")
+        .drop_nulls("token")
+        .group_by("doc", "token")
+        .agg((pl.len() * weight).alias("tf"))
+    )
+
+
+def term_counts(docs: pl.DataFrame, weights: dict[str, int]) -> pl.DataFrame:
+    """
+    Counts the stemmed terms of each document.
+
+    Tokenizing and counting run in Polars; only the distinct vocabulary is
+    stemmed in Python.
+
+    Args:
+        docs: A frame with a "doc" ordinal column and the text columns.
+        weights: How many times a token counts in each text column.
+
+    Returns:
+        A frame of (term, doc, tf) rows sorted by term, then doc.
+    """
+    counts = pl.concat(
+        [_token_counts(docs, column, weight) for column, weight in weights.items()]
+    )
+    vocabulary = counts.select("token").unique()
+    vocabulary = vocabulary.with_columns(
+        pl.Series(
+            "term",
+            [
+                None if token in STOPWORDS else stem(token)
+                for token in vocabulary["token"].to_list()
+            ],
+            dtype=pl.Utf8,
+        )
+    ).drop_nulls("term")
+    return (
+        counts.join(vocabulary, on="token")
+        .group_by("term", "doc")
+        .agg(pl.col("tf").sum())
+        .sort("term", "doc")
+    )
+
+
+def build_text_index() -> Optional[TextIndex]:
+    """Loads every trial's text in bulk and builds a new BM25 index."""
+    started = time.perf_counter()
+    docs = load_data_in_bulk(TEXT_QUERY)
+    if docs is None or docs.is_empty():
+        return None
+    postings = term_counts(
+        docs.with_row_index("doc"), {"title": TITLE_WEIGHT, "body": 1}
+    )
+    doc_lengths = np.zeros(len(docs), dtype=np.float32)
+    lengths = postings.group_by("doc").agg(pl.col("tf").sum())
+    doc_lengths[lengths["doc"].to_numpy()] = lengths["tf"].to_numpy()
+    terms, term_starts = np.unique(postings["term"].to_numpy(), return_index=True)
+    term_offsets = np.r_[term_starts, len(postings)].astype(np.int64)
+    doc_ids = postings["doc"].to_numpy().astype(np.int64)
+    deltas = np.diff(doc_ids, prepend=0)
+    deltas[term_starts] = doc_ids[term_starts]
+    encoded, value_starts = encode_varints(deltas)
+    byte_offsets = np.r_[value_starts[term_starts], len(encoded)].astype(np.int64)
+    index = TextIndex(
+        docs["nct_id"].to_list(),
+        terms.tolist(),
+        term_offsets,
+        byte_offsets,
+        encoded,
+        np.minimum(postings["tf"].to_numpy(), 255).astype(np.uint8),
+        doc_lengths,
+    )
+    logging.info(
+        f"Built text index over {len(index)} trials and {len(terms)} terms ({index.memory_usage() / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s"
+    )
+    return index
+
+
+def get_text_index() -> Optional[TextIndex]:
+    """Returns the current text index, or None while it is disabled or building."""
+    return _text_index
+
+
+@on_data_sync
+def refresh_text_index():
+    """Rebuilds the text index and swaps it in once the new one is complete."""
+    global _text_index
+    if not TEXT_INDEX_ENABLED:
+        return
+    if not _text_index_lock.acquire(blocking=False):
+        logging.info("Text index refresh already in progress.")
+        return
+    try:
+        index = build_text_index()
+        if index is not None:
+            _text_index = index
+            with _search_cache_lock:
+                _search_cache.clear()
+    finally:
+        _text_index_lock.release()
+
+
+def text_search(query: str) -> Optional[dict[str, float]]:
+    """
+    Ranks trials against a free-text query, caching recent queries.
+
+    Returns:
+        BM25 scores of up to MAX_TEXT_HITS trials, best first, or None while
+        the index is building.
+    """
+    index = get_text_index()
+    if index is None:
+        return None
+    key = " ".join(query_terms(query))
+    with _search_cache_lock:
+        if key in _search_cache:
+            _search_cache.move_to_end(key)
+            return _search_cache[key]
+    result = index.search(query)
+    with _search_cache_lock:
+        _search_cache[key] = result
+        while len(_search_cache) > _SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+    return result
+
+
+def text_search_for_terms(
+    terms: Mapping[str, Optional[str]],
+) -> Optional[dict[str, float]]:
+    """
+    Applies the text search term.
+
+    Returns:
+        None when no text is set, otherwise the ranked hits, which are empty
+        if the index is still building.
+    """
+    query = (terms.get(TEXT_SEARCH_TERM) or "").strip()
+    if not query:
+        return None
+    hits = text_search(query)
+    return hits if hits is not None else {}
+
+
+def text_search_problem(terms: Mapping[str, Optional[str]]) -> Optional[str]:
+    """Explains why a text search cannot run, or returns None if it can."""
+    query = (terms.get(TEXT_SEARCH_TERM) or "").strip()
+    if not query:
+        return None
+    if get_text_index() is None:
+        return "Full-text search is still loading. Please try again shortly."
+    if not query_terms(query):
+        return "Add a more specific word to search trial text."
+    return None
+
+
+def highlight_snippet(text: str, terms: list[str]) -> list[SnippetPart]:
+    """
+    Picks the SNIPPET_TOKENS-word window of text with the most distinct query
+    terms and splits it into plain and highlighted parts.
+    """
+    tokens = list(_TOKEN_RE.finditer(text.lower()))
+    if not tokens:
+        return []
+    wanted = set(terms)
+    stems = [stem(t.group(0)) for t in tokens]
+    hits = [i for i, s in enumerate(stems) if s in wanted]
+    if not hits:
+        return []
+    best, best_count = hits[0], 0
+    for first in hits:
+        count = len({stems[i] for i in hits if first <= i < first + SNIPPET_TOKENS})
+        if count > best_count:
+            best, best_count = first, count
+    start = max(best - SNIPPET_TOKENS // 4, 0)
+    end = min(start + SNIPPET_TOKENS, len(tokens))
+    parts: list[SnippetPart] = []
+    cursor = tokens[start].start()
+    if start > 0:
+        parts.append({"text": "…", "match": False})
+    for i in range(start, end):
+        if stems[i] not in wanted:
+            continue
+        span = tokens[i].span()
+        if span[0] > cursor:
+            parts.append({"text": text[cursor : span[0]], "match": False})
+        parts.append({"text": text[span[0] : span[1]], "match": True})
+        cursor = span[1]
+    if tokens[end - 1].end() > cursor:
+        parts.append({"text": text[cursor : tokens[end - 1].end()], "match": False})
+    if end < len(tokens):
+        parts.append({"text": "…", "match": False})
+    return parts
+
+
+def text_snippets(nct_ids: list[str], query: str) -> dict[str, list[SnippetPart]]:
+    """Builds a highlighted summary snippet for each trial in one database round trip."""
+    terms = query_terms(query)
+    if not nct_ids or not terms:
+        return {}
+    conn = None
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return {}
+        with conn.cursor() as cur:
+            cur.execute(SNIPPET_QUERY, (nct_ids,))
+            snippets = {}
+            for nct_id, summary, description in cur.fetchall():
+                for text in (summary, description):
+                    parts = highlight_snippet(text or "", terms)
+                    if parts:
+                        snippets[nct_id] = parts
+                        break
+            return snippets
+    except Exception as e:
+        logging.exception(f"Failed to build text snippets: {e}")
+        return {}
+    finally:
+        if conn:
+            return_db_connection(conn)
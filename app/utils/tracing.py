@@ -0,0 +1,320 @@
+import os
+import re
+import json
+import time
+import queue
+import secrets
+import logging
+import threading
+import functools
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Optional, TypedDict
+from app.utils.shared_cache import WORKER_ID
+
+TRACE_FILE = os.environ.get("CLINCHAT_TRACE_FILE")
+TRACE_ENDPOINT = os.environ.get("CLINCHAT_TRACE_ENDPOINT")
+TRACING_ENABLED = bool(TRACE_FILE or TRACE_ENDPOINT)
+SERVICE_NAME = os.environ.get("CLINCHAT_SERVICE_NAME", "clinchat")
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL_SECONDS = 2.0
+MAX_QUEUED_SPANS = 20000
+CHAINED_EVENT_TTL_SECONDS = 60
+MAX_PENDING_CHAINED_EVENTS = 10000
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SQL_WHITESPACE = re.compile(r"\s+")
+
+
+class Span(TypedDict):
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    kind: int
+    start_ns: int
+    end_ns: int
+    attributes: dict[str, Any]
+    error: Optional[str]
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar(
+    "clinchat_current_span", default=None
+)
+_export_queue: queue.Queue = queue.Queue(maxsize=MAX_QUEUED_SPANS)
+_exporter: Optional[threading.Thread] = None
+_exporter_lock = threading.Lock()
+_dropped_spans = 0
+_chained_parents: dict[tuple[str, str], deque] = {}
+_chained_lock = threading.Lock()
+
+
+def start_span(
+    name: str,
+    attributes: Optional[dict[str, Any]] = None,
+    kind: int = SPAN_KIND_INTERNAL,
+    parent: Optional[Span] = None,
+    root: bool = False,
+) -> Optional[Span]:
+    """
+    Starts a span under parent, or under the current span unless root is set.
+
+    Returns None when tracing is disabled, and every other function here
+    accepts None in place of a span, so call sites need no checks.
+    """
+    if not TRACING_ENABLED:
+        return None
+    if parent is None and not root:
+        parent = _current_span.get()
+    return Span(
+        trace_id=parent["trace_id"] if parent else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_id=parent["span_id"] if parent else None,
+        name=name,
+        kind=kind,
+        start_ns=time.time_ns(),
+        end_ns=0,
+        attributes=dict(attributes or {}),
+        error=None,
+    )
+
+
+def use_span(span: Optional[Span]):
+    """Makes span the parent of spans started later in this context."""
+    if span is not None:
+        _current_span.set(span)
+
+
+def set_attributes(attributes: dict[str, Any], span: Optional[Span] = None):
+    """Adds attributes to span, or to the current span."""
+    span = span or _current_span.get()
+    if span is not None:
+        span["attributes"].update(attributes)
+
+
+def record_error(error: BaseException, span: Optional[Span] = None):
+    """Marks span, or the current span, as failed."""
+    span = span or _current_span.get()
+    if span is not None:
+        span["error"] = f"{type(error).__name__}: {error}"
+
+
+def end_span(span: Optional[Span]):
+    """Ends span and queues it for export."""
+    global _dropped_spans
+    if span is None or span["end_ns"]:
+        return
+    span["end_ns"] = time.time_ns()
+    _ensure_exporter()
+    try:
+        _export_queue.put_nowait(span)
+    except queue.Full:
+        _dropped_spans += 1
+
+
+@contextmanager
+def span(
+    name: str,
+    attributes: Optional[dict[str, Any]] = None,
+    kind: int = SPAN_KIND_INTERNAL,
+) -> Iterator[Optional[Span]]:
+    """Runs the block in a child span of the current span."""
+    current = start_span(name, attributes, kind)
+    if current is None:
+        yield None
+        return
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        record_error(e, current)
+        raise
+    finally:
+        _current_span.reset(token)
+        end_span(current)
+
+
+def traced(name: str, attributes: Optional[dict[str, Any]] = None):
+    """Decorates a function to run in a span, recording the size of a bytes result."""
+
+    def decorate(fn: Callable):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, attributes) as current:
+                result = fn(*args, **kwargs)
+                if isinstance(result, bytes):
+                    set_attributes({"result.bytes": len(result)}, current)
+                return result
+
+        return wrapper
+
+    return decorate
+
+
+def fingerprint_sql(sql: Any) -> str:
+    """Returns the statement with literals replaced by ?, so equal queries group together."""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    sql = _SQL_LITERALS.sub("?", str(sql))
+    sql = _SQL_IN_LISTS.sub("(?)", sql)
+    return _SQL_WHITESPACE.sub(" ", sql).strip()[:2000]
+
+
+@contextmanager
+def query_span(sql: Any, system: str = "postgresql") -> Iterator[Optional[Span]]:
+    """Runs a database query in a span named after its statement type, with its fingerprint."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    statement = fingerprint_sql(sql)
+    with span(
+        f"db.{statement.split(' ', 1)[0].lower() or 'query'}",
+        {"db.system": system, "db.statement": statement},
+        kind=SPAN_KIND_CLIENT,
+    ) as current:
+        yield current
+
+
+def link_chained_events(parent: Optional[Span], token: str, event_names: list[str]):
+    """
+    Remembers parent for events a handler chained with `yield State.event`.
+
+    Chained events come back from the browser as new events on the same
+    token, so the next event with a remembered name continues parent's trace.
+    """
+    if parent is None or not event_names:
+        return
+    expires = time.monotonic() + CHAINED_EVENT_TTL_SECONDS
+    with _chained_lock:
+        if len(_chained_parents) >= MAX_PENDING_CHAINED_EVENTS:
+            now = time.monotonic()
+            for key in [k for k, v in _chained_parents.items() if v[-1][0] < now]:
+                del _chained_parents[key]
+        for name in event_names:
+            _chained_parents.setdefault((token, name), deque()).append((expires, parent))
+
+
+def pop_chained_parent(token: str, event_name: str) -> Optional[Span]:
+    """Returns the span that chained this event, if it was chained recently."""
+    if not TRACING_ENABLED:
+        return None
+    with _chained_lock:
+        pending = _chained_parents.get((token, event_name))
+        if not pending:
+            return None
+        now = time.monotonic()
+        while pending and pending[0][0] < now:
+            pending.popleft()
+        parent = pending.popleft()[1] if pending else None
+        if not pending:
+            del _chained_parents[(token, event_name)]
+        return parent
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> dict:
+    encoded = {
+        "traceId": span["trace_id"],
+        "spanId": span["span_id"],
+        "name": span["name"],
+        "kind": span["kind"],
+        "startTimeUnixNano": str(span["start_ns"]),
+        "endTimeUnixNano": str(span["end_ns"]),
+        "attributes": [
+            {"key": k, "value": _otlp_value(v)} for k, v in span["attributes"].items()
+        ],
+        "status": {"code": 2, "message": span["error"]} if span["error"] else {},
+    }
+    if span["parent_id"]:
+        encoded["parentSpanId"] = span["parent_id"]
+    return encoded
+
+
+def _otlp_request(spans: list[Span]) -> dict:
+    """Encodes spans as an OTLP/JSON ExportTraceServiceRequest."""
+    resource = {
+        "attributes": [
+            {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+            {"key": "service.instance.id", "value": {"stringValue": WORKER_ID}},
+        ]
+    }
+    return {
+        "resourceSpans": [
+            {
+                "resource": resource,
+                "scopeSpans": [
+                    {"scope": {"name": "clinchat"}, "spans": [_otlp_span(s) for s in spans]}
+                ],
+            }
+        ]
+    }
+
+
+def _export(spans: list[Span]):
+    body = json.dumps(_otlp_request(spans))
+    if TRACE_FILE:
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(body + "\n")
+    if TRACE_ENDPOINT:
+        request = urllib.request.Request(
+            TRACE_ENDPOINT,
+            data=body.encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            response.read()
+
+
+def _export_loop():
+    """
+    Exporter thread that writes spans in batches.
+
+    Batches go to CLINCHAT_TRACE_FILE as one OTLP/JSON request per line (the
+    format the OpenTelemetry Collector's otlpjsonfile receiver reads) and/or
+    are POSTed to CLINCHAT_TRACE_ENDPOINT, e.g. a collector's /v1/traces.
+    """
+    global _dropped_spans
+    while True:
+        batch = [_export_queue.get()]
+        deadline = time.monotonic() + EXPORT_INTERVAL_SECONDS
+        while len(batch) < EXPORT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_export_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        if _dropped_spans:
+            logging.warning(f"Dropped {_dropped_spans} spans; the export queue was full.")
+            _dropped_spans = 0
+        try:
+            _export(batch)
+        except Exception as e:
+            logging.exception(f"Failed to export {len(batch)} spans: {e}")
+
+
+def _ensure_exporter():
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = threading.Thread(
+                    target=_export_loop, name="span-exporter", daemon=True
+                )
+                _exporter.start()
@@ -0,0 +1,149 @@
+import os
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+from app.utils.db import get_db_connection, return_db_connection
+from app.utils.data_sync import on_data_sync
+from app.utils.prefetch import prefetch_slot
+from app.utils.tracing import set_attributes, traced
+
+TRIAL_CACHE_SIZE = int(os.environ.get("CLINCHAT_TRIAL_CACHE_SIZE", "256"))
+TRIAL_CACHE_TTL_SECONDS = int(
+    os.environ.get("CLINCHAT_TRIAL_CACHE_TTL_SECONDS", "900")
+)
+STUDY_QUERY = """
+SELECT
+    s.nct_id, s.brief_title, s.official_title, s.overall_status, s.phase,
+    s.study_type, s.enrollment, s.start_date, s.completion_date,
+    bs.description as brief_summary,
+    dd.description as detailed_description,
+    e.criteria as eligibility_criteria
+FROM ctgov.studies s
+LEFT JOIN ctgov.brief_summaries bs ON s.nct_id = bs.nct_id
+LEFT JOIN ctgov.detailed_descriptions dd ON s.nct_id = dd.nct_id
+LEFT JOIN ctgov.eligibilities e ON s.nct_id = e.nct_id
+WHERE s.nct_id = %s
+"""
+RELATED_QUERIES = {
+    "locations": "SELECT name as facility, status, city, state, zip, country FROM ctgov.facilities WHERE nct_id = %s",
+    "interventions": "SELECT intervention_type, name FROM ctgov.interventions WHERE nct_id = %s",
+    "sponsors": "SELECT agency_class, lead_or_collaborator, name FROM ctgov.sponsors WHERE nct_id = %s",
+    "design_groups": "SELECT group_type, title, description FROM ctgov.design_groups WHERE nct_id = %s",
+    "design_outcomes": "SELECT outcome_type, measure, time_frame, description FROM ctgov.design_outcomes WHERE nct_id = %s",
+    "references": "SELECT citation, reference_type FROM ctgov.study_references WHERE nct_id = %s",
+}
+VALUE_QUERIES = {
+    "mesh_terms": "SELECT mesh_term FROM ctgov.browse_conditions WHERE nct_id = %s",
+    "conditions": "SELECT name FROM ctgov.conditions WHERE nct_id = %s",
+}
+_trial_cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+_trial_cache_lock = threading.Lock()
+
+
+def fetch_trial_detail(nct_id: str) -> Optional[dict]:
+    """
+    Loads a study and its locations, interventions, sponsors, arms, outcomes,
+    references, MeSH terms and conditions from the database.
+
+    Args:
+        nct_id: The trial to load.
+
+    Returns:
+        The trial detail dict, or None if the trial does not exist or the query fails.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return None
+        with conn.cursor() as cur:
+            cur.execute(STUDY_QUERY, (nct_id,))
+            row = cur.fetchone()
+            if not row:
+                return None
+            trial_data = dict(zip([desc[0] for desc in cur.description], row))
+            for key, query in RELATED_QUERIES.items():
+                cur.execute(query, (nct_id,))
+                trial_data[key] = [
+                    dict(zip([d[0] for d in cur.description], r))
+                    for r in cur.fetchall()
+                ]
+            for key, query in VALUE_QUERIES.items():
+                cur.execute(query, (nct_id,))
+                trial_data[key] = [r[0] for r in cur.fetchall()]
+            return trial_data
+    except Exception as e:
+        logging.exception(f"Error fetching trial details for {nct_id}: {e}")
+        return None
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+
+def _cached_trial_detail(nct_id: str) -> Optional[dict]:
+    with _trial_cache_lock:
+        entry = _trial_cache.get(nct_id)
+        if entry is None:
+            return None
+        cached_at, trial_data = entry
+        if time.monotonic() - cached_at > TRIAL_CACHE_TTL_SECONDS:
+            del _trial_cache[nct_id]
+            return None
+        _trial_cache.move_to_end(nct_id)
+        return trial_data
+
+
+def _store_trial_detail(nct_id: str, trial_data: dict):
+    with _trial_cache_lock:
+        _trial_cache[nct_id] = (time.monotonic(), trial_data)
+        _trial_cache.move_to_end(nct_id)
+        while len(_trial_cache) > TRIAL_CACHE_SIZE:
+            _trial_cache.popitem(last=False)
+
+
+@traced("trial_detail.get")
+def get_trial_detail(nct_id: str) -> Optional[dict]:
+    """Returns a copy of the trial detail from the cache, loading it on a miss."""
+    trial_data = _cached_trial_detail(nct_id)
+    set_attributes({"trial.nct_id": nct_id, "cache.hit": trial_data is not None})
+    if trial_data is None:
+        trial_data = fetch_trial_detail(nct_id)
+        if trial_data is None:
+            return None
+        _store_trial_detail(nct_id, trial_data)
+    return copy.deepcopy(trial_data)
+
+
+def prefetch_trial_detail(nct_id: str) -> bool:
+    """
+    Warms the cache for a trial the user is likely to open.
+
+    Runs only when the prefetch budget allows, so speculative loads never wait
+    for or starve foreground queries.
+
+    Args:
+        nct_id: The trial to warm.
+
+    Returns:
+        True if the trial is now cached, False if the prefetch was skipped or failed.
+    """
+    if _cached_trial_detail(nct_id) is not None:
+        return True
+    with prefetch_slot() as allowed:
+        if not allowed:
+            return False
+        trial_data = fetch_trial_detail(nct_id)
+    if trial_data is None:
+        return False
+    _store_trial_detail(nct_id, trial_data)
+    return True
+
+
+@on_data_sync
+def clear_trial_cache():
+    """Drops cached trial details after the AACT data changes."""
+    with _trial_cache_lock:
+        _trial_cache.clear()
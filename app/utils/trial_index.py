@@ -0,0 +1,198 @@
+import re
+import zlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, TypedDict
+import numpy as np
+from app.utils.data_sync import on_data_sync
+
+HASH_DIMENSIONS = 2048
+CHUNK_WORDS = 120
+CHUNK_OVERLAP = 30
+MAX_CACHED_INDEXES = 32
+_WORD_PATTERN = re.compile("[a-z0-9]+(?:[-'][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    (
+        "a an and are as at be by for from has have in is it its of on or that "
+        "the this to was were will with"
+    ).split()
+)
+
+
+class TrialChunk(TypedDict):
+    section: str
+    text: str
+
+
+class TrialChunkIndex:
+    """An in-memory hashed n-gram TF-IDF index over the chunks of one trial."""
+
+    def __init__(self, nct_id: str, chunks: list[TrialChunk]):
+        self.nct_id = nct_id
+        self.chunks = chunks
+        counts = np.zeros((len(chunks), HASH_DIMENSIONS), dtype=np.float32)
+        for row, chunk in enumerate(chunks):
+            for bucket in _hash_features(chunk["text"]):
+                counts[row, bucket] += 1.0
+        document_frequency = np.count_nonzero(counts, axis=0)
+        self.idf = (
+            np.log((1 + len(chunks)) / (1 + document_frequency)) + 1.0
+        ).astype(np.float32)
+        self.matrix = _l2_normalize(np.log1p(counts) * self.idf)
+
+    def search(
+        self, question: str, top_k: int = 4
+    ) -> list[tuple[TrialChunk, float]]:
+        """Returns the top_k chunks ranked by cosine similarity to the question."""
+        if not self.chunks:
+            return []
+        query = np.zeros(HASH_DIMENSIONS, dtype=np.float32)
+        for bucket in _hash_features(question):
+            query[bucket] += 1.0
+        query = _l2_normalize((np.log1p(query) * self.idf)[np.newaxis, :])[0]
+        scores = self.matrix @ query
+        top_k = min(top_k, len(self.chunks))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.chunks[i], float(scores[i])) for i in best if scores[i] > 0]
+
+
+def _tokenize(text: str) -> list[str]:
+    return [w for w in _WORD_PATTERN.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def _hash_features(text: str) -> list[int]:
+    """Hashes word unigrams and bigrams into feature buckets with a stable hash."""
+    words = _tokenize(text)
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return [zlib.crc32(g.encode("utf-8")) % HASH_DIMENSIONS for g in grams]
+
+
+def _l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _split_words(section: str, text: Optional[str]) -> list[TrialChunk]:
+    """Splits a long text into overlapping word windows."""
+    if not text:
+        return []
+    words = text.replace("\\n", " ").split()
+    if not words:
+        return []
+    chunks = []
+    step = CHUNK_WORDS - CHUNK_OVERLAP
+    for start in range(0, len(words), step):
+        window = words[start : start + CHUNK_WORDS]
+        chunks.append(TrialChunk(section=section, text=" ".join(window)))
+        if start + CHUNK_WORDS >= len(words):
+            break
+    return chunks
+
+
+def chunk_trial(
+    trial: dict, inclusion_criteria: list[str], exclusion_criteria: list[str]
+) -> list[TrialChunk]:
+    """
+    Splits a trial detail document into retrievable text chunks.
+
+    Args:
+        trial: The trial detail document.
+        inclusion_criteria: Parsed inclusion criteria items.
+        exclusion_criteria: Parsed exclusion criteria items.
+
+    Returns:
+        The chunks, each tagged with the section it came from.
+    """
+    chunks = [
+        TrialChunk(
+            section="Overview",
+            text=f"{trial.get('brief_title')}. Status: {trial.get('overall_status')}. Phase: {trial.get('phase')}. Study type: {trial.get('study_type')}. Enrollment: {trial.get('enrollment')}. Start date: {trial.get('start_date')}. Completion date: {trial.get('completion_date')}.",
+        )
+    ]
+    chunks.extend(_split_words("Brief Summary", trial.get("brief_summary")))
+    chunks.extend(
+        _split_words("Detailed Description", trial.get("detailed_description"))
+    )
+    if inclusion_criteria or exclusion_criteria:
+        chunks.extend(
+            _split_words("Inclusion Criteria", " * ".join(inclusion_criteria))
+        )
+        chunks.extend(
+            _split_words("Exclusion Criteria", " * ".join(exclusion_criteria))
+        )
+    else:
+        chunks.extend(_split_words("Eligibility", trial.get("eligibility_criteria")))
+    for outcome in trial.get("design_outcomes") or []:
+        chunks.append(
+            TrialChunk(
+                section=f"{(outcome.get('outcome_type') or '').capitalize()} Outcome",
+                text=f"{outcome.get('measure')}. Time frame: {outcome.get('time_frame')}. {outcome.get('description') or ''}",
+            )
+        )
+    for group in trial.get("design_groups") or []:
+        chunks.append(
+            TrialChunk(
+                section="Design Group",
+                text=f"{group.get('title')} ({group.get('group_type')}). {group.get('description') or ''}",
+            )
+        )
+    interventions = trial.get("interventions") or []
+    if interventions:
+        chunks.append(
+            TrialChunk(
+                section="Interventions",
+                text="; ".join(
+                    (
+                        f"{i.get('intervention_type')}: {i.get('name')}"
+                        for i in interventions
+                    )
+                ),
+            )
+        )
+    return chunks
+
+
+_chunk_index_cache: OrderedDict[str, TrialChunkIndex] = OrderedDict()
+_chunk_index_lock = threading.Lock()
+
+
+def get_trial_chunk_index(
+    trial: dict, inclusion_criteria: list[str], exclusion_criteria: list[str]
+) -> TrialChunkIndex:
+    """
+    Returns the chunk index for a trial, building and caching it on first use.
+
+    Indexes are kept in a small LRU keyed by nct_id so follow-up questions on the
+    same trial never re-chunk or re-embed.
+    """
+    nct_id = trial.get("nct_id", "")
+    with _chunk_index_lock:
+        index = _chunk_index_cache.get(nct_id)
+        if index is not None:
+            _chunk_index_cache.move_to_end(nct_id)
+            return index
+    chunks = chunk_trial(trial, inclusion_criteria, exclusion_criteria)
+    index = TrialChunkIndex(nct_id, chunks)
+    logging.info(f"Built chunk index for {nct_id} with {len(chunks)} chunks.")
+    with _chunk_index_lock:
+        _chunk_index_cache[nct_id] = index
+        while len(_chunk_index_cache) > MAX_CACHED_INDEXES:
+            _chunk_index_cache.popitem(last=False)
+    return index
+
+
+@on_data_sync
+def invalidate_trial_chunk_index(nct_id: Optional[str] = None):
+    """
+    Drops the cached chunk index for one trial, or all of them.
+
+    Runs on every AACT sync, so chat never answers from stale trial text.
+    """
+    with _chunk_index_lock:
+        if nct_id is None:
+            _chunk_index_cache.clear()
+        else:
+            _chunk_index_cache.pop(nct_id, None)
@@ -0,0 +1,233 @@
+from functools import lru_cache
+from typing import Mapping, Optional
+from app.utils.facility_index import nearby_trials_for_terms
+from app.utils.text_index import text_search_for_terms
+
+SUBSTRING_FILTERS = {
+    "condition": ("ctgov.conditions", "name"),
+    "intervention": ("ctgov.interventions", "name"),
+    "sponsor": ("ctgov.sponsors", "name"),
+    "country": ("ctgov.facilities", "country"),
+}
+EQUALITY_FILTERS = {
+    "status": "s.overall_status",
+    "phase": "s.phase",
+    "study_type": "s.study_type",
+}
+RANGE_FILTERS = {
+    "min_enrollment": "s.enrollment >= %(min_enrollment)s",
+    "max_enrollment": "s.enrollment <= %(max_enrollment)s",
+    "start_date_from": "s.start_date >= %(start_date_from)s",
+    "start_date_to": "s.start_date <= %(start_date_to)s",
+}
+INTEGER_FILTERS = ("min_enrollment", "max_enrollment")
+LOCAL_FILTERS = ("nct_id", *SUBSTRING_FILTERS, *EQUALITY_FILTERS)
+CARD_COLUMNS = """
+    s.nct_id, s.brief_title, s.overall_status, s.phase, s.enrollment, s.start_date,
+    s.completion_date, s.study_type,
+    (SELECT COUNT(*) FROM ctgov.facilities f WHERE f.nct_id = s.nct_id) AS location_count,
+    (SELECT COUNT(*) FROM ctgov.interventions i WHERE i.nct_id = s.nct_id) AS intervention_count,
+    (
+        SELECT bc.mesh_term FROM ctgov.browse_conditions bc
+        WHERE bc.nct_id = s.nct_id ORDER BY bc.id LIMIT 1
+    ) AS primary_therapeutic_area
+"""
+DEFAULT_ORDER = "s.start_date DESC NULLS LAST"
+RANKED_ORDER = "array_position(%(ranked)s, s.nct_id::text)"
+TRIGRAM_MIN_LENGTH = 3
+TRIGRAM_INDEXES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS conditions_name_trgm ON ctgov.conditions USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS interventions_name_trgm ON ctgov.interventions USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS sponsors_name_trgm ON ctgov.sponsors USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS facilities_country_trgm ON ctgov.facilities USING gin (country gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS studies_nct_id_trgm ON ctgov.studies USING gin (nct_id gin_trgm_ops)",
+]
+
+
+def escape_like(value: str) -> str:
+    """Escapes LIKE wildcards so user input only ever matches literally."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _is_short(field: str, value: object) -> bool:
+    is_substring = field == "nct_id" or field in SUBSTRING_FILTERS
+    return is_substring and len(str(value)) < TRIGRAM_MIN_LENGTH
+
+
+def _substring_clause(field: str, short: bool) -> str:
+    if field == "nct_id":
+        table, column = None, "s.nct_id"
+    else:
+        table, column = SUBSTRING_FILTERS[field]
+        column = f"x.{column}"
+    if short:
+        # Needles shorter than a trigram cannot use a pg_trgm index, so they
+        # compile to strpos, which the planner answers with a plain scan
+        # instead of walking the whole trigram index.
+        match = f"strpos(lower({column}), lower(%({field})s)) > 0"
+    else:
+        match = f"{column} ILIKE %({field})s"
+    if table is None:
+        return match
+    return f"EXISTS (SELECT 1 FROM {table} x WHERE x.nct_id = s.nct_id AND {match})"
+
+
+@lru_cache(maxsize=256)
+def _compile_where(shape: tuple[tuple[str, bool], ...]) -> str:
+    """
+    Compiles the WHERE clause for a filter shape.
+
+    The shape records which filters are set, and for substring filters
+    whether the needle is shorter than a trigram, but never their values,
+    so the SQL text is built once per shape and every value is a parameter.
+    """
+    clauses = []
+    for field, short in shape:
+        if field == "nct_id" or field in SUBSTRING_FILTERS:
+            clauses.append(_substring_clause(field, short))
+        elif field in EQUALITY_FILTERS:
+            clauses.append(f"{EQUALITY_FILTERS[field]} = %({field})s")
+        elif field in RANGE_FILTERS:
+            clauses.append(RANGE_FILTERS[field])
+        elif field == "nct_ids":
+            clauses.append("s.nct_id = ANY(%(nct_ids)s)")
+        elif field == "ranked":
+            clauses.append("s.nct_id = ANY(%(ranked)s)")
+    return " AND ".join(clauses) if clauses else "TRUE"
+
+
+class TrialQuery:
+    """
+    A trial search specification shared by Browse, Advanced Search, Alerts and Compare.
+
+    Filters compile either to parameterized Postgres SQL over ctgov.studies
+    or to the filter terms of the in-memory TrialFilterIndex. Substring
+    filters on related tables compile to correlated EXISTS so Postgres can
+    stop at the first matching row, and their patterns are escaped so a
+    trigram index answers them literally.
+    """
+
+    def __init__(
+        self,
+        filters: Optional[Mapping[str, object]] = None,
+        nct_ids: Optional[list[str]] = None,
+        ranked: Optional[list[str]] = None,
+    ):
+        """
+        Args:
+            filters: Substring, equality and range filters keyed like the
+                Browse search terms; empty values are ignored.
+            nct_ids: Restricts the results to exactly these trials.
+            ranked: Restricts the results to these trials, in this order.
+        """
+        self.filters = {
+            k: v for k, v in (filters or {}).items() if v is not None and v != ""
+        }
+        self.nct_ids = nct_ids
+        self.ranked = ranked
+
+    @classmethod
+    def from_terms(
+        cls, terms: Mapping[str, Optional[str]], ranked: Optional[list[str]] = None
+    ) -> "TrialQuery":
+        """
+        Builds a query from Browse search terms, an Advanced Search structured
+        query or watchlist criteria. Unknown keys and enrollment bounds that
+        are not whole numbers are ignored.
+        """
+        filters = {}
+        for field in ("nct_id", *SUBSTRING_FILTERS, *EQUALITY_FILTERS, *RANGE_FILTERS):
+            value = (terms.get(field) or "").strip()
+            if not value:
+                continue
+            if field in INTEGER_FILTERS:
+                if not value.isdigit():
+                    continue
+                filters[field] = int(value)
+            else:
+                filters[field] = value
+        return cls(filters, ranked=ranked)
+
+    def is_empty(self) -> bool:
+        return not self.filters and self.nct_ids is None and self.ranked is None
+
+    def shape(self) -> tuple[tuple[str, bool], ...]:
+        """The filter shape used as the compiled-SQL cache key."""
+        shape = [
+            (field, _is_short(field, self.filters[field]))
+            for field in sorted(self.filters)
+        ]
+        if self.nct_ids is not None:
+            shape.append(("nct_ids", False))
+        if self.ranked is not None:
+            shape.append(("ranked", False))
+        return tuple(shape)
+
+    def where(self) -> tuple[str, dict]:
+        """Compiles to a SQL WHERE clause over ctgov.studies s and its parameters."""
+        params: dict[str, object] = {}
+        for field, value in self.filters.items():
+            if _is_short(field, value):
+                params[field] = value
+            elif field == "nct_id" or field in SUBSTRING_FILTERS:
+                params[field] = f"%{escape_like(value)}%"
+            else:
+                params[field] = value
+        if self.nct_ids is not None:
+            params["nct_ids"] = list(self.nct_ids)
+        if self.ranked is not None:
+            params["ranked"] = list(self.ranked)
+        return _compile_where(self.shape()), params
+
+    def order_by(self) -> str:
+        return RANKED_ORDER if self.ranked is not None else DEFAULT_ORDER
+
+    def select(
+        self,
+        columns: str = CARD_COLUMNS,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> tuple[str, dict]:
+        """Compiles to a full SELECT over ctgov.studies s, ordered by rank or start date."""
+        where_sql, params = self.where()
+        order_sql = self.order_by()
+        sql = f"SELECT {columns} FROM ctgov.studies s WHERE {where_sql} ORDER BY {order_sql}"
+        if limit is not None:
+            sql += " LIMIT %(limit)s OFFSET %(offset)s"
+            params.update(limit=limit, offset=offset)
+        return sql, params
+
+    def count(self) -> tuple[str, dict]:
+        where_sql, params = self.where()
+        return f"SELECT COUNT(*) FROM ctgov.studies s WHERE {where_sql}", params
+
+    def local_filters(self) -> Optional[dict[str, str]]:
+        """
+        Compiles to TrialFilterIndex filter terms.
+
+        Returns:
+            The terms, or None if a filter has no in-memory equivalent, in which
+            case the query must run in Postgres.
+        """
+        if self.nct_ids is not None:
+            return None
+        if any(field not in LOCAL_FILTERS for field in self.filters):
+            return None
+        return {field: str(value) for field, value in self.filters.items()}
+
+
+def ranked_trials(terms: Mapping[str, Optional[str]]) -> Optional[list[str]]:
+    """
+    Returns the trials a text or location search is restricted to, in result order.
+
+    Text hits are ordered by relevance and, with a location set as well, kept
+    only if they have a site in range. A location search alone orders by distance.
+    """
+    hits = text_search_for_terms(terms)
+    nearby = nearby_trials_for_terms(terms)
+    if hits is None:
+        return list(nearby) if nearby is not None else None
+    if nearby is None:
+        return list(hits)
+    return [nct_id for nct_id in hits if nct_id in nearby]
@@ -0,0 +1,592 @@
+import os
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Optional
+from app.models.user import User
+from app.utils.event_metrics import timed_phase
+from app.utils.tracing import query_span, set_attributes, span
+from app.models.saved_trial import SavedTrial
+from app.models.watchlist import Watchlist
+from app.models.workspace import (
+    Workspace,
+    WorkspaceMember,
+    WorkspaceTrial,
+    WorkspaceActivity,
+)
+
+USER_STORE_URL = os.environ.get("CLINCHAT_USER_STORE", "clinchat.sqlite3")
+USER_STORE_POOL_SIZE = int(os.environ.get("CLINCHAT_USER_STORE_POOL_SIZE", "10"))
+USER_STORE_BATCH_WRITES = os.environ.get("CLINCHAT_USER_STORE_BATCH_WRITES", "1") == "1"
+QUERY_HISTORY_LIMIT = 10
+_SQLITE_BATCH = 500
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        email TEXT PRIMARY KEY,
+        password_hash TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS saved_trials (
+        user_email TEXT NOT NULL,
+        nct_id TEXT NOT NULL,
+        saved_date TEXT NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (user_email, nct_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS saved_trials_user_date ON saved_trials (user_email, saved_date)",
+    """
+    CREATE TABLE IF NOT EXISTS watchlists (
+        watchlist_id TEXT PRIMARY KEY,
+        user_email TEXT NOT NULL,
+        created_date TEXT NOT NULL,
+        data TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS watchlists_user_date ON watchlists (user_email, created_date)",
+    """
+    CREATE TABLE IF NOT EXISTS workspaces (
+        workspace_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL,
+        owner_email TEXT NOT NULL,
+        created_date TEXT NOT NULL,
+        last_updated TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS workspace_members (
+        workspace_id TEXT NOT NULL,
+        email TEXT NOT NULL,
+        role TEXT NOT NULL,
+        joined_date TEXT NOT NULL,
+        PRIMARY KEY (workspace_id, email)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS workspace_members_email ON workspace_members (email)",
+    """
+    CREATE TABLE IF NOT EXISTS workspace_trials (
+        workspace_id TEXT NOT NULL,
+        nct_id TEXT NOT NULL,
+        added_by TEXT NOT NULL,
+        added_date TEXT NOT NULL,
+        workspace_notes TEXT NOT NULL,
+        PRIMARY KEY (workspace_id, nct_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS workspace_trials_date ON workspace_trials (workspace_id, added_date)",
+    """
+    CREATE TABLE IF NOT EXISTS workspace_activity (
+        activity_id TEXT PRIMARY KEY,
+        workspace_id TEXT NOT NULL,
+        user_email TEXT NOT NULL,
+        action TEXT NOT NULL,
+        target TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        details TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS workspace_activity_date ON workspace_activity (workspace_id, timestamp)",
+    """
+    CREATE TABLE IF NOT EXISTS query_history (
+        entry_id TEXT PRIMARY KEY,
+        user_email TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        natural_query TEXT NOT NULL,
+        structured_query TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS query_history_user_date ON query_history (user_email, timestamp)",
+    """
+    CREATE TABLE IF NOT EXISTS saved_searches (
+        entry_id TEXT PRIMARY KEY,
+        user_email TEXT NOT NULL,
+        name TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        natural_query TEXT NOT NULL,
+        structured_query TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS saved_searches_user_date ON saved_searches (user_email, timestamp)",
+]
+
+Statement = tuple[str, tuple]
+
+
+def _dumps(value) -> str:
+    # Trial rows carry date objects from psycopg2; they are stored as ISO strings.
+    return json.dumps(value, default=str)
+
+
+class _WriteBatcher:
+    """
+    Group commit for SQLite.
+
+    Writers queue their statements and block until a single writer thread has
+    committed them. Every write that arrives while a commit is in flight is
+    folded into the next transaction, so under load many users' writes share
+    one commit instead of queueing on SQLite's single write lock one by one.
+    """
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._pending: list[list] = []
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="user-store-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, statements: list[Statement]):
+        item = [statements, threading.Event(), None]
+        with self._cond:
+            self._pending.append(item)
+            self._cond.notify()
+        item[1].wait()
+        if item[2] is not None:
+            raise item[2]
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                batch, self._pending = self._pending, []
+            try:
+                with conn:
+                    for statements, _, _ in batch:
+                        for sql, params in statements:
+                            conn.execute(sql, params)
+            except sqlite3.Error:
+                # One bad write must not fail the others it was batched with,
+                # so replay each one in its own transaction.
+                for item in batch:
+                    try:
+                        with conn:
+                            for sql, params in item[0]:
+                                conn.execute(sql, params)
+                    except sqlite3.Error as e:
+                        item[2] = e
+            for item in batch:
+                item[1].set()
+
+
+class UserStore:
+    """
+    Persistent store for users, saved trials, watchlists, workspaces and searches.
+
+    Defaults to a SQLite file in WAL mode, which worker processes on one host
+    can share: readers never block the writer, and writes are group-committed
+    by a single writer thread. A postgresql:// URL stores the same tables in
+    Postgres instead, for deployments that scale across hosts. Nested fields
+    that are only ever read whole, like a saved trial's tags or a watchlist's
+    matches, are stored as JSON next to the indexed columns they are listed by.
+    """
+
+    def __init__(
+        self, url: str = USER_STORE_URL, batch_writes: bool = USER_STORE_BATCH_WRITES
+    ):
+        """
+        Args:
+            url: A SQLite file path, or a postgresql:// connection URL.
+            batch_writes: Group-commit SQLite writes from concurrent callers.
+        """
+        self.url = url
+        self.is_postgres = url.startswith(("postgres://", "postgresql://"))
+        self.system = "postgresql" if self.is_postgres else "sqlite"
+        self._local = threading.local()
+        self._pool = None
+        self._batcher = None
+        if self.is_postgres:
+            from psycopg2 import pool
+
+            self._pool = pool.ThreadedConnectionPool(1, USER_STORE_POOL_SIZE, dsn=url)
+        self._write([(sql, ()) for sql in SCHEMA])
+        if batch_writes and not self.is_postgres:
+            self._batcher = _WriteBatcher(self._sqlite_connect)
+
+    def _sqlite_connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.url, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _sqlite(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._sqlite_connect()
+        return conn
+
+    def _read(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with timed_phase("db"), query_span(sql, self.system) as current:
+            if not self.is_postgres:
+                rows = self._sqlite().execute(sql, params).fetchall()
+            else:
+                conn = self._pool.getconn()
+                try:
+                    with conn, conn.cursor() as cur:
+                        cur.execute(sql.replace("?", "%s"), params)
+                        rows = cur.fetchall()
+                finally:
+                    self._pool.putconn(conn)
+            set_attributes({"db.rows": len(rows)}, current)
+            return rows
+
+    def _read_in(self, sql: str, values: list[str]) -> list[tuple]:
+        """Runs a query whose single {} placeholder is an IN list, in batches."""
+        rows = []
+        for i in range(0, len(values), _SQLITE_BATCH):
+            batch = values[i : i + _SQLITE_BATCH]
+            rows.extend(self._read(sql.format(",".join("?" * len(batch))), tuple(batch)))
+        return rows
+
+    def _write(self, statements: list[Statement]):
+        """Runs the statements in one transaction."""
+        with timed_phase("db"), span(
+            "db.transaction", {"db.system": self.system, "db.statements": len(statements)}
+        ):
+            if self._batcher is not None:
+                self._batcher.submit(statements)
+            elif not self.is_postgres:
+                conn = self._sqlite()
+                with conn:
+                    for sql, params in statements:
+                        conn.execute(sql, params)
+            else:
+                conn = self._pool.getconn()
+                try:
+                    with conn, conn.cursor() as cur:
+                        for sql, params in statements:
+                            cur.execute(sql.replace("?", "%s"), params)
+                finally:
+                    self._pool.putconn(conn)
+
+    def get_user(self, email: str) -> Optional[User]:
+        rows = self._read("SELECT email, password_hash FROM users WHERE email = ?", (email,))
+        if not rows:
+            return None
+        return User(email=rows[0][0], password_hash=rows[0][1])
+
+    def add_user(self, user: User) -> bool:
+        """Adds a user, returning False if the email is already registered."""
+        if self.get_user(user["email"]) is not None:
+            return False
+        self._write(
+            [
+                (
+                    "INSERT INTO users (email, password_hash) VALUES (?, ?) ON CONFLICT (email) DO NOTHING",
+                    (user["email"], user["password_hash"]),
+                )
+            ]
+        )
+        # Two registrations can race past the check above; the one whose row
+        # was kept wins.
+        stored = self.get_user(user["email"])
+        return stored is not None and stored["password_hash"] == user["password_hash"]
+
+    def saved_trials(self, user_email: str) -> dict[str, SavedTrial]:
+        """Returns the user's saved trials by NCT ID, most recently saved first."""
+        rows = self._read(
+            "SELECT nct_id, data FROM saved_trials WHERE user_email = ? ORDER BY saved_date DESC",
+            (user_email,),
+        )
+        return {nct_id: json.loads(data) for nct_id, data in rows}
+
+    def put_saved_trials(self, user_email: str, trials: list[SavedTrial]):
+        """Inserts or replaces saved trials in one transaction."""
+        self._write(
+            [
+                (
+                    "INSERT INTO saved_trials (user_email, nct_id, saved_date, data) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (user_email, nct_id) DO UPDATE SET saved_date = excluded.saved_date, data = excluded.data",
+                    (user_email, t["nct_id"], t["saved_date"], _dumps(t)),
+                )
+                for t in trials
+            ]
+        )
+
+    def remove_saved_trials(self, user_email: str, nct_ids: list[str]):
+        self._write(
+            [
+                (
+                    "DELETE FROM saved_trials WHERE user_email = ? AND nct_id = ?",
+                    (user_email, nct_id),
+                )
+                for nct_id in nct_ids
+            ]
+        )
+
+    def watchlists(self, user_email: str) -> dict[str, Watchlist]:
+        """Returns the user's watchlists by ID, newest first."""
+        rows = self._read(
+            "SELECT watchlist_id, data FROM watchlists WHERE user_email = ? ORDER BY created_date DESC",
+            (user_email,),
+        )
+        return {watchlist_id: json.loads(data) for watchlist_id, data in rows}
+
+    def put_watchlist(self, user_email: str, watchlist: Watchlist):
+        self._write(
+            [
+                (
+                    "INSERT INTO watchlists (watchlist_id, user_email, created_date, data) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (watchlist_id) DO UPDATE SET data = excluded.data",
+                    (
+                        watchlist["watchlist_id"],
+                        user_email,
+                        watchlist["created_date"],
+                        _dumps(watchlist),
+                    ),
+                )
+            ]
+        )
+
+    def delete_watchlist(self, user_email: str, watchlist_id: str):
+        self._write(
+            [
+                (
+                    "DELETE FROM watchlists WHERE user_email = ? AND watchlist_id = ?",
+                    (user_email, watchlist_id),
+                )
+            ]
+        )
+
+    def _load_workspaces(self, workspace_ids: list[str]) -> dict[str, Workspace]:
+        workspaces: dict[str, Workspace] = {}
+        for row in self._read_in(
+            "SELECT workspace_id, name, description, owner_email, created_date, last_updated FROM workspaces WHERE workspace_id IN ({})",
+            workspace_ids,
+        ):
+            workspaces[row[0]] = Workspace(
+                workspace_id=row[0],
+                name=row[1],
+                description=row[2],
+                owner_email=row[3],
+                members=[],
+                trials=[],
+                created_date=row[4],
+                last_updated=row[5],
+                activity=[],
+            )
+        ids = list(workspaces)
+        for ws_id, email, role, joined_date in self._read_in(
+            "SELECT workspace_id, email, role, joined_date FROM workspace_members WHERE workspace_id IN ({}) ORDER BY joined_date",
+            ids,
+        ):
+            workspaces[ws_id]["members"].append(
+                WorkspaceMember(email=email, role=role, joined_date=joined_date)
+            )
+        for ws_id, nct_id, added_by, added_date, notes in self._read_in(
+            "SELECT workspace_id, nct_id, added_by, added_date, workspace_notes FROM workspace_trials WHERE workspace_id IN ({}) ORDER BY added_date",
+            ids,
+        ):
+            workspaces[ws_id]["trials"].append(
+                WorkspaceTrial(
+                    nct_id=nct_id,
+                    added_by=added_by,
+                    added_date=added_date,
+                    workspace_notes=notes,
+                )
+            )
+        for ws_id, *activity in self._read_in(
+            "SELECT workspace_id, activity_id, user_email, action, target, timestamp, details FROM workspace_activity WHERE workspace_id IN ({}) ORDER BY timestamp DESC",
+            ids,
+        ):
+            activity_id, user, action, target, timestamp, details = activity
+            workspaces[ws_id]["activity"].append(
+                WorkspaceActivity(
+                    activity_id=activity_id,
+                    user=user,
+                    action=action,
+                    target=target,
+                    timestamp=timestamp,
+                    details=details,
+                )
+            )
+        return workspaces
+
+    def workspace(self, workspace_id: str) -> Optional[Workspace]:
+        return self._load_workspaces([workspace_id]).get(workspace_id)
+
+    def user_workspaces(self, user_email: str) -> list[Workspace]:
+        """Returns the workspaces the user is a member of, most recently updated first."""
+        rows = self._read(
+            "SELECT workspace_id FROM workspace_members WHERE email = ?", (user_email,)
+        )
+        workspaces = self._load_workspaces([row[0] for row in rows])
+        return sorted(workspaces.values(), key=lambda w: w["last_updated"], reverse=True)
+
+    def create_workspace(self, workspace: Workspace):
+        statements = [
+            (
+                "INSERT INTO workspaces (workspace_id, name, description, owner_email, created_date, last_updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    workspace["workspace_id"],
+                    workspace["name"],
+                    workspace["description"],
+                    workspace["owner_email"],
+                    workspace["created_date"],
+                    workspace["last_updated"],
+                ),
+            )
+        ]
+        for member in workspace["members"]:
+            statements.append(self._member_statement(workspace["workspace_id"], member))
+        self._write(statements)
+
+    def _member_statement(self, workspace_id: str, member: WorkspaceMember) -> Statement:
+        return (
+            "INSERT INTO workspace_members (workspace_id, email, role, joined_date) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (workspace_id, email) DO NOTHING",
+            (workspace_id, member["email"], member["role"], member["joined_date"]),
+        )
+
+    def _activity_statements(
+        self, workspace_id: str, activity: WorkspaceActivity
+    ) -> list[Statement]:
+        return [
+            (
+                "INSERT INTO workspace_activity (activity_id, workspace_id, user_email, action, target, timestamp, details) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    activity["activity_id"],
+                    workspace_id,
+                    activity["user"],
+                    activity["action"],
+                    activity["target"],
+                    activity["timestamp"],
+                    activity["details"],
+                ),
+            ),
+            (
+                "UPDATE workspaces SET last_updated = ? WHERE workspace_id = ?",
+                (activity["timestamp"], workspace_id),
+            ),
+        ]
+
+    def add_workspace_member(
+        self, workspace_id: str, member: WorkspaceMember, activity: WorkspaceActivity
+    ):
+        self._write(
+            [
+                self._member_statement(workspace_id, member),
+                *self._activity_statements(workspace_id, activity),
+            ]
+        )
+
+    def add_workspace_trial(
+        self, workspace_id: str, trial: WorkspaceTrial, activity: WorkspaceActivity
+    ):
+        self._write(
+            [
+                (
+                    "INSERT INTO workspace_trials (workspace_id, nct_id, added_by, added_date, workspace_notes) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (workspace_id, nct_id) DO NOTHING",
+                    (
+                        workspace_id,
+                        trial["nct_id"],
+                        trial["added_by"],
+                        trial["added_date"],
+                        trial["workspace_notes"],
+                    ),
+                ),
+                *self._activity_statements(workspace_id, activity),
+            ]
+        )
+
+    def query_history(self, user_email: str) -> list[dict]:
+        """Returns the user's most recent searches, newest first."""
+        rows = self._read(
+            "SELECT natural_query, structured_query, timestamp FROM query_history WHERE user_email = ? ORDER BY timestamp DESC LIMIT ?",
+            (user_email, QUERY_HISTORY_LIMIT),
+        )
+        return [
+            {"natural_query": q, "structured_query": json.loads(s), "timestamp": t}
+            for q, s, t in rows
+        ]
+
+    def add_query_history(self, user_email: str, entry: dict):
+        """Records a search and drops the user's entries beyond QUERY_HISTORY_LIMIT."""
+        self._write(
+            [
+                (
+                    "INSERT INTO query_history (entry_id, user_email, timestamp, natural_query, structured_query) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        str(uuid.uuid4()),
+                        user_email,
+                        entry["timestamp"],
+                        entry["natural_query"],
+                        _dumps(entry["structured_query"]),
+                    ),
+                ),
+                (
+                    "DELETE FROM query_history WHERE user_email = ? AND entry_id NOT IN ("
+                    "SELECT entry_id FROM query_history WHERE user_email = ? ORDER BY timestamp DESC LIMIT ?)",
+                    (user_email, user_email, QUERY_HISTORY_LIMIT),
+                ),
+            ]
+        )
+
+    def saved_searches(self, user_email: str) -> list[dict]:
+        """Returns the user's saved searches, oldest first."""
+        rows = self._read(
+            "SELECT name, natural_query, structured_query, timestamp FROM saved_searches WHERE user_email = ? ORDER BY timestamp",
+            (user_email,),
+        )
+        return [
+            {
+                "name": name,
+                "natural_query": q,
+                "structured_query": json.loads(s),
+                "timestamp": t,
+            }
+            for name, q, s, t in rows
+        ]
+
+    def add_saved_search(self, user_email: str, search: dict):
+        self._write(
+            [
+                (
+                    "INSERT INTO saved_searches (entry_id, user_email, name, timestamp, natural_query, structured_query) VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        str(uuid.uuid4()),
+                        user_email,
+                        search["name"],
+                        search["timestamp"],
+                        search["natural_query"],
+                        _dumps(search["structured_query"]),
+                    ),
+                )
+            ]
+        )
+
+    def delete_saved_search(self, user_email: str, name: str):
+        self._write(
+            [
+                (
+                    "DELETE FROM saved_searches WHERE user_email = ? AND name = ?",
+                    (user_email, name),
+                )
+            ]
+        )
+
+
+_store: Optional[UserStore] = None
+_store_lock = threading.Lock()
+
+
+def get_user_store() -> UserStore:
+    """Returns the process-wide user store, creating its tables on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = UserStore()
+                logging.info(
+                    f"User store opened on {'Postgres' if _store.is_postgres else _store.url}"
+                )
+    return _store
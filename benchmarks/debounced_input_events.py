@@ -0,0 +1,103 @@
+"""
+Counts the backend events a search input sends per typed query, per
+keystroke versus through debounced_input.
+
+Typing is simulated from a seeded keystroke model: each typist has a mean
+inter-key interval drawn around 240 ms (about 50 words per minute), intervals
+vary log-normally around it, a word boundary sometimes adds a thinking pause,
+and some keystrokes are typos corrected with a backspace. A per-keystroke
+input sends its on_change handlers on every keystroke. A debounced input
+(react-debounce-input, trailing debounce) sends them once after every gap
+longer than the debounce timeout, plus once after the last keystroke.
+
+Browse text filters with autocomplete run two handlers per change
+(set_search_term and AutocompleteState.suggest), and with search-as-you-type
+each change also chains a fetch_trials.
+
+Usage:
+    python -m benchmarks.debounced_input_events
+    python -m benchmarks.debounced_input_events --typists 1000 --debounce-ms 500
+"""
+
+import argparse
+import numpy as np
+from app.components.debounced_input import SEARCH_DEBOUNCE_MS
+
+QUERIES = [
+    "breast cancer",
+    "type 2 diabetes",
+    "pfizer",
+    "non-small cell lung cancer",
+    "alzheimer's disease",
+    "pembrolizumab",
+    "heart failure",
+    "rheumatoid arthritis",
+    "covid-19 vaccine",
+    "major depressive disorder",
+]
+MEAN_INTERVAL_MS = 240
+TYPIST_SPREAD = 0.35
+INTERVAL_SPREAD = 0.45
+WORD_PAUSE_PROBABILITY = 0.25
+WORD_PAUSE_MS = 600
+TYPO_PROBABILITY = 0.03
+HANDLERS_PER_CHANGE = 2
+
+
+def keystroke_times(text: str, mean_interval_ms: float, rng: np.random.Generator) -> np.ndarray:
+    """Returns the time of every keystroke, including typo corrections, in ms."""
+    intervals = []
+    for char in text:
+        keys = 3 if rng.random() < TYPO_PROBABILITY else 1
+        for _ in range(keys):
+            interval = mean_interval_ms * rng.lognormal(-INTERVAL_SPREAD**2 / 2, INTERVAL_SPREAD)
+            if char == " " and rng.random() < WORD_PAUSE_PROBABILITY:
+                interval += rng.exponential(WORD_PAUSE_MS)
+            intervals.append(interval)
+    return np.cumsum(intervals)
+
+
+def debounced_changes(times: np.ndarray, debounce_ms: float) -> int:
+    """Counts the on_change calls a trailing debounce makes for these keystrokes."""
+    return int(np.count_nonzero(np.diff(times) > debounce_ms)) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--typists", type=int, default=500)
+    parser.add_argument("--debounce-ms", type=float, default=SEARCH_DEBOUNCE_MS)
+    parser.add_argument("--seed", type=int, default=20240614)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    speeds = MEAN_INTERVAL_MS * rng.lognormal(-TYPIST_SPREAD**2 / 2, TYPIST_SPREAD, args.typists)
+    print(
+        f"{args.typists} simulated typists, debounce {args.debounce_ms:.0f} ms, "
+        f"{HANDLERS_PER_CHANGE} handlers per change\n"
+    )
+    print(
+        f"{'query':<28} {'keys':>6} {'changes':>8} {'events before':>14} "
+        f"{'events after':>13} {'fetches before':>15} {'fetches after':>14}"
+    )
+    totals = np.zeros(3)
+    for query in QUERIES:
+        keys, changes = [], []
+        for speed in speeds:
+            times = keystroke_times(query, speed, rng)
+            keys.append(len(times))
+            changes.append(debounced_changes(times, args.debounce_ms))
+        keys_mean, changes_mean = float(np.mean(keys)), float(np.mean(changes))
+        totals += (keys_mean, changes_mean, 1)
+        print(
+            f"{query:<28} {keys_mean:>6.1f} {changes_mean:>8.2f} "
+            f"{keys_mean * HANDLERS_PER_CHANGE:>14.1f} {changes_mean * HANDLERS_PER_CHANGE:>13.2f} "
+            f"{keys_mean:>15.1f} {changes_mean:>14.2f}"
+        )
+    keys_mean, changes_mean = totals[0] / totals[2], totals[1] / totals[2]
+    print(
+        f"\nMean per query: {keys_mean:.1f} keystrokes -> {changes_mean:.2f} changes, "
+        f"{keys_mean / changes_mean:.1f}x fewer events ({1 - changes_mean / keys_mean:.0%} reduction)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Load-tests the production backend with 1 to N workers on one machine.
+
+For each worker count the backend is started with `reflex run --env prod
+--backend-only`, sharing state and caches through REDIS_URL, and is then
+driven by client processes with keep-alive connections for a fixed time.
+The report shows throughput, the speedup over one worker and the scaling
+efficiency (speedup / workers). Client processes take CPU from the workers,
+so leave at least a core per client free or scale --max-workers down.
+
+Usage:
+    REDIS_URL=redis://localhost:6379 python -m benchmarks.multi_worker_scaling
+    REDIS_URL=... python -m benchmarks.multi_worker_scaling --max-workers 4 --clients 4
+    REDIS_URL=... python -m benchmarks.multi_worker_scaling --path "/api/autocomplete/sponsor?q=pf"
+"""
+
+import os
+import sys
+import time
+import shlex
+import signal
+import argparse
+import subprocess
+import http.client
+from multiprocessing import Pool
+
+SERVER_COMMAND = "{python} -m reflex run --env prod --backend-only --backend-port {port}"
+STARTUP_TIMEOUT_SECONDS = 300
+WARMUP_SECONDS = 3
+
+
+def wait_until_ready(port: int, path: str):
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", path)
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(1)
+    raise SystemExit(f"Backend did not answer {path} within {STARTUP_TIMEOUT_SECONDS}s.")
+
+
+def drive(args: tuple[int, str, float]) -> tuple[int, int]:
+    """Sends requests over one keep-alive connection until the deadline."""
+    port, path, seconds = args
+    ok = errors = 0
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status == 200:
+                ok += 1
+            else:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    return ok, errors
+
+
+def measure(workers: int, args) -> tuple[float, int]:
+    # Reflex starts granian by name, so it must be on PATH even when this
+    # interpreter's environment is not activated.
+    bin_dir = os.path.dirname(sys.executable)
+    env = {
+        **os.environ,
+        "GRANIAN_WORKERS": str(workers),
+        "REFLEX_USE_GRANIAN": "true",
+        "PATH": os.pathsep.join([bin_dir, os.environ.get("PATH", "")]),
+    }
+    server = subprocess.Popen(
+        shlex.split(args.command.format(python=sys.executable, port=args.port)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        wait_until_ready(args.port, args.path)
+        with Pool(args.clients) as pool:
+            pool.map(drive, [(args.port, args.path, WARMUP_SECONDS)] * args.clients)
+            results = pool.map(drive, [(args.port, args.path, args.duration)] * args.clients)
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+    ok = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return ok / args.duration, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--max-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--clients", type=int, help="Client processes (default: max workers)")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per run")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--path", default="/api/autocomplete/condition?q=canc")
+    parser.add_argument("--command", default=SERVER_COMMAND)
+    args = parser.parse_args()
+    args.clients = args.clients or args.max_workers
+    if args.max_workers > 1 and not (
+        os.environ.get("REDIS_URL") or os.environ.get("REFLEX_REDIS_URL")
+    ):
+        raise SystemExit("Set REDIS_URL; Reflex only runs one worker without Redis.")
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    if args.max_workers + args.clients > (cores or 1):
+        print(
+            f"Warning: {args.max_workers} workers and {args.clients} clients share "
+            f"{cores} cores, so throughput cannot scale with the worker count.\n"
+        )
+    baseline = None
+    print(f"{'workers':>7} {'req/s':>10} {'speedup':>8} {'efficiency':>10} {'errors':>7}")
+    for workers in range(1, args.max_workers + 1):
+        throughput, errors = measure(workers, args)
+        baseline = baseline or throughput
+        speedup = throughput / baseline if baseline else 0.0
+        print(
+            f"{workers:>7} {throughput:>10,.0f} {speedup:>8.2f} {speedup / workers:>10.0%} {errors:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Measures the bytes the trial detail page sends per event, before and after
+moving the heavy trial fields to backend-only storage.
+
+"Before" is the old layout: the full trial document plus every derived var
+is sent in the load event. "After" is the current layout: a lightweight
+trial in the load event, then each tab's fields the first time it opens.
+
+Usage:
+    python -m benchmarks.trial_detail_delta                  # synthetic multi-site trial
+    python -m benchmarks.trial_detail_delta --nct-id NCT...  # real trial from AACT
+"""
+
+import argparse
+import datetime
+import pickle
+from reflex.utils.format import json_dumps
+from app.states.trial_detail_state import (
+    DETAIL_TABS,
+    HEAVY_TRIAL_FIELDS,
+    TAB_VIEW_FIELDS,
+    build_trial_view,
+)
+from app.utils.marker_clusters import FacilityPoints
+
+
+def synthetic_trial(sites: int = 800, outcomes: int = 60) -> dict:
+    """Builds a large multi-site trial shaped like fetch_trial_detail output."""
+    criteria = "Inclusion Criteria:\n" + "".join(
+        f"* Participant meets inclusion requirement number {i} as assessed at screening\n"
+        for i in range(40)
+    )
+    criteria += "Exclusion Criteria:\n" + "".join(
+        f"* History of exclusion condition number {i} within the past 12 months\n"
+        for i in range(40)
+    )
+    return {
+        "nct_id": "NCT00000000",
+        "brief_title": "A Phase 3 Multi-site Study of an Investigational Therapy",
+        "official_title": "A Randomized, Double-blind, Placebo-controlled, Multicenter Phase 3 Study",
+        "overall_status": "RECRUITING",
+        "phase": "PHASE3",
+        "study_type": "INTERVENTIONAL",
+        "enrollment": 4000,
+        "start_date": datetime.date(2022, 1, 15),
+        "completion_date": datetime.date(2027, 6, 30),
+        "brief_summary": "The purpose of this study is to evaluate efficacy and safety. " * 10,
+        "detailed_description": "Detailed protocol description paragraph. " * 400,
+        "eligibility_criteria": criteria,
+        "conditions": ["Condition A", "Condition B"],
+        "mesh_terms": ["Mesh Term A", "Mesh Term B"],
+        "interventions": [
+            {"intervention_type": "DRUG", "name": "Investigational Drug"},
+            {"intervention_type": "DRUG", "name": "Placebo"},
+        ],
+        "sponsors": [
+            {"agency_class": "INDUSTRY", "lead_or_collaborator": "lead", "name": "Sponsor Inc"}
+        ],
+        "locations": [
+            {
+                "facility": f"Research Site {i} University Medical Center",
+                "status": "RECRUITING",
+                "city": f"City {i % 200}",
+                "state": None,
+                "zip": f"{10000 + i}",
+                "country": ["United States", "Germany", "France", "Canada"][i % 4],
+            }
+            for i in range(sites)
+        ],
+        "design_groups": [
+            {"group_type": "EXPERIMENTAL", "title": f"Arm {i}", "description": "Dose regimen. " * 10}
+            for i in range(4)
+        ],
+        "design_outcomes": [
+            {
+                "outcome_type": "primary" if i < 3 else "secondary",
+                "measure": f"Change from baseline in outcome measure {i}",
+                "time_frame": "Baseline to Week 52",
+                "description": "Outcome measure description. " * 8,
+            }
+            for i in range(outcomes)
+        ],
+        "references": [
+            {"citation": f"Author A, Author B. Reference title {i}. Journal. 2020.", "reference_type": "BACKGROUND"}
+            for i in range(30)
+        ],
+    }
+
+
+def measure(trial: dict) -> dict[str, int]:
+    view = build_trial_view(trial)
+    before = {"load": len(json_dumps({"trial": trial, **view}))}
+    light = {k: v for k, v in trial.items() if k not in HEAVY_TRIAL_FIELDS}
+    tab_only = {field for fields in TAB_VIEW_FIELDS.values() for field in fields}
+    tab_only.add("location_markers")
+    load_view = {k: v for k, v in view.items() if k not in tab_only}
+    after = {"load": len(json_dumps({"trial": light, **load_view}))}
+    for tab, fields in DETAIL_TABS.items():
+        if not fields:
+            continue
+        delta = {field: trial.get(field) for field in fields}
+        delta.update({name: view[name] for name in TAB_VIEW_FIELDS.get(tab, ())})
+        if tab == "locations":
+            points = FacilityPoints(view["location_markers"])
+            delta["map_clusters"] = points.clusters(view["map_center"], view["map_zoom"])
+        after[f"open {tab} tab"] = len(json_dumps(delta))
+    return {
+        **{f"before: {k}": v for k, v in before.items()},
+        **{f"after: {k}": v for k, v in after.items()},
+        "pickled backend trial": len(pickle.dumps(trial)),
+        "pickled backend view": len(pickle.dumps(view)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nct-id", help="Measure a real trial instead of a synthetic one")
+    args = parser.parse_args()
+    if args.nct_id:
+        from app.utils.trial_cache import fetch_trial_detail
+
+        trial = fetch_trial_detail(args.nct_id)
+        if trial is None:
+            raise SystemExit(f"Trial {args.nct_id} not found.")
+    else:
+        trial = synthetic_trial()
+    for label, size in measure(trial).items():
+        print(f"{label:<32} {size:>10,} bytes")
+
+
+if __name__ == "__main__":
+    main()
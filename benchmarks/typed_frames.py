@@ -0,0 +1,124 @@
+"""
+Measures memory and group-by time for analytics frames loaded as plain
+strings versus the typed columns produced by apply_column_types.
+
+The frame is the full studies corpus with one row per study and its lead
+sponsor's agency class and country, either loaded from AACT or generated
+with AACT-like value frequencies.
+
+Usage:
+    python -m benchmarks.typed_frames                 # synthetic 550,000 studies
+    python -m benchmarks.typed_frames --rows 2000000
+    python -m benchmarks.typed_frames --from-db       # full corpus from AACT
+"""
+
+import time
+import argparse
+import datetime
+import numpy as np
+import polars as pl
+from app.utils.polars_db import (
+    PHASES,
+    STATUSES,
+    STUDY_TYPES,
+    AGENCY_CLASSES,
+    apply_column_types,
+    get_polars_db_connection_string,
+)
+
+CORPUS_QUERY = """
+SELECT
+    s.nct_id, s.overall_status, s.phase, s.study_type, s.enrollment,
+    s.start_date, s.completion_date, sp.agency_class, f.country
+FROM ctgov.studies s
+LEFT JOIN ctgov.sponsors sp ON sp.nct_id = s.nct_id AND sp.lead_or_collaborator = 'lead'
+LEFT JOIN (
+    SELECT DISTINCT ON (nct_id) nct_id, country FROM ctgov.facilities ORDER BY nct_id, id
+) f ON f.nct_id = s.nct_id
+"""
+COUNTRIES = 220
+REPEATS = 5
+GROUP_BYS = {
+    "studies by phase": lambda df: df.group_by("phase").agg(pl.len()),
+    "studies by status": lambda df: df.group_by("overall_status").agg(pl.len()),
+    "studies by country": lambda df: df.group_by("country").agg(pl.len()),
+    "phase x status": lambda df: df.group_by("phase", "overall_status").agg(pl.len()),
+    "sponsor class x type": lambda df: df.group_by("agency_class", "study_type").agg(
+        pl.len()
+    ),
+    "median enrollment by phase": lambda df: df.group_by("phase").agg(
+        pl.col("enrollment").median()
+    ),
+}
+
+
+def synthetic_corpus(rows: int) -> pl.DataFrame:
+    """Builds a raw, string-typed frame shaped like the AACT corpus."""
+    rng = np.random.default_rng(20240613)
+
+    def pick(values: list[str], weights: list[float]) -> list[str]:
+        p = np.array(weights, dtype=float)
+        return rng.choice(np.array(values, dtype=object), size=rows, p=p / p.sum()).tolist()
+
+    start = rng.integers(0, 365 * 25, rows)
+    duration = rng.integers(30, 365 * 8, rows)
+    epoch = datetime.date(2000, 1, 1)
+    country_weights = 1.0 / np.arange(1, COUNTRIES + 1)
+    return pl.DataFrame(
+        {
+            "nct_id": [f"NCT{i:08d}" for i in range(rows)],
+            "overall_status": pick(STATUSES, [2, 6, 1, 4, 0.2, 3, 30, 1, 10, 0.1, 0.1, 0.1, 0.1, 0.1]),
+            "phase": pick(["", *PHASES], [25, 2, 10, 3, 12, 1, 8, 6, 30]),
+            "study_type": pick(STUDY_TYPES, [78, 21, 1]),
+            "enrollment": rng.lognormal(4, 1.5, rows).astype(np.int64),
+            "start_date": [epoch + datetime.timedelta(days=int(d)) for d in start],
+            "completion_date": [
+                epoch + datetime.timedelta(days=int(s + d)) for s, d in zip(start, duration)
+            ],
+            "agency_class": pick(AGENCY_CLASSES, [30, 2, 2, 1, 1, 0.5, 0.5, 60, 3]),
+            "country": pick([f"Country {i}" for i in range(COUNTRIES)], country_weights.tolist()),
+        }
+    )
+
+
+def time_group_by(frame: pl.DataFrame, group_by) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        group_by(frame)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=550_000)
+    parser.add_argument("--from-db", action="store_true", help="Load the corpus from AACT")
+    args = parser.parse_args()
+    if args.from_db:
+        raw = pl.read_database_uri(
+            CORPUS_QUERY, get_polars_db_connection_string(), engine="connectorx"
+        )
+    else:
+        raw = synthetic_corpus(args.rows)
+    started = time.perf_counter()
+    typed = apply_column_types(raw)
+    print(f"{len(raw):,} rows, typed in {(time.perf_counter() - started) * 1000:.0f} ms")
+    print(f"{'column':<18} {'raw dtype':<12} {'typed dtype':<28} {'raw MiB':>8} {'typed MiB':>9}")
+    for column in raw.columns:
+        print(
+            f"{column:<18} {str(raw[column].dtype):<12} {str(typed[column].dtype)[:28]:<28} "
+            f"{raw[column].estimated_size('mb'):>8.1f} {typed[column].estimated_size('mb'):>9.1f}"
+        )
+    print(
+        f"{'total':<59} {raw.estimated_size('mb'):>8.1f} {typed.estimated_size('mb'):>9.1f}"
+    )
+    print(f"\n{'group-by (best of ' + str(REPEATS) + ')':<28} {'raw ms':>8} {'typed ms':>9} {'speedup':>8}")
+    for name, group_by in GROUP_BYS.items():
+        raw_ms = time_group_by(raw, group_by)
+        typed_ms = time_group_by(typed, group_by)
+        print(f"{name:<28} {raw_ms:>8.1f} {typed_ms:>9.1f} {raw_ms / typed_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
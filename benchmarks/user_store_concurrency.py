@@ -0,0 +1,177 @@
+"""
+Measures the user store under 1,000 concurrent simulated users.
+
+Each user registers, saves and tags trials, creates watchlists and a
+workspace, runs searches and reloads their pages, with every call made from
+a worker thread the way the states call the store through asyncio.to_thread.
+The run is repeated with group-committed writes and with one transaction per
+write, and reports throughput and per-operation latency percentiles.
+
+Usage:
+    python -m benchmarks.user_store_concurrency
+    python -m benchmarks.user_store_concurrency --users 1000 --threads 64
+    python -m benchmarks.user_store_concurrency --url postgresql://...
+"""
+
+import os
+import uuid
+import time
+import random
+import argparse
+import datetime
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.user_store import UserStore
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def simulate_user(store: UserStore, user_id: int, timings: dict, lock: threading.Lock):
+    """Runs one user's session, recording how long each store call takes."""
+    rng = random.Random(user_id)
+    email = f"user{user_id}@example.org"
+    local = defaultdict(list)
+
+    def timed(op, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        local[op].append(time.perf_counter() - started)
+        return result
+
+    timed("add_user", store.add_user, {"email": email, "password_hash": "x" * 60})
+    timed("get_user", store.get_user, email)
+    for i in range(10):
+        now = _now()
+        trial = {
+            "nct_id": f"NCT{rng.randrange(10**8):08d}",
+            "brief_title": f"Trial {i}",
+            "overall_status": "RECRUITING",
+            "phase": "PHASE2",
+            "enrollment": rng.randrange(20, 2000),
+            "start_date": datetime.date(2024, 1, 1),
+            "completion_date": None,
+            "saved_date": now,
+            "tags": [],
+            "notes": "",
+            "last_updated": now,
+        }
+        timed("save_trial", store.put_saved_trials, email, [trial])
+    trials = timed("list_saved_trials", store.saved_trials, email)
+    tagged = list(trials.values())[:5]
+    for trial in tagged:
+        trial["tags"].append("High Priority")
+    timed("bulk_tag", store.put_saved_trials, email, tagged)
+    for i in range(2):
+        watchlist = {
+            "watchlist_id": str(uuid.uuid4()),
+            "name": f"Watchlist {i}",
+            "description": "",
+            "criteria": {"condition": "asthma"},
+            "created_date": _now(),
+            "last_checked": None,
+            "is_active": True,
+            "matches": [],
+        }
+        timed("put_watchlist", store.put_watchlist, email, watchlist)
+    timed("list_watchlists", store.watchlists, email)
+    for i in range(5):
+        entry = {
+            "natural_query": f"phase 2 trials for condition {i}",
+            "structured_query": {"condition": f"condition {i}", "phase": "PHASE2"},
+            "timestamp": _now(),
+        }
+        timed("add_query_history", store.add_query_history, email, entry)
+    timed("query_history", store.query_history, email)
+    now = _now()
+    workspace_id = str(uuid.uuid4())
+    timed(
+        "create_workspace",
+        store.create_workspace,
+        {
+            "workspace_id": workspace_id,
+            "name": "Team",
+            "description": "",
+            "owner_email": email,
+            "members": [{"email": email, "role": "owner", "joined_date": now}],
+            "trials": [],
+            "created_date": now,
+            "last_updated": now,
+            "activity": [],
+        },
+    )
+    for nct_id in list(trials)[:3]:
+        now = _now()
+        timed(
+            "add_workspace_trial",
+            store.add_workspace_trial,
+            workspace_id,
+            {"nct_id": nct_id, "added_by": email, "added_date": now, "workspace_notes": ""},
+            {
+                "activity_id": str(uuid.uuid4()),
+                "user": email,
+                "action": "added trial",
+                "target": nct_id,
+                "timestamp": now,
+                "details": f"Added trial {nct_id}",
+            },
+        )
+    timed("user_workspaces", store.user_workspaces, email)
+    with lock:
+        for op, values in local.items():
+            timings[op].extend(values)
+
+
+def run(url: str, users: int, threads: int, batch_writes: bool) -> dict:
+    store = UserStore(url, batch_writes=batch_writes)
+    timings: dict[str, list[float]] = defaultdict(list)
+    lock = threading.Lock()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [
+            pool.submit(simulate_user, store, user_id, timings, lock)
+            for user_id in range(users)
+        ]:
+            future.result()
+    return {"elapsed": time.perf_counter() - started, "timings": timings}
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Returns the p-th quantile of sorted values, in milliseconds."""
+    return values[min(len(values) - 1, int(p * len(values)))] * 1000
+
+
+def report(label: str, result: dict):
+    timings = result["timings"]
+    total = sum(len(v) for v in timings.values())
+    print(
+        f"\n{label}: {total:,} calls in {result['elapsed']:.2f}s "
+        f"({total / result['elapsed']:,.0f} calls/s)"
+    )
+    print(f"{'operation':<22} {'calls':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for op, values in timings.items():
+        values = sorted(values)
+        print(
+            f"{op:<22} {len(values):>7,} {percentile(values, 0.5):>8.2f} "
+            f"{percentile(values, 0.95):>8.2f} {percentile(values, 0.99):>8.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--url", help="Store URL; defaults to a fresh SQLite file per run")
+    args = parser.parse_args()
+    for batch_writes in (True, False):
+        label = "group commit" if batch_writes else "one transaction per write"
+        with tempfile.TemporaryDirectory() as directory:
+            url = args.url or os.path.join(directory, "bench.sqlite3")
+            report(label, run(url, args.users, args.threads, batch_writes))
+
+
+if __name__ == "__main__":
+    main()
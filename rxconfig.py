@@ -1,3 +1,10 @@
+import os
 import reflex as rx
 
-config = rx.Config(app_name="app", plugins=[rx.plugins.TailwindV3Plugin()])
+# With a Redis URL, Reflex keeps every client's state in Redis and runs
+# several backend workers; without one it runs a single worker with state on disk.
+config = rx.Config(
+    app_name="app",
+    plugins=[rx.plugins.TailwindV3Plugin()],
+    redis_url=os.environ.get("REDIS_URL"),
+)